@@ -0,0 +1,61 @@
+"""Admin API routes (enabled by the admin_token setting)."""
+
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+
+from app.config import get_settings
+from app.socket_handlers import client_backpressure, rate_limiter
+from app.tracing import tracer
+
+settings = get_settings()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency checking the X-Admin-Token header against admin_token."""
+    if not settings.admin_token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Admin API is disabled",
+        )
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid admin token",
+        )
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/traces")
+async def list_traces(
+    kind: Optional[str] = Query(None, pattern="^(socket|db)$"),
+    name: Optional[str] = Query(None, max_length=100),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Most recent sampled traces of Socket.io events and database calls."""
+    return {
+        "rates": {"default": tracer.default_rate, **tracer.rates},
+        "buffer_size": tracer.traces.maxlen,
+        "recorded": tracer.recorded,
+        "traces": tracer.recent(kind, name, limit),
+    }
+
+
+@router.get("/clients")
+async def list_clients(limit: int = Query(100, ge=1, le=1000)):
+    """Outbound queue backlog, lag and throttled events of the clients on this node."""
+    clients = client_backpressure.clients()[:limit]
+    for client in clients:
+        client["throttled"] = rate_limiter.throttled.get(client["sid"], 0)
+    return {
+        "limits": {
+            "max_packets": client_backpressure.max_packets,
+            "max_bytes": client_backpressure.max_bytes,
+            "resync_after_seconds": client_backpressure.resync_after,
+        },
+        "lagging": len(client_backpressure.lagging),
+        "clients": clients,
+    }
@@ -4,18 +4,29 @@ from datetime import datetime
 from typing import Any, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
 from pydantic import BaseModel, Field
-from sqlalchemy import select, or_, func
+from sqlalchemy import select, or_, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-
+from sqlalchemy.orm import defer, selectinload, undefer_group
+
+from app.canvas_store import (
+    STORAGE_NORMALIZED,
+    CanvasPatchError,
+    patch_canvas,
+    read_canvas,
+    write_canvas,
+)
+from app.config import get_settings
 from app.database import get_db
 from app.models.user import User
 from app.models.board import Board, BoardMember, BoardVersion
+from app.version_store import create_version, load_version
+from app.realtime.services import board_persister, board_residency
 from app.utils.auth import get_current_user, get_current_user_required
 
 router = APIRouter()
+settings = get_settings()
 
 
 # Pydantic schemas
@@ -39,6 +50,25 @@ class BoardCanvasUpdate(BaseModel):
     create_version: bool = False
 
 
+class CanvasOperation(BaseModel):
+    """One element-level canvas change."""
+    op: str = Field(pattern="^(add|update|remove)$")
+    kind: str = Field(pattern="^(strokes|objects|layers)$")
+    id: str = Field(min_length=1, max_length=255)
+    data: Optional[dict[str, Any]] = None  # The element (add) or changed keys (update)
+
+
+class BoardCanvasPatch(BaseModel):
+    """Incremental canvas update request."""
+    base_revision: int
+    ops: list[CanvasOperation] = Field(max_length=10000)
+
+
+class BoardCanvasPatchResponse(BaseModel):
+    """Incremental canvas update result."""
+    revision: int
+
+
 class BoardResponse(BaseModel):
     """Board response."""
     id: UUID
@@ -57,7 +87,8 @@ class BoardResponse(BaseModel):
 
 class BoardDetailResponse(BoardResponse):
     """Board detail response with canvas data."""
-    canvas_data: dict[str, Any]
+    canvas_data: Optional[dict[str, Any]] = None  # Left out of metadata-only responses
+    canvas_revision: int = 0
     role: Optional[str] = None  # Current user's role
 
 
@@ -91,6 +122,21 @@ class BoardVersionResponse(BaseModel):
     created_at: datetime
 
 
+async def board_detail(
+    db: AsyncSession, board: Board, role: Optional[str], include_canvas: bool = True
+) -> BoardDetailResponse:
+    """Detail response of a board; the canvas is only read (in any storage mode) if included."""
+    # Not model_validate: that would touch the deferred canvas columns
+    response = BoardDetailResponse(
+        **BoardResponse.model_validate(board).model_dump(),
+        canvas_revision=board.canvas_revision,
+        role=role,
+    )
+    if include_canvas:
+        response.canvas_data = await read_canvas(db, board)
+    return response
+
+
 @router.get("", response_model=BoardListResponse)
 async def list_boards(
     page: int = Query(1, ge=1),
@@ -200,11 +246,16 @@ async def create_board(
     db: AsyncSession = Depends(get_db),
 ) -> BoardDetailResponse:
     """Create a new board."""
+    if settings.canvas_storage == STORAGE_NORMALIZED:
+        canvas_data = {"layers": []}  # Elements live in board_strokes/board_objects
+    else:
+        canvas_data = {"strokes": [], "objects": [], "layers": []}
     board = Board(
         name=data.name,
         owner_id=user.id if user else None,
         is_public=data.is_public,
-        canvas_data={"strokes": [], "objects": [], "layers": []},
+        canvas_data=canvas_data,
+        canvas_storage=settings.canvas_storage,
     )
     db.add(board)
 
@@ -220,23 +271,29 @@ async def create_board(
     await db.flush()
     await db.refresh(board)
 
-    response = BoardDetailResponse.model_validate(board)
-    response.role = "owner" if user else None
-    return response
+    return await board_detail(db, board, "owner" if user else None)
 
 
 @router.get("/{board_id}", response_model=BoardDetailResponse)
 async def get_board(
     board_id: UUID,
+    response: Response,
+    include: Optional[str] = Query(None, pattern="^(canvas|none)$"),
     user: Optional[User] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ) -> BoardDetailResponse:
-    """Get a board by ID."""
-    result = await db.execute(
-        select(Board)
-        .options(selectinload(Board.members))
-        .where(Board.id == board_id)
-    )
+    """Get a board by ID, with its canvas unless ``?include=none``.
+
+    Leaving out ``include`` still returns the canvas, but is deprecated:
+    clients should ask for ``include=canvas`` when they need it.
+    """
+    if include is None:
+        response.headers["Deprecation"] = "true"
+    include_canvas = include != "none"
+    query = select(Board).options(selectinload(Board.members)).where(Board.id == board_id)
+    if include_canvas:
+        query = query.options(undefer_group("canvas"))
+    result = await db.execute(query)
     board = result.scalar_one_or_none()
 
     if not board:
@@ -272,9 +329,7 @@ async def get_board(
                     role = m.role
                     break
 
-    response = BoardDetailResponse.model_validate(board)
-    response.role = role
-    return response
+    return await board_detail(db, board, role, include_canvas)
 
 
 @router.patch("/{board_id}", response_model=BoardDetailResponse)
@@ -310,23 +365,18 @@ async def update_board(
         board.is_locked = data.is_locked
     if data.settings is not None:
         board.settings = data.settings
+        board_residency.update_settings(str(board.id), board.settings)
 
     await db.flush()
     await db.refresh(board)
 
-    response = BoardDetailResponse.model_validate(board)
-    response.role = "owner"
-    return response
+    return await board_detail(db, board, "owner", include_canvas=False)
 
 
-@router.put("/{board_id}/canvas", response_model=BoardDetailResponse)
-async def update_canvas(
-    board_id: UUID,
-    data: BoardCanvasUpdate,
-    user: Optional[User] = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
-) -> BoardDetailResponse:
-    """Update board canvas data (auto-save endpoint)."""
+async def get_editable_board(
+    db: AsyncSession, board_id: UUID, user: Optional[User]
+) -> tuple[Board, Optional[str]]:
+    """Load a board the user may edit the canvas of, with the user's role."""
     result = await db.execute(
         select(Board)
         .options(selectinload(Board.members))
@@ -364,8 +414,23 @@ async def update_canvas(
             detail="You don't have permission to edit this board",
         )
 
+    return board, role
+
+
+@router.put("/{board_id}/canvas", response_model=BoardDetailResponse)
+async def update_canvas(
+    board_id: UUID,
+    data: BoardCanvasUpdate,
+    user: Optional[User] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> BoardDetailResponse:
+    """Update board canvas data (auto-save endpoint)."""
+    board, role = await get_editable_board(db, board_id, user)
+
     # Create version if requested
     if data.create_version:
+        # Live edits not saved yet belong in the backup
+        await board_persister.flush([str(board_id)])
         # Get current max version number
         version_result = await db.execute(
             select(func.max(BoardVersion.version_number))
@@ -373,23 +438,83 @@ async def update_canvas(
         )
         max_version = version_result.scalar() or 0
 
-        version = BoardVersion(
-            board_id=board_id,
-            version_number=max_version + 1,
-            canvas_data=board.canvas_data,  # Save current state before update
+        # Save current state before update; only new elements are stored
+        await create_version(
+            db,
+            board_id,
+            max_version + 1,
+            await read_canvas(db, board),
             created_by=user.id if user else None,
         )
-        db.add(version)
 
     # Update canvas data
-    board.canvas_data = data.canvas_data
+    await write_canvas(db, board, data.canvas_data)
 
     await db.flush()
     await db.refresh(board)
+    await db.commit()
+    # Connected clients get the new canvas, and live state no longer overwrites it
+    await board_residency.replace_canvas(str(board_id), data.canvas_data, board.canvas_revision)
 
-    response = BoardDetailResponse.model_validate(board)
-    response.role = role
-    return response
+    return await board_detail(db, board, role)
+
+
+@router.patch("/{board_id}/canvas", response_model=BoardCanvasPatchResponse)
+async def patch_board_canvas(
+    board_id: UUID,
+    data: BoardCanvasPatch,
+    user: Optional[User] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> BoardCanvasPatchResponse:
+    """Apply element-level changes to the canvas (incremental auto-save endpoint).
+
+    The operations apply in order and all or nothing, on top of
+    ``base_revision``; if the canvas has changed since, nothing is applied
+    and the response is 409 with the current revision.
+    """
+    board, _ = await get_editable_board(db, board_id, user)
+    # The patch applies on top of live edits, so save those first (before
+    # the row is locked below, as the save needs it too)
+    await board_persister.flush([str(board_id)])
+
+    # Taking the revision locks the row until commit, so of two patches
+    # against the same revision only the first applies
+    result = await db.execute(
+        update(Board)
+        .where(Board.id == board_id, Board.canvas_revision == data.base_revision)
+        .values(canvas_revision=data.base_revision + 1)
+        .returning(Board.canvas_revision)
+    )
+    revision = result.scalar_one_or_none()
+    if revision is None:
+        await db.refresh(board, ["canvas_revision"])
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "message": "Canvas has changed since the base revision",
+                "revision": board.canvas_revision,
+            },
+        )
+
+    try:
+        await patch_canvas(db, board, [op.model_dump() for op in data.ops])
+    except CanvasPatchError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e),
+        )
+
+    await db.commit()
+    # Connected clients get the changes as element events; only ops with no
+    # such event make them reload the whole canvas
+    key = str(board_id)
+    if await board_residency.is_live(key):
+        ops = [op.model_dump() for op in data.ops]
+        user_id = str(user.id) if user else None
+        if not await board_residency.patch_canvas(key, ops, revision, user_id):
+            await board_residency.replace_canvas(key, await read_canvas(db, board), revision)
+
+    return BoardCanvasPatchResponse(revision=revision)
 
 
 @router.delete("/{board_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -399,7 +524,9 @@ async def delete_board(
     db: AsyncSession = Depends(get_db),
 ) -> None:
     """Delete a board (owner only)."""
-    result = await db.execute(select(Board).where(Board.id == board_id))
+    result = await db.execute(
+        select(Board).options(defer(Board.settings)).where(Board.id == board_id)
+    )
     board = result.scalar_one_or_none()
 
     if not board:
@@ -426,7 +553,10 @@ async def list_board_members(
     """List board members."""
     result = await db.execute(
         select(Board)
-        .options(selectinload(Board.members).selectinload(BoardMember.user))
+        .options(
+            defer(Board.settings),
+            selectinload(Board.members).selectinload(BoardMember.user),
+        )
         .where(Board.id == board_id)
     )
     board = result.scalar_one_or_none()
@@ -456,7 +586,9 @@ async def add_board_member(
     db: AsyncSession = Depends(get_db),
 ) -> BoardMemberResponse:
     """Add a member to a board (owner only)."""
-    result = await db.execute(select(Board).where(Board.id == board_id))
+    result = await db.execute(
+        select(Board).options(defer(Board.settings)).where(Board.id == board_id)
+    )
     board = result.scalar_one_or_none()
 
     if not board:
@@ -521,7 +653,9 @@ async def remove_board_member(
     db: AsyncSession = Depends(get_db),
 ) -> None:
     """Remove a member from a board (owner only)."""
-    result = await db.execute(select(Board).where(Board.id == board_id))
+    result = await db.execute(
+        select(Board).options(defer(Board.settings)).where(Board.id == board_id)
+    )
     board = result.scalar_one_or_none()
 
     if not board:
@@ -638,27 +772,27 @@ async def restore_board_version(
             detail="Version not found",
         )
 
-    # Save current state as new version
+    # Save current state as new version, with the live edits not saved yet
+    await board_persister.flush([str(board_id)])
     max_version_result = await db.execute(
         select(func.max(BoardVersion.version_number))
         .where(BoardVersion.board_id == board_id)
     )
     max_version = max_version_result.scalar() or 0
 
-    backup_version = BoardVersion(
-        board_id=board_id,
-        version_number=max_version + 1,
-        canvas_data=board.canvas_data,
-        created_by=user.id,
+    # Load the version first: the backup may share its chunks
+    canvas = await load_version(db, version)
+    await create_version(
+        db, board_id, max_version + 1, await read_canvas(db, board), created_by=user.id
     )
-    db.add(backup_version)
 
     # Restore the canvas data
-    board.canvas_data = version.canvas_data
+    await write_canvas(db, board, canvas)
 
     await db.flush()
     await db.refresh(board)
+    await db.commit()
+    # Connected clients see the restored canvas
+    await board_residency.replace_canvas(str(board_id), canvas, board.canvas_revision)
 
-    response = BoardDetailResponse.model_validate(board)
-    response.role = role
-    return response
+    return await board_detail(db, board, role)
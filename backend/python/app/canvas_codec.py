@@ -0,0 +1,105 @@
+"""Compressed binary encoding of canvases (``Board.canvas_blob``).
+
+A blob is a one-byte format tag followed by the encoded canvas:
+
+    0x01  JSON, zlib-compressed
+    0x02  JSON, zstd-compressed     (needs zstandard)
+    0x03  msgpack, zlib-compressed  (needs msgpack)
+    0x04  msgpack, zstd-compressed  (needs msgpack and zstandard)
+
+Postgres stores blobs as opaque ``bytea``: unlike JSONB, nothing is parsed
+or re-serialized on the way in and out, and the stored size is a fraction
+of the JSON. Blobs are only decoded where the content is needed (see
+``read_canvas`` in app.canvas_store). The tag makes every blob decodable
+whatever ``canvas_blob_format`` was when it was written.
+"""
+
+import json
+import logging
+import zlib
+from functools import lru_cache
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"json+zlib": 1, "json+zstd": 2, "msgpack+zlib": 3, "msgpack+zstd": 4}
+_FORMAT_NAMES = {tag: name for name, tag in FORMATS.items()}
+DEFAULT_FORMAT = "json+zlib"
+
+_ZLIB_LEVEL = 6
+_ZSTD_LEVEL = 3
+
+
+class CanvasCodecError(ValueError):
+    """A blob or format that cannot be encoded or decoded here."""
+
+
+def format_available(name: str) -> bool:
+    if name not in FORMATS:
+        return False
+    serializer, compression = name.split("+")
+    return (serializer != "msgpack" or msgpack is not None) and (
+        compression != "zstd" or zstandard is not None
+    )
+
+
+@lru_cache
+def configured_format() -> str:
+    """The ``canvas_blob_format`` setting, or json+zlib if it is not usable here."""
+    name = get_settings().canvas_blob_format
+    if format_available(name):
+        return name
+    logger.warning(f"Canvas blob format {name!r} is not available; using {DEFAULT_FORMAT}")
+    return DEFAULT_FORMAT
+
+
+def encode_blob(canvas: dict, name: str | None = None) -> bytes:
+    """Encode a canvas (CPU bound for large boards; run it in a thread)."""
+    name = name or configured_format()
+    if not format_available(name):
+        raise CanvasCodecError(f"Canvas blob format {name!r} is not available")
+    serializer, compression = name.split("+")
+    if serializer == "msgpack":
+        payload = msgpack.packb(canvas, use_bin_type=True)
+    else:
+        payload = json.dumps(canvas, separators=(",", ":")).encode()
+    if compression == "zstd":
+        payload = zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(payload)
+    else:
+        payload = zlib.compress(payload, _ZLIB_LEVEL)
+    return bytes((FORMATS[name],)) + payload
+
+
+def blob_format(blob: bytes) -> str:
+    """The format name of a blob's tag."""
+    name = _FORMAT_NAMES.get(blob[0]) if blob else None
+    if name is None:
+        raise CanvasCodecError("Unknown canvas blob format")
+    return name
+
+
+def decode_blob(blob: bytes) -> dict:
+    """Decode a blob of any format (CPU bound for large boards; run it in a thread)."""
+    name = blob_format(blob)
+    if not format_available(name):
+        raise CanvasCodecError(f"Canvas blob format {name!r} is not available")
+    serializer, compression = name.split("+")
+    payload = memoryview(blob)[1:]
+    if compression == "zstd":
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        payload = zlib.decompress(payload)
+    if serializer == "msgpack":
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload)
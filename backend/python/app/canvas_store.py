@@ -0,0 +1,367 @@
+"""Normalized canvas storage: one row per stroke and per object.
+
+Boards with ``canvas_storage = "normalized"`` keep their strokes and
+objects in ``board_strokes``/``board_objects`` keyed by (board_id,
+element_id); ``Board.canvas_data`` only holds the rest of the canvas
+(layers). Saves then write just the elements that changed, and upserts
+skip rows whose data is unchanged, so an auto-save of a large board no
+longer rewrites (and re-WALs) the whole document.
+
+Boards with ``canvas_storage = "compressed"`` keep the whole canvas in
+``Board.canvas_blob`` (see app.canvas_codec), which is only decoded when
+the content is read.
+
+``read_canvas`` assembles the usual ``{"strokes", "objects", "layers"}``
+dict for either storage mode from one streamed query. Existing boards
+are moved over with ``migrate_boards``:
+
+    cd backend/python
+    python -m app.canvas_store --batch-size 50
+    python -m app.canvas_store --to compressed
+    python -m app.canvas_store --to document   # move back
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Iterable
+from uuid import UUID, uuid4
+
+from sqlalchemy import (
+    String,
+    all_,
+    bindparam,
+    delete,
+    func,
+    inspect,
+    literal_column,
+    select,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer_group
+
+from app.canvas_codec import decode_blob, encode_blob
+from app.models.board import Board, BoardObject, BoardStroke
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DOCUMENT = "document"
+STORAGE_NORMALIZED = "normalized"
+STORAGE_COMPRESSED = "compressed"
+STORAGE_MODES = (STORAGE_DOCUMENT, STORAGE_NORMALIZED, STORAGE_COMPRESSED)
+
+ELEMENT_MODELS = {"strokes": BoardStroke, "objects": BoardObject}
+
+# Rows per INSERT; asyncpg allows 32767 bind parameters per statement
+_UPSERT_CHUNK = 1000
+# Rows fetched per round trip when streaming a canvas
+_STREAM_CHUNK = 500
+
+
+def element_key(element: dict) -> str | None:
+    element_id = element.get("id")
+    return str(element_id) if element_id is not None else None
+
+
+def split_canvas(canvas: dict) -> tuple[dict, dict[str, list[dict]]]:
+    """Split a canvas into what stays in ``canvas_data`` and its elements.
+
+    Elements without an id get one, since rows are keyed by it.
+    """
+    rest = {key: value for key, value in canvas.items() if key not in ELEMENT_MODELS}
+    elements = {}
+    for kind in ELEMENT_MODELS:
+        elements[kind] = [
+            element if element.get("id") is not None else {**element, "id": uuid4().hex}
+            for element in canvas.get(kind) or []
+            if isinstance(element, dict)
+        ]
+    return rest, elements
+
+
+# Writing
+
+
+async def upsert_elements(
+    session: AsyncSession, board_id: UUID, kind: str, elements: Iterable[dict]
+) -> None:
+    """Insert or update elements of a board; unchanged rows are not rewritten."""
+    model = ELEMENT_MODELS[kind]
+    # One row per id (the last one wins, as in ElementStore)
+    rows = list(
+        {
+            key: {"board_id": board_id, "element_id": key, "data": element}
+            for element in elements
+            if (key := element_key(element)) is not None
+        }.values()
+    )
+    for i in range(0, len(rows), _UPSERT_CHUNK):
+        statement = insert(model).values(rows[i : i + _UPSERT_CHUNK])
+        statement = statement.on_conflict_do_update(
+            index_elements=[model.board_id, model.element_id],
+            set_={"data": statement.excluded.data, "updated_at": func.now()},
+            where=model.data.is_distinct_from(statement.excluded.data),
+        )
+        await session.execute(statement)
+
+
+async def delete_elements(
+    session: AsyncSession, board_id: UUID, kind: str, element_ids: Iterable[Any]
+) -> None:
+    """Delete elements of a board by id."""
+    model = ELEMENT_MODELS[kind]
+    keys = [str(element_id) for element_id in element_ids if element_id is not None]
+    if keys:
+        await session.execute(
+            delete(model).where(model.board_id == board_id, model.element_id.in_(keys))
+        )
+
+
+async def clear_elements(session: AsyncSession, board_id: UUID) -> None:
+    """Delete all elements of a board."""
+    for model in ELEMENT_MODELS.values():
+        await session.execute(delete(model).where(model.board_id == board_id))
+
+
+async def replace_elements(session: AsyncSession, board_id: UUID, canvas: dict) -> dict:
+    """Make a board's rows match a full canvas, writing only the differences.
+
+    Returns the part of the canvas that belongs in ``canvas_data``.
+    """
+    rest, elements = split_canvas(canvas)
+    for kind, model in ELEMENT_MODELS.items():
+        keys = [element_key(element) for element in elements[kind]]
+        # One array parameter, however many elements the board has
+        kept = bindparam(f"kept_{kind}", keys, type_=ARRAY(String))
+        await session.execute(
+            delete(model).where(model.board_id == board_id, model.element_id != all_(kept))
+        )
+        await upsert_elements(session, board_id, kind, elements[kind])
+    return rest
+
+
+async def _store_canvas(session: AsyncSession, board: Board, canvas: dict, storage: str) -> None:
+    if storage == STORAGE_NORMALIZED:
+        board.canvas_data = await replace_elements(session, board.id, canvas)
+        board.canvas_blob = None
+        return
+    if board.canvas_storage == STORAGE_NORMALIZED:
+        await clear_elements(session, board.id)
+    if storage == STORAGE_COMPRESSED:
+        board.canvas_blob = await asyncio.to_thread(encode_blob, canvas)
+        board.canvas_data = {}
+    else:
+        board.canvas_data = canvas
+        board.canvas_blob = None
+
+
+async def write_canvas(session: AsyncSession, board: Board, canvas: dict) -> None:
+    """Store a full canvas on a board row in its storage mode."""
+    await _store_canvas(session, board, canvas, board.canvas_storage)
+    board.canvas_revision = Board.canvas_revision + 1
+
+
+# Patching
+
+PATCH_KINDS = ("strokes", "objects", "layers")
+
+
+class CanvasPatchError(ValueError):
+    """An operation of a canvas patch does not apply to the board."""
+
+
+def apply_operation(elements: dict[str, dict | None], op: dict, index: int) -> None:
+    """Apply one add/update/remove operation to ``{id: element}`` (None if absent).
+
+    ``update`` merges ``data`` into the element's top-level keys.
+    """
+    element_id = op["id"]
+    current = elements.get(element_id)
+    if op["op"] == "remove":
+        elements[element_id] = None
+        return
+    if op.get("data") is None:
+        raise CanvasPatchError(f"Operation {index}: {op['op']} needs data")
+    if op["op"] == "add":
+        if current is not None:
+            raise CanvasPatchError(f"Operation {index}: {op['kind']} {element_id} already exists")
+        elements[element_id] = {**op["data"], "id": element_id}
+    else:
+        if current is None:
+            raise CanvasPatchError(f"Operation {index}: {op['kind']} {element_id} not found")
+        elements[element_id] = {**current, **op["data"], "id": current["id"]}
+
+
+def _patch_list(items: list, ops: list[tuple[int, dict]]) -> list:
+    elements = {element_key(item): item for item in items if isinstance(item, dict)}
+    for index, op in ops:
+        apply_operation(elements, op, index)
+    # Kept elements keep their place, added ones go on top
+    return [element for element in elements.values() if element is not None]
+
+
+async def patch_canvas(session: AsyncSession, board: Board, ops: list[dict]) -> None:
+    """Apply ``{"op", "kind", "id", "data"}`` operations to a stored canvas, in order.
+
+    Raises ``CanvasPatchError`` if one does not apply; nothing should be
+    committed then. Normalized boards only read and write the elements the
+    operations name.
+    """
+    by_kind: dict[str, list[tuple[int, dict]]] = {kind: [] for kind in PATCH_KINDS}
+    for index, op in enumerate(ops):
+        by_kind[op["kind"]].append((index, op))
+    if board.canvas_storage != STORAGE_NORMALIZED:
+        canvas = await read_canvas(session, board)
+        for kind, kind_ops in by_kind.items():
+            if kind_ops:
+                canvas[kind] = _patch_list(canvas.get(kind) or [], kind_ops)
+        await _store_canvas(session, board, canvas, board.canvas_storage)
+        return
+
+    await load_canvas_columns(session, board)
+    canvas = dict(board.canvas_data or {})
+    if by_kind["layers"]:
+        canvas["layers"] = _patch_list(canvas.get("layers") or [], by_kind["layers"])
+        board.canvas_data = canvas
+    for kind, model in ELEMENT_MODELS.items():
+        if not by_kind[kind]:
+            continue
+        ids = {op["id"] for _, op in by_kind[kind]}
+        result = await session.execute(
+            select(model.element_id, model.data).where(
+                model.board_id == board.id, model.element_id.in_(ids)
+            )
+        )
+        elements: dict[str, dict | None] = dict(result.all())
+        for index, op in by_kind[kind]:
+            apply_operation(elements, op, index)
+        await delete_elements(
+            session, board.id, kind, [key for key, data in elements.items() if data is None]
+        )
+        await upsert_elements(
+            session, board.id, kind, [data for data in elements.values() if data is not None]
+        )
+
+
+# Reading
+
+
+async def stream_elements(
+    session: AsyncSession, board_id: UUID
+) -> AsyncIterator[tuple[str, dict]]:
+    """Yield ``(kind, element)`` for a board's rows in draw order.
+
+    Strokes and objects come from a single UNION ALL query read through a
+    server-side cursor, so memory use does not depend on the board size.
+    """
+    query = union_all(
+        *(
+            select(literal_column(f"'{kind}'").label("kind"), model.position, model.data).where(
+                model.board_id == board_id
+            )
+            for kind, model in ELEMENT_MODELS.items()
+        )
+    ).order_by("kind", "position")
+    result = await session.stream(query.execution_options(yield_per=_STREAM_CHUNK))
+    async for kind, _, data in result:
+        yield kind, data
+
+
+async def load_canvas_columns(session: AsyncSession, board: Board) -> None:
+    """Load a board's deferred canvas columns unless they are already loaded.
+
+    Queries that know they need the canvas can load them up front with
+    ``.options(undefer_group("canvas"))``.
+    """
+    unloaded = inspect(board).unloaded.intersection(("canvas_data", "canvas_blob"))
+    if unloaded:
+        await session.refresh(board, sorted(unloaded))
+
+
+async def read_canvas(session: AsyncSession, board: Board) -> dict:
+    """A board's full canvas (strokes, objects and layers) in any storage mode."""
+    await load_canvas_columns(session, board)
+    if board.canvas_storage == STORAGE_COMPRESSED and board.canvas_blob is not None:
+        return await asyncio.to_thread(decode_blob, board.canvas_blob)
+    canvas = dict(board.canvas_data or {})
+    if board.canvas_storage != STORAGE_NORMALIZED:
+        return canvas
+    elements: dict[str, list] = {kind: [] for kind in ELEMENT_MODELS}
+    async for kind, data in stream_elements(session, board.id):
+        elements[kind].append(data)
+    return {**canvas, **elements}
+
+
+# Migration
+
+
+async def migrate_board(session: AsyncSession, board: Board, storage: str) -> bool:
+    """Move a board's elements to another storage mode; False if already there."""
+    if board.canvas_storage == storage:
+        return False
+    canvas = await read_canvas(session, board)
+    await _store_canvas(session, board, canvas, storage)
+    board.canvas_storage = storage
+    return True
+
+
+async def migrate_boards(
+    session_maker,
+    storage: str = STORAGE_NORMALIZED,
+    batch_size: int = 50,
+    limit: int | None = None,
+) -> int:
+    """Convert boards to a storage mode, ``batch_size`` boards per transaction.
+
+    Rows are locked with SKIP LOCKED, so the server can keep saving boards
+    (and other migrations can run) meanwhile. Returns the number of boards
+    converted.
+    """
+    migrated = 0
+    while limit is None or migrated < limit:
+        size = batch_size if limit is None else min(batch_size, limit - migrated)
+        async with session_maker() as session:
+            async with session.begin():
+                result = await session.execute(
+                    select(Board)
+                    .options(undefer_group("canvas"))
+                    .where(Board.canvas_storage != storage)
+                    .order_by(Board.id)
+                    .limit(size)
+                    .with_for_update(skip_locked=True)
+                )
+                boards = result.scalars().all()
+                for board in boards:
+                    await migrate_board(session, board, storage)
+        if not boards:
+            break
+        migrated += len(boards)
+        logger.info(f"Converted {migrated} boards to {storage} canvas storage")
+    return migrated
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Convert boards between canvas storage modes")
+    parser.add_argument("--to", choices=STORAGE_MODES, default=STORAGE_NORMALIZED)
+    parser.add_argument("--batch-size", type=int, default=50, help="Boards per transaction")
+    parser.add_argument("--limit", type=int, help="Stop after this many boards")
+    args = parser.parse_args(argv)
+
+    from app.database import async_session_maker, close_db
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    async def run():
+        try:
+            count = await migrate_boards(async_session_maker, args.to, args.batch_size, args.limit)
+        finally:
+            await close_db()
+        print(f"{count} boards converted to {args.to} storage")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,21 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sess
 from sqlalchemy.orm import DeclarativeBase
 
 from app.config import get_settings
+from app.metrics import instrument_pool
+from app.tracing import tracer
 
 settings = get_settings()
 
 # Create async engine
 engine = create_async_engine(
     settings.database_url,
-    echo=settings.debug,
+    echo=settings.sql_echo,
     pool_pre_ping=True,
     pool_size=5,
     max_overflow=10,
 )
+tracer.instrument_engine(engine)
+instrument_pool(engine)
 
 # Session factory
 async_session_maker = async_sessionmaker(
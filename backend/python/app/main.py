@@ -6,11 +6,20 @@ from contextlib import asynccontextmanager
 import socketio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.config import get_settings
-from app.socket_handlers import sio
+from app.socket_handlers import (
+    sio,
+    board_sync,
+    board_residency,
+    board_persister,
+    client_backpressure,
+)
 from app.database import init_db, close_db
 from app.api import api_router
+from app.metrics import MetricsMiddleware, loop_lag_monitor, registry
+from app.version_retention import version_retention
 
 # Configure logging
 logging.basicConfig(
@@ -36,9 +45,27 @@ async def lifespan(app: FastAPI):
         logger.warning(f"Database initialization failed: {e}")
         logger.info("Server will continue without database (use init.sql manually)")
 
+    # Start cross-node board state sync
+    if board_sync is not None:
+        await board_sync.start()
+
+    # Save live edits and evict idle boards in the background
+    board_persister.start()
+    board_residency.start()
+    client_backpressure.start()
+    loop_lag_monitor.start()
+    version_retention.start()
+
     yield
 
     # Cleanup
+    await version_retention.stop()
+    await loop_lag_monitor.stop()
+    await client_backpressure.stop()
+    await board_residency.stop()
+    await board_persister.stop()
+    if board_sync is not None:
+        await board_sync.stop()
     await close_db()
     logger.info("Shutting down server...")
 
@@ -59,6 +86,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, prefix="/api")
 
 
 # Include API routes
@@ -69,7 +97,23 @@ app.include_router(api_router, prefix="/api")
 @app.get("/health")
 async def health_check():
     """Health check endpoint for load balancers."""
-    return {"status": "healthy", "service": "whiteboard-backend"}
+    return {
+        "status": "healthy",
+        "service": "whiteboard-backend",
+        "persistence": {
+            "queue_depth": board_persister.queue_depth,
+            "flush_lag_seconds": round(board_persister.flush_lag, 3),
+            "boards_flushed": board_persister.boards_flushed,
+            "flush_failures": board_persister.flush_failures,
+            "last_flush_seconds": round(board_persister.last_flush_seconds, 3),
+        },
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/")
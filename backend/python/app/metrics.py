@@ -0,0 +1,301 @@
+"""Prometheus metrics, served as text by ``GET /metrics``.
+
+A small dependency-free registry: histograms are updated on the hot
+paths (a bisect and two additions per observation) and everything else
+is read from existing state and counters when the endpoint is scraped.
+
+Instrumentation helpers cover Socket.io handlers, ``/api`` routes (ASGI
+middleware), SQLAlchemy pool checkouts and event-loop lag.
+"""
+
+import asyncio
+import bisect
+import functools
+import math
+import time
+from typing import Callable, Iterable
+
+# Seconds; suits handler, request and pool wait latencies
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # per bucket, not cumulative
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram:
+    """Histogram with optional labels; ``labels(...)`` children can be kept and reused."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children: dict[tuple, _HistogramChild] = {}
+
+    def labels(self, *values) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), child.counts):
+                cumulative += count
+                labels = _labels(self.labelnames, values, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read when the registry is rendered.
+
+    ``collect`` returns a number, or a dict of label value tuples to
+    numbers when ``labelnames`` are given.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], float | dict],
+        metric_type: str = "gauge",
+        labelnames: Iterable[str] = (),
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        value = self.collect()
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        for values, number in samples:
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(number)}")
+        return lines
+
+
+class Registry:
+    """Ordered collection of metrics rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics: list = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames=(), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def gauge(self, name: str, documentation: str, collect, labelnames=()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, collect, "gauge", labelnames))
+
+    def counter(self, name: str, documentation: str, collect, labelnames=()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, collect, "counter", labelnames))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+socketio_event_seconds = registry.histogram(
+    "whiteboard_socketio_event_duration_seconds",
+    "Time spent in Socket.io event handlers",
+    ("event",),
+)
+http_request_seconds = registry.histogram(
+    "whiteboard_http_request_duration_seconds",
+    "Latency of /api requests by route template",
+    ("method", "route", "status"),
+)
+pool_checkout_seconds = registry.histogram(
+    "whiteboard_db_pool_checkout_seconds",
+    "Time to get a database connection from the pool (including opening new ones)",
+)
+event_loop_lag_seconds = registry.histogram(
+    "whiteboard_event_loop_lag_seconds",
+    "How late the event loop ran a periodic wakeup",
+)
+
+
+# Socket.io
+
+
+def instrument_socketio(sio, namespace: str = "/"):
+    """Time every registered Socket.io handler (call once all are registered)."""
+    handlers = sio.handlers.get(namespace, {})
+    for event, handler in list(handlers.items()):
+        if asyncio.iscoroutinefunction(handler):
+            handlers[event] = _timed(handler, socketio_event_seconds.labels(event))
+
+
+def _timed(handler, child: _HistogramChild):
+    @functools.wraps(handler)
+    async def timed(*args):
+        started = time.perf_counter()
+        try:
+            return await handler(*args)
+        finally:
+            child.observe(time.perf_counter() - started)
+
+    return timed
+
+
+# HTTP
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing requests to routes under ``prefix``.
+
+    Requests are labelled with the matched route template (e.g.
+    ``/api/boards/{board_id}``); unmatched paths are not recorded.
+    """
+
+    def __init__(self, app, prefix: str = "/api"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                http_request_seconds.labels(scope["method"], route.path, status).observe(
+                    time.perf_counter() - started
+                )
+
+
+# Database
+
+
+def instrument_pool(engine):
+    """Time connection checkouts of a (sync or async) engine's pool."""
+    pool = getattr(engine, "sync_engine", engine).pool
+    connect = pool.connect
+
+    @functools.wraps(connect)
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            pool_checkout_seconds.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    registry.gauge(
+        "whiteboard_db_pool_connections",
+        "Database pool connections by state",
+        lambda: {
+            ("checked_out",): pool.checkedout(),
+            ("idle",): pool.checkedin(),
+            ("overflow",): max(pool.overflow(), 0),
+        },
+        ("state",),
+    )
+
+
+# Event loop
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag by timing a periodic sleep."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(loop.time() - started - self.interval, 0.0)
+            event_loop_lag_seconds.observe(self.last_lag)
+
+
+loop_lag_monitor = LoopLagMonitor()
+registry.gauge(
+    "whiteboard_event_loop_lag_last_seconds",
+    "Event-loop lag at the latest measurement",
+    lambda: loop_lag_monitor.last_lag,
+)
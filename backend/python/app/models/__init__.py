@@ -1,6 +1,21 @@
 """SQLAlchemy models."""
 
 from app.models.user import User
-from app.models.board import Board, BoardMember, BoardVersion
+from app.models.board import (
+    Board,
+    BoardMember,
+    BoardVersion,
+    BoardVersionChunk,
+    BoardStroke,
+    BoardObject,
+)
 
-__all__ = ["User", "Board", "BoardMember", "BoardVersion"]
+__all__ = [
+    "User",
+    "Board",
+    "BoardMember",
+    "BoardVersion",
+    "BoardVersionChunk",
+    "BoardStroke",
+    "BoardObject",
+]
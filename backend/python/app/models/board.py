@@ -4,7 +4,19 @@ from datetime import datetime
 from typing import Optional, Any
 from uuid import UUID, uuid4
 
-from sqlalchemy import String, Boolean, DateTime, Integer, ForeignKey, Text, func
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Identity,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    func,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB
 
@@ -44,10 +56,37 @@ class Board(Base):
         String(500),
         nullable=True,
     )
+    # The canvas columns are deferred: most queries only need metadata, and
+    # read_canvas (app.canvas_store) loads them when the content is needed
     canvas_data: Mapped[dict[str, Any]] = mapped_column(
         JSONB,
         default=dict,
         nullable=False,
+        deferred=True,
+        deferred_group="canvas",
+    )
+    # "document": strokes and objects live in canvas_data; "normalized": in
+    # board_strokes/board_objects, with only the rest (layers) in canvas_data;
+    # "compressed": the whole canvas is in canvas_blob (see app.canvas_codec)
+    canvas_blob: Mapped[Optional[bytes]] = mapped_column(
+        LargeBinary,
+        nullable=True,
+        deferred=True,
+        deferred_group="canvas",
+    )
+    canvas_storage: Mapped[str] = mapped_column(
+        String(20),
+        nullable=False,
+        default="document",
+        server_default="document",
+    )
+    # Incremented on every stored canvas change (optimistic concurrency for
+    # PATCH /api/boards/{id}/canvas)
+    canvas_revision: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
     )
     settings: Mapped[dict[str, Any]] = mapped_column(
         JSONB,
@@ -140,9 +179,15 @@ class BoardVersion(Base):
         Integer,
         nullable=False,
     )
-    canvas_data: Mapped[dict[str, Any]] = mapped_column(
+    # Full copy of the canvas (versions stored before content-addressed
+    # chunks); newer versions have a manifest instead, see app.version_store
+    canvas_data: Mapped[Optional[dict[str, Any]]] = mapped_column(
         JSONB,
-        nullable=False,
+        nullable=True,
+    )
+    manifest: Mapped[Optional[dict[str, Any]]] = mapped_column(
+        JSONB,
+        nullable=True,
     )
     created_by: Mapped[Optional[UUID]] = mapped_column(
         PG_UUID(as_uuid=True),
@@ -159,3 +204,101 @@ class BoardVersion(Base):
 
     def __repr__(self) -> str:
         return f"<BoardVersion {self.board_id} v{self.version_number}>"
+
+
+class BoardVersionChunk(Base):
+    """A stroke or object of board versions, stored once per board by content hash."""
+
+    __tablename__ = "board_version_chunks"
+
+    board_id: Mapped[UUID] = mapped_column(
+        PG_UUID(as_uuid=True),
+        ForeignKey("boards.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    hash: Mapped[str] = mapped_column(
+        String(64),
+        primary_key=True,
+    )
+    data: Mapped[dict[str, Any]] = mapped_column(
+        JSONB,
+        nullable=False,
+    )
+    size: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+    )
+
+    def __repr__(self) -> str:
+        return f"<BoardVersionChunk {self.board_id}/{self.hash[:12]}>"
+
+
+class BoardStroke(Base):
+    """A stroke of a board with normalized canvas storage (see app.canvas_store)."""
+
+    __tablename__ = "board_strokes"
+    __table_args__ = (Index("idx_board_strokes_position", "board_id", "position"),)
+
+    board_id: Mapped[UUID] = mapped_column(
+        PG_UUID(as_uuid=True),
+        ForeignKey("boards.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    element_id: Mapped[str] = mapped_column(
+        String(255),
+        primary_key=True,
+    )
+    # Draw order; updates keep the position of the first insert
+    position: Mapped[int] = mapped_column(
+        BigInteger,
+        Identity(),
+        nullable=False,
+    )
+    data: Mapped[dict[str, Any]] = mapped_column(
+        JSONB,
+        nullable=False,
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+    )
+
+    def __repr__(self) -> str:
+        return f"<BoardStroke {self.board_id}/{self.element_id}>"
+
+
+class BoardObject(Base):
+    """A shape or object of a board with normalized canvas storage."""
+
+    __tablename__ = "board_objects"
+    __table_args__ = (Index("idx_board_objects_position", "board_id", "position"),)
+
+    board_id: Mapped[UUID] = mapped_column(
+        PG_UUID(as_uuid=True),
+        ForeignKey("boards.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    element_id: Mapped[str] = mapped_column(
+        String(255),
+        primary_key=True,
+    )
+    position: Mapped[int] = mapped_column(
+        BigInteger,
+        Identity(),
+        nullable=False,
+    )
+    data: Mapped[dict[str, Any]] = mapped_column(
+        JSONB,
+        nullable=False,
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+    )
+
+    def __repr__(self) -> str:
+        return f"<BoardObject {self.board_id}/{self.element_id}>"
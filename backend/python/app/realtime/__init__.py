@@ -0,0 +1,8 @@
+"""Real-time collaboration state."""
+
+from app.realtime.store import ElementStore
+from app.realtime.spatial import GridIndex
+from app.realtime.stroke import Stroke
+from app.realtime.state import BoardState
+
+__all__ = ["ElementStore", "GridIndex", "Stroke", "BoardState"]
@@ -0,0 +1,283 @@
+"""Per-client outbound limits for slow connections."""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from app.realtime.codec import POINT_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class ClientBackpressure:
+    """Holds back mergeable updates from clients that cannot keep up.
+
+    python-socketio queues every packet for a client in its engine.io
+    socket until the transport has written it, without limit. A check task
+    measures each local client's queue every ``interval_ms``; a client
+    with more than ``max_packets`` packets or ``max_bytes`` bytes queued is
+    lagging.
+
+    Lagging clients are skipped by the stroke and cursor broadcasts (see
+    app.realtime.broadcast and app.realtime.presence), which hand their
+    updates to ``hold_strokes``/``hold_cursors`` instead: points of the
+    same stroke are merged into one delta and only the latest position of
+    each cursor is kept. Held updates go out as one ``stroke_batch`` and
+    one ``cursor_batch`` once the queue is below half the limits again,
+    or, for strokes, before the next sequenced event of the room (see
+    ``release_room``). Other events are never held, so they keep their
+    order.
+
+    A client still lagging after ``resync_after`` seconds, or whose held
+    points exceed ``max_bytes``, gets nothing mergeable anymore; once its
+    queue drains, ``on_resync(sid)`` sends it a full board snapshot.
+    """
+
+    def __init__(
+        self,
+        sio,
+        state,
+        max_packets: int = 256,
+        max_bytes: int = 1024 * 1024,
+        resync_after: float = 10.0,
+        interval_ms: int = 100,
+        on_resync: Callable[[str], Awaitable] | None = None,
+        namespace: str = "/",
+    ):
+        self.sio = sio
+        self.state = state
+        self.max_packets = max_packets
+        self.max_bytes = max_bytes
+        self.resync_after = resync_after
+        self.interval = interval_ms / 1000
+        self.on_resync = on_resync
+        self.namespace = namespace
+        # sid -> {"since", "strokes", "seq", "cursors", "expired", "held_bytes", "resync"}
+        self.lagging: dict[str, dict] = {}
+        self.backlogs: dict[str, tuple[int, int]] = {}  # sid -> (packets, bytes) at last check
+        self._task: asyncio.Task | None = None
+
+        # Counters
+        self.updates_merged = 0  # stroke deltas folded into a held delta
+        self.cursors_dropped = 0  # held cursor positions overwritten
+        self.updates_dropped = 0  # mergeable updates dropped while awaiting a resync
+        self.resyncs = 0
+        self.lag_episodes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0 and (self.max_packets > 0 or self.max_bytes > 0)
+
+    def start(self):
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # Measuring
+
+    def backlog(self, sid: str) -> tuple[int, int]:
+        """Packets and bytes queued for a client on this node."""
+        eio_sid = self.sio.manager.eio_sid_from_sid(sid, self.namespace)
+        socket = self.sio.eio.sockets.get(eio_sid) if eio_sid is not None else None
+        if socket is None:
+            return 0, 0
+        # asyncio.Queue has no public view of its items
+        packets = list(socket.queue._queue)
+        size = 0
+        for packet in packets:
+            data = getattr(packet, "data", None)
+            if isinstance(data, (str, bytes, bytearray)):
+                size += len(data)
+        return len(packets), size
+
+    def _over(self, packets: int, size: int, ratio: float = 1.0) -> bool:
+        return (0 < self.max_packets * ratio < packets) or (0 < self.max_bytes * ratio < size)
+
+    def lagging_in(self, board_id: str) -> list[str]:
+        """The lagging clients of a board room."""
+        if not self.lagging:
+            return []
+        return [sid for sid in self.state.board_users.get(board_id, ()) if sid in self.lagging]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Client backlog check failed: {e}")
+
+    async def check(self):
+        """Measure every local client and update its lagging status."""
+        now = time.monotonic()
+        backlogs = {}
+        for sid in list(self.state.users):
+            packets, size = backlogs[sid] = self.backlog(sid)
+            client = self.lagging.get(sid)
+            if client is None:
+                if self._over(packets, size):
+                    self.lagging[sid] = self._new_client(now)
+                    self.lag_episodes += 1
+                continue
+
+            if not self._over(packets, size, 0.5):
+                # Drained enough to catch up
+                del self.lagging[sid]
+                if client["resync"]:
+                    self.resyncs += 1
+                    if self.on_resync is not None:
+                        await self.on_resync(sid)
+                else:
+                    await self._send_held(sid, client)
+            elif not client["resync"] and now - client["since"] > self.resync_after:
+                self._drop_held(client)
+        self.backlogs = backlogs
+
+    @staticmethod
+    def _new_client(now: float) -> dict:
+        return {
+            "since": now,
+            "strokes": {},  # stroke_id -> stroke payload in the client's point format
+            "seq": None,
+            "cursors": {},  # cursor sid -> cursor
+            "expired": set(),
+            "held_bytes": 0,
+            "resync": False,
+        }
+
+    def _drop_held(self, client: dict):
+        client["resync"] = True
+        client["strokes"] = {}
+        client["cursors"] = {}
+        client["expired"] = set()
+        client["held_bytes"] = 0
+
+    # Holding
+
+    def hold_strokes(self, sid: str, strokes: list[dict], seq: int | None = None):
+        """Keep stroke point deltas for a lagging client, merged per stroke."""
+        client = self.lagging[sid]
+        if client["resync"]:
+            self.updates_dropped += len(strokes)
+            return
+        held = client["strokes"]
+        # held_bytes counts JSON points at their binary size; it only needs
+        # to tell a client that will not catch up by merging alone
+        for stroke in strokes:
+            pending = held.get(stroke["stroke_id"])
+            if pending is None:
+                if "points_bin" in stroke:
+                    stroke = {**stroke, "points_bin": bytearray(stroke["points_bin"])}
+                    added = len(stroke["points_bin"])
+                else:
+                    stroke = {**stroke, "points": list(stroke["points"])}
+                    added = len(stroke["points"]) * POINT_SIZE
+                held[stroke["stroke_id"]] = stroke
+            elif "points_bin" in pending and "points_bin" in stroke:
+                pending["points_bin"] += stroke["points_bin"]
+                added = len(stroke["points_bin"])
+                self.updates_merged += 1
+            elif "points" in pending and "points" in stroke:
+                pending["points"].extend(stroke["points"])
+                added = len(stroke["points"]) * POINT_SIZE
+                self.updates_merged += 1
+            else:
+                # A client gets one point format; nothing sensible to merge
+                continue
+            client["held_bytes"] += added
+        if seq is not None:
+            client["seq"] = seq
+        if 0 < self.max_bytes < client["held_bytes"]:
+            self._drop_held(client)
+
+    def hold_cursors(self, sid: str, cursors: list[dict], expired: list[str]):
+        """Keep the latest cursor positions for a lagging client."""
+        client = self.lagging[sid]
+        if client["resync"]:
+            self.updates_dropped += len(cursors)
+            return
+        held = client["cursors"]
+        for cursor in cursors:
+            if cursor["sid"] in held:
+                self.cursors_dropped += 1
+            held[cursor["sid"]] = cursor
+            client["expired"].discard(cursor["sid"])
+        for cursor_sid in expired:
+            held.pop(cursor_sid, None)
+            client["expired"].add(cursor_sid)
+
+    # Releasing
+
+    async def release_room(self, board_id: str):
+        """Send held stroke points to a room's lagging clients now.
+
+        Called before events that must not overtake buffered points.
+        """
+        if not self.lagging:
+            return
+        for sid in self.lagging_in(board_id):
+            client = self.lagging[sid]
+            if client["strokes"]:
+                await self._send_strokes(sid, client)
+
+    async def _send_strokes(self, sid: str, client: dict):
+        strokes = list(client["strokes"].values())
+        extra = {"seq": client["seq"]} if client["seq"] is not None else {}
+        client["strokes"] = {}
+        client["seq"] = None
+        client["held_bytes"] = 0
+        await self.sio.emit("stroke_batch", {"strokes": strokes, **extra}, to=sid)
+
+    async def _send_held(self, sid: str, client: dict):
+        if client["strokes"]:
+            await self._send_strokes(sid, client)
+        if client["cursors"] or client["expired"]:
+            await self.sio.emit(
+                "cursor_batch",
+                {"cursors": list(client["cursors"].values()), "expired": list(client["expired"])},
+                to=sid,
+            )
+
+    def discard_room(self, board_id: str):
+        """Drop held stroke points of a room (e.g. after the board is cleared)."""
+        for sid in self.lagging_in(board_id):
+            client = self.lagging[sid]
+            client["strokes"] = {}
+            client["seq"] = None
+            client["held_bytes"] = 0
+
+    def remove(self, sid: str):
+        """Forget a client (on leave/disconnect)."""
+        self.lagging.pop(sid, None)
+        self.backlogs.pop(sid, None)
+
+    # Reporting
+
+    def clients(self) -> list[dict]:
+        """Backlog and lag of every client at the last check, most backed-up first."""
+        now = time.monotonic()
+        report = []
+        for sid, (packets, size) in self.backlogs.items():
+            client = self.lagging.get(sid)
+            user = self.state.users.get(sid, {})
+            report.append(
+                {
+                    "sid": sid,
+                    "board_id": user.get("board_id"),
+                    "user_id": user.get("user_id"),
+                    "queued_packets": packets,
+                    "queued_bytes": size,
+                    "lagging_seconds": round(now - client["since"], 3) if client else 0.0,
+                    "held_strokes": len(client["strokes"]) if client else 0,
+                    "held_cursors": len(client["cursors"]) if client else 0,
+                    "awaiting_resync": bool(client and client["resync"]),
+                }
+            )
+        report.sort(key=lambda e: (e["queued_bytes"], e["queued_packets"]), reverse=True)
+        return report
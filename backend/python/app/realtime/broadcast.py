@@ -0,0 +1,207 @@
+"""Frame-based coalescing of stroke point broadcasts."""
+
+import asyncio
+import logging
+
+from app.realtime.codec import POINT_FORMAT_JSON, convert_points, points_room
+from app.realtime.geometry import BBox, union
+
+logger = logging.getLogger(__name__)
+
+
+class StrokeBroadcaster:
+    """Merges stroke_update point deltas per room into one event per tick.
+
+    Rooms with fewer than ``min_room_size`` users keep the immediate
+    per-packet ``stroke_update`` behaviour. In larger rooms, points are
+    buffered per stroke and flushed every ``interval_ms`` as a single
+    ``stroke_batch`` event: ``{"strokes": [{"stroke_id", "points"}, ...]}``.
+
+    Each recipient gets exactly one packet per tick. Users who drew during
+    the tick, and users whose viewport (see app.realtime.interest) misses
+    some of the strokes, receive a copy without those strokes; everyone
+    else shares one emit per point format (see app.realtime.codec).
+
+    Point payloads are ``{"points": [...]}`` or ``{"points_bin": ..., "t0": ...}``
+    and are converted only for recipients on the other format. When the
+    op log is enabled a batch carries the ``seq`` of its newest update;
+    callers flush the room before emitting any other sequenced event so
+    that clients see seqs in order.
+
+    With a ``ClientBackpressure``, lagging clients are skipped and their
+    points are held for them instead (see app.realtime.backpressure);
+    ``flush``, unlike the tick, also releases the held points of the room.
+    """
+
+    def __init__(
+        self,
+        sio,
+        state,
+        interval_ms: int = 16,
+        min_room_size: int = 4,
+        interest=None,
+        backpressure=None,
+    ):
+        self.sio = sio
+        self.state = state
+        self.interval = interval_ms / 1000
+        self.min_room_size = min_room_size
+        self.interest = interest  # optional ViewportInterest
+        self.backpressure = backpressure  # optional ClientBackpressure
+        # board_id -> stroke_id -> {"sid": sender sid, "fields": point payload, "box": bounds}
+        self._pending: dict[str, dict[str, dict]] = {}
+        self._seqs: dict[str, int] = {}  # board_id -> seq of newest pending update
+        self._timers: dict[str, asyncio.Task] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        """Strokes with points waiting for the next tick."""
+        return sum(len(room) for room in self._pending.values())
+
+    async def stroke_update(
+        self,
+        board_id: str,
+        sid: str,
+        stroke_id: str,
+        fields: dict,
+        seq: int | None = None,
+        box: BBox | None = None,
+    ):
+        """Broadcast new points for a stroke, immediately or on the next tick.
+
+        ``box`` is the bounds of the new points, for viewport filtering.
+        """
+        if self.interval <= 0 or self.state.get_board_user_count(board_id) < self.min_room_size:
+            extra = {"seq": seq} if seq is not None else {}
+            skip = [sid]
+            if self.interest is not None:
+                skip += self.interest.skip(board_id, box, ("stroke", stroke_id))
+            lagging = self._lagging(board_id, skip)
+            for point_format in self.state.get_point_formats(board_id):
+                await self.sio.emit(
+                    "stroke_update",
+                    {
+                        "stroke_id": stroke_id,
+                        **convert_points(fields, point_format),
+                        **extra,
+                    },
+                    room=points_room(board_id, point_format),
+                    skip_sid=skip + lagging,
+                )
+            for lagging_sid in lagging:
+                point_format = self._point_format(lagging_sid)
+                self.backpressure.hold_strokes(
+                    lagging_sid,
+                    [{"stroke_id": stroke_id, **convert_points(fields, point_format)}],
+                    seq,
+                )
+            return
+
+        room = self._pending.setdefault(board_id, {})
+        pending = room.get(stroke_id)
+        if pending is None:
+            if "points_bin" in fields:
+                fields = {"points_bin": bytearray(fields["points_bin"]), "t0": fields["t0"]}
+            else:
+                fields = {**fields, "points": list(fields["points"])}
+            room[stroke_id] = {"sid": sid, "fields": fields, "box": box}
+        elif "points_bin" in pending["fields"] and "points_bin" in fields:
+            pending["fields"]["points_bin"] += fields["points_bin"]
+            pending["box"] = union(pending["box"], box)
+        elif "points" in pending["fields"] and "points" in fields:
+            pending["fields"]["points"].extend(fields["points"])
+            pending["box"] = union(pending["box"], box)
+        else:
+            # A stroke does not change format mid-way; send what we have first
+            await self.flush(board_id)
+            await self.stroke_update(board_id, sid, stroke_id, fields, seq, box)
+            return
+
+        if seq is not None:
+            self._seqs[board_id] = seq
+        if board_id not in self._timers:
+            self._timers[board_id] = asyncio.create_task(self._flush_later(board_id))
+
+    async def _flush_later(self, board_id: str):
+        await asyncio.sleep(self.interval)
+        if self._timers.get(board_id) is asyncio.current_task():
+            del self._timers[board_id]
+        await self._send_pending(board_id)
+
+    def _lagging(self, board_id: str, skip) -> list[str]:
+        """Lagging clients of a room that are not skipped anyway."""
+        if self.backpressure is None:
+            return []
+        lagging = self.backpressure.lagging_in(board_id)
+        return [sid for sid in lagging if sid not in skip] if lagging else lagging
+
+    def _point_format(self, sid: str) -> str:
+        return self.state.users.get(sid, {}).get("point_format", POINT_FORMAT_JSON)
+
+    async def flush(self, board_id: str):
+        """Send all pending points for a room now.
+
+        Called before events that must not overtake buffered points,
+        such as ``stroke_end``.
+        """
+        await self._send_pending(board_id)
+        if self.backpressure is not None:
+            await self.backpressure.release_room(board_id)
+
+    async def _send_pending(self, board_id: str):
+        room = self._pending.pop(board_id, None)
+        seq = self._seqs.pop(board_id, None)
+        if not room:
+            return
+        extra = {"seq": seq} if seq is not None else {}
+
+        # sid -> strokes it must not receive: its own, and those outside its viewport
+        excluded: dict[str, set] = {}
+        for stroke_id, pending in room.items():
+            excluded.setdefault(pending["sid"], set()).add(stroke_id)
+            if self.interest is not None:
+                for sid in self.interest.skip(board_id, pending["box"], ("stroke", stroke_id)):
+                    excluded.setdefault(sid, set()).add(stroke_id)
+        lagging = self._lagging(board_id, ())
+        for sid in lagging:
+            excluded.setdefault(sid, set())
+
+        encoded: dict[str, list[dict]] = {}
+
+        def strokes_for(point_format: str) -> list[dict]:
+            if point_format not in encoded:
+                encoded[point_format] = [
+                    {"stroke_id": stroke_id, **convert_points(pending["fields"], point_format)}
+                    for stroke_id, pending in room.items()
+                ]
+            return encoded[point_format]
+
+        try:
+            for point_format in self.state.get_point_formats(board_id):
+                await self.sio.emit(
+                    "stroke_batch",
+                    {"strokes": strokes_for(point_format), **extra},
+                    room=points_room(board_id, point_format),
+                    skip_sid=list(excluded),
+                )
+            for sid, hidden in excluded.items():
+                point_format = self._point_format(sid)
+                others = [s for s in strokes_for(point_format) if s["stroke_id"] not in hidden]
+                if not others:
+                    continue
+                if sid in lagging:
+                    self.backpressure.hold_strokes(sid, others, seq)
+                else:
+                    await self.sio.emit("stroke_batch", {"strokes": others, **extra}, to=sid)
+        except Exception as e:
+            logger.error(f"Failed to flush stroke batch for board {board_id}: {e}")
+
+    def discard(self, board_id: str):
+        """Drop pending points for a room (e.g. after the board is cleared)."""
+        self._pending.pop(board_id, None)
+        self._seqs.pop(board_id, None)
+        if self.backpressure is not None:
+            self.backpressure.discard_room(board_id)
+        timer = self._timers.pop(board_id, None)
+        if timer is not None:
+            timer.cancel()
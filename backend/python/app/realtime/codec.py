@@ -0,0 +1,146 @@
+"""Compact binary point encoding for stroke streaming.
+
+Clients that join a board with ``point_format: "binary"`` send and receive
+stroke points as a Socket.IO binary attachment instead of a list of dicts:
+
+    {"stroke_id": ..., "points_bin": <bytes>, "t0": <ms timestamp>}
+
+``points_bin`` is a packed array of 12-byte little-endian records:
+
+    float32 x, float32 y,
+    uint8   pressure  (0.0..1.0 scaled to 0..255),
+    int8    tilt      (-pi/2..pi/2 radians scaled to -127..127),
+    uint16  dt        (milliseconds since the previous point)
+
+The first record's ``dt`` is relative to ``t0``, so consecutive buffers of
+one stroke can be concatenated as-is. The server stores and forwards these
+buffers without looking at individual points; it only decodes or encodes
+when a peer on the other format (old JSON clients) needs them.
+"""
+
+import math
+import struct
+
+POINT_FORMAT_JSON = "json"
+POINT_FORMAT_BINARY = "binary"
+POINT_FORMATS = (POINT_FORMAT_JSON, POINT_FORMAT_BINARY)
+
+POINT_RECORD = struct.Struct("<ffBbH")
+POINT_SIZE = POINT_RECORD.size
+
+_TILT_SCALE = 127 / (math.pi / 2)
+
+
+def points_room(board_id: str, point_format: str) -> str:
+    """Socket.io room of the users on a board that use a point format."""
+    return f"{board_id}:points:{point_format}"
+
+
+# Largest magnitude a float32 coordinate can hold
+_MAX_COORDINATE = 3.4e38
+# Timestamps must fit an int64 (see app.realtime.stroke)
+_MAX_TIMESTAMP = 2**62
+
+
+def _finite(value, limit: float) -> bool:
+    return (
+        isinstance(value, (int, float))
+        and not isinstance(value, bool)
+        and math.isfinite(value)
+        and abs(value) <= limit
+    )
+
+
+def valid_coordinate(value) -> bool:
+    """Whether a client-supplied coordinate is a finite number a float32 can hold."""
+    return _finite(value, _MAX_COORDINATE)
+
+
+def _valid_point(point) -> bool:
+    if not isinstance(point, dict):
+        return False
+    if not valid_coordinate(point.get("x")) or not valid_coordinate(point.get("y")):
+        return False
+    for key in ("pressure", "tilt"):
+        if key in point and not _finite(point[key], _MAX_COORDINATE):
+            return False
+    timestamp = point.get("timestamp")
+    return timestamp is None or _finite(timestamp, _MAX_TIMESTAMP)
+
+
+def valid_points(points) -> list[dict] | None:
+    """The well-formed points of a client's JSON point list, or None if it is not a list.
+
+    Points need numeric, finite ``x`` and ``y``; ``pressure``, ``tilt`` and
+    ``timestamp`` must be numbers when present. Others are dropped.
+    """
+    if not isinstance(points, list):
+        return None
+    return [point for point in points if _valid_point(point)]
+
+
+def valid_t0(t0) -> bool:
+    """Whether a client-supplied ``t0`` is a usable timestamp."""
+    return isinstance(t0, int) and not isinstance(t0, bool) and abs(t0) <= _MAX_TIMESTAMP
+
+
+def encode_points(points: list[dict], t0: int) -> bytes:
+    """Pack JSON points into binary records."""
+    pack = POINT_RECORD.pack
+    records = []
+    previous = t0
+    for point in points:
+        timestamp = int(point.get("timestamp") or previous)
+        pressure = round(point.get("pressure", 0.5) * 255)
+        tilt = round(point.get("tilt", 0.0) * _TILT_SCALE)
+        records.append(
+            pack(
+                point["x"],
+                point["y"],
+                min(max(pressure, 0), 255),
+                min(max(tilt, -127), 127),
+                min(max(timestamp - previous, 0), 0xFFFF),
+            )
+        )
+        previous = timestamp
+    return b"".join(records)
+
+
+def decode_points(buf: bytes, t0: int) -> list[dict]:
+    """Unpack binary records into JSON points."""
+    points = []
+    timestamp = t0
+    for x, y, pressure, tilt, dt in POINT_RECORD.iter_unpack(buf):
+        timestamp += dt
+        points.append(
+            {
+                "x": x,
+                "y": y,
+                "pressure": pressure / 255,
+                "tilt": tilt / _TILT_SCALE,
+                "timestamp": timestamp,
+            }
+        )
+    return points
+
+
+def points_bin_end(buf: bytes, t0: int) -> int:
+    """Timestamp of the last of a stroke's binary records (``t0`` if there are none)."""
+    return t0 + sum(dt for *_, dt in POINT_RECORD.iter_unpack(buf))
+
+
+def convert_points(fields: dict, point_format: str) -> dict:
+    """Convert a point payload (``points`` or ``points_bin``/``t0``) to a format."""
+    if point_format == POINT_FORMAT_BINARY:
+        if "points_bin" in fields:
+            return {"points_bin": bytes(fields["points_bin"]), "t0": fields["t0"]}
+        points = fields["points"]
+        t0 = fields.get("t0")
+        if t0 is None:
+            t0 = int(points[0].get("timestamp") or 0) if points else 0
+        return {"points_bin": encode_points(points, t0), "t0": t0}
+
+    if "points_bin" in fields:
+        return {"points": decode_points(fields["points_bin"], fields["t0"])}
+    return {"points": fields["points"]}
+
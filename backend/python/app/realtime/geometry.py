@@ -0,0 +1,100 @@
+"""Bounding boxes of board elements on the infinite canvas.
+
+Boxes are ``(min_x, min_y, max_x, max_y)`` tuples in canvas coordinates.
+"""
+
+import math
+
+from app.realtime.codec import POINT_RECORD
+
+BBox = tuple[float, float, float, float]
+
+
+def parse_bbox(value) -> BBox | None:
+    """Parse a client-supplied ``[min_x, min_y, max_x, max_y]`` box (finite numbers)."""
+    try:
+        min_x, min_y, max_x, max_y = (float(v) for v in value)
+    except (TypeError, ValueError):
+        return None
+    if not all(math.isfinite(v) for v in (min_x, min_y, max_x, max_y)):
+        return None
+    return (min(min_x, max_x), min(min_y, max_y), max(min_x, max_x), max(min_y, max_y))
+
+
+def intersects(a: BBox, b: BBox) -> bool:
+    """Whether two boxes overlap (touching counts)."""
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def expand(box: BBox, margin: float) -> BBox:
+    """Grow a box by a margin on every side."""
+    return (box[0] - margin, box[1] - margin, box[2] + margin, box[3] + margin)
+
+
+def union(a: BBox | None, b: BBox | None) -> BBox | None:
+    """Smallest box containing both boxes."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def points_bounds(points: list[dict]) -> BBox | None:
+    """Bounds of JSON stroke points."""
+    if not points:
+        return None
+    xs = [p["x"] for p in points]
+    ys = [p["y"] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def points_bin_bounds(points_bin: bytes) -> BBox | None:
+    """Bounds of packed binary stroke points."""
+    if not points_bin:
+        return None
+    # Clients may send NaN or infinite floats; they have no place on the canvas
+    records = [
+        r for r in POINT_RECORD.iter_unpack(points_bin) if math.isfinite(r[0] + r[1])
+    ]
+    if not records:
+        return None
+    xs = [r[0] for r in records]
+    ys = [r[1] for r in records]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def fields_bounds(fields: dict, size: float = 0) -> BBox | None:
+    """Bounds of a stroke point payload (``points`` or ``points_bin``) with half the brush size."""
+    if "points_bin" in fields:
+        box = points_bin_bounds(fields["points_bin"])
+    else:
+        box = points_bounds(fields.get("points") or [])
+    if box is None:
+        return None
+    return expand(box, (size or 0) / 2)
+
+
+def stroke_bounds(stroke) -> BBox | None:
+    """Bounds of a ``Stroke``, including half its brush size."""
+    box = stroke.bounds()
+    if box is None:
+        return None
+    return expand(box, (stroke.size or 0) / 2)
+
+
+def object_bounds(obj: dict) -> BBox | None:
+    """Bounds of a shape/text object from its x/y/width/height properties."""
+    props = obj.get("properties") or {}
+    try:
+        x = float(props["x"])
+        y = float(props["y"])
+        width = float(props.get("width") or 0)
+        height = float(props.get("height") or 0)
+        margin = float(props.get("stroke_width") or 0) / 2
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+    if not math.isfinite(x + y + width + height + margin):
+        return None
+    box = (min(x, x + width), min(y, y + height), max(x, x + width), max(y, y + height))
+    return expand(box, margin)
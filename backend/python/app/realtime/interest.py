@@ -0,0 +1,116 @@
+"""Viewport-based interest management for room fan-out."""
+
+import math
+import time
+from typing import Any
+
+from app.realtime.geometry import BBox, expand, intersects
+
+# How long the skipped elements of a disconnected client are kept for a
+# delta resync under its new sid (see ``take_orphaned``).
+ORPHAN_TTL_SECONDS = 300.0
+
+
+class ViewportInterest:
+    """Tracks what part of the canvas each client is looking at.
+
+    Clients report their viewport with ``viewport_update {bbox, scale}``.
+    Board events with known bounds are then only sent to clients whose
+    viewport, grown by ``margin`` screen pixels (``margin / scale`` canvas
+    units), intersects them; clients that never sent a viewport keep
+    receiving everything.
+
+    Every element whose update was withheld from a client is remembered as
+    stale for that client. When the viewport moves, ``take_stale`` returns
+    the stale elements that came into view so their current state can be
+    sent (``viewport_sync``).
+    """
+
+    def __init__(self, margin: float = 256.0):
+        self.margin = margin
+        # board_id -> sid -> viewport region (viewport + margin)
+        self.regions: dict[str, dict[str, BBox]] = {}
+        self._stale: dict[str, set] = {}  # sid -> element keys
+        self._orphaned: dict[str, tuple[set, float]] = {}  # old sid -> (stale keys, time)
+
+    def update(self, board_id: str, sid: str, bbox: BBox, scale: float = 1.0) -> BBox:
+        """Set a client's viewport and return its region including the margin."""
+        region = expand(bbox, self.margin / scale)
+        if not all(math.isfinite(v) for v in region):
+            # Margin overflowed (tiny scale or huge viewport)
+            region = bbox
+        self.regions.setdefault(board_id, {})[sid] = region
+        return region
+
+    def watchers(self, board_id: str) -> dict[str, BBox]:
+        """Clients of a board with a known viewport, and their regions."""
+        return self.regions.get(board_id, {})
+
+    def skip(self, board_id: str, box: BBox | None, key: Any = None) -> list[str]:
+        """Clients that do not need an event with the given bounds.
+
+        With a ``key``, the element is marked stale for each of them.
+        """
+        regions = self.regions.get(board_id)
+        if not regions or box is None:
+            return []
+        skipped = [sid for sid, region in regions.items() if not intersects(box, region)]
+        if key is not None:
+            for sid in skipped:
+                self.mark_stale(sid, key)
+        return skipped
+
+    def mark_stale(self, sid: str, key: Any):
+        self._stale.setdefault(sid, set()).add(key)
+
+    def take_stale(self, sid: str, index, region: BBox | None = None) -> list:
+        """Pop a client's stale elements that intersect ``region`` (all if None).
+
+        Elements that are no longer indexed (deleted, cleared) are dropped.
+        """
+        stale = self._stale.get(sid)
+        if not stale:
+            return []
+        taken = []
+        for key in list(stale):
+            box = index.box(key)
+            if box is None:
+                stale.discard(key)
+            elif region is None or intersects(box, region):
+                stale.discard(key)
+                taken.append(key)
+        if not stale:
+            del self._stale[sid]
+        return taken
+
+    def remove(self, board_id: str, sid: str):
+        """Forget a client's viewport; it gets full broadcasts again."""
+        regions = self.regions.get(board_id)
+        if regions is not None:
+            regions.pop(sid, None)
+            if not regions:
+                del self.regions[board_id]
+
+    def disconnect(self, board_id: str, sid: str):
+        """Forget a leaving client, keeping its stale elements for a while."""
+        filtered = sid in self.regions.get(board_id, {})
+        self.remove(board_id, sid)
+        now = time.monotonic()
+        for old_sid, (_, since) in list(self._orphaned.items()):
+            if now - since > ORPHAN_TTL_SECONDS:
+                del self._orphaned[old_sid]
+        stale = self._stale.pop(sid, None)
+        if stale or filtered:
+            self._orphaned[sid] = (stale or set(), now)
+
+    def take_orphaned(self, old_sid: str, new_sid: str) -> bool:
+        """Hand the stale elements of a previous connection to its new sid.
+
+        Returns False if nothing is known about ``old_sid`` (it was never
+        filtered, or its record expired).
+        """
+        orphaned = self._orphaned.pop(old_sid, None)
+        if orphaned is None:
+            return False
+        self._stale.setdefault(new_sid, set()).update(orphaned[0])
+        return True
@@ -0,0 +1,224 @@
+"""Sequenced per-board operation log for delta resync on reconnect."""
+
+import asyncio
+import base64
+import json
+import logging
+from collections import deque
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# Logged when a board's content is replaced as a whole (e.g. a canvas
+# written through the API); clients from before it need a full board_state
+FULL_STATE = "board_state"
+
+
+class OpLog:
+    """Bounded ring of the events broadcast for each board.
+
+    Every board mutation gets a monotonically increasing ``seq``, which is
+    included in the event sent to the room. The seq only makes sense
+    together with the board's ``epoch``, a random id chosen when the board's
+    log starts (i.e. per process), so a client can never resync against
+    numbers from another server instance.
+
+    A reconnecting client joins with ``since_seq`` and ``epoch``; if the
+    ring still holds every op after ``since_seq`` (and none of them is a
+    ``FULL_STATE``) only those are replayed, otherwise it gets a full
+    snapshot.
+
+    The methods are coroutines so that ``RedisOpLog`` can stand in for it.
+    """
+
+    def __init__(self, size: int = 10000):
+        self.size = size
+        self._logs: dict[str, deque] = {}  # board_id -> deque of (seq, event, data, sid)
+        self._seqs: dict[str, int] = {}
+        self._epochs: dict[str, str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    async def append(
+        self, board_id: str, event: str, data: dict, sid: str | None = None
+    ) -> int | None:
+        """Record an event and return its seq (None when the log is disabled)."""
+        if not self.enabled:
+            return None
+        log = self._logs.get(board_id)
+        if log is None:
+            log = self._logs[board_id] = deque(maxlen=self.size)
+            self._epochs[board_id] = uuid4().hex
+        seq = self._seqs.get(board_id, 0) + 1
+        self._seqs[board_id] = seq
+        log.append((seq, event, data, sid))
+        return seq
+
+    async def head(self, board_id: str) -> tuple[str | None, int]:
+        """Current (epoch, seq) of a board."""
+        if not self.enabled:
+            return None, 0
+        if board_id not in self._epochs:
+            self._logs[board_id] = deque(maxlen=self.size)
+            self._epochs[board_id] = uuid4().hex
+        return self._epochs[board_id], self._seqs.get(board_id, 0)
+
+    async def since(self, board_id: str, epoch: str | None, since_seq) -> list[tuple] | None:
+        """Ops after ``since_seq``, or None if the ring no longer covers the gap."""
+        if not self.enabled or epoch is None or epoch != self._epochs.get(board_id):
+            return None
+        return _covering(list(self._logs[board_id]), self._seqs.get(board_id, 0), since_seq)
+
+    def discard(self, board_id: str):
+        """Forget a board's log (its next seq starts a new epoch)."""
+        self._logs.pop(board_id, None)
+        self._seqs.pop(board_id, None)
+        self._epochs.pop(board_id, None)
+
+
+class RedisOpLog:
+    """Op log shared by all backend nodes through Redis.
+
+    Clients receive a board's events from every node, so with Redis the
+    seqs have to come from one place. Appends are queued per board and
+    written in one MULTI per batch: ``INCRBY`` of the board's seq by the
+    batch size, ``RPUSH`` of the entries and ``LTRIM`` to ``size``. Since
+    every seq increment is pushed in the same transaction, the newest entry
+    always has the current seq, and the seq of any entry follows from its
+    position. Seqs are handed back in append order, so callers resume in
+    the order they appended.
+
+    Layout per board (``{prefix}:board:{board_id}:...``): ``opseq``,
+    ``oplog`` (JSON entries) and ``opepoch``, all expiring ``ttl`` seconds
+    after the last append. When a write fails the epoch is replaced once
+    Redis is back, so no client resyncs across the ops the log lost.
+    """
+
+    def __init__(self, redis, size: int = 10000, prefix: str = "whiteboard", ttl: int = 3600):
+        # ``redis`` is a redis.asyncio client created with decode_responses=True
+        self.redis = redis
+        self.size = size
+        self.prefix = prefix
+        self.ttl = max(int(ttl), 1)
+        self._pending: dict[str, list[tuple]] = {}  # board_id -> [(event, data, sid, future)]
+        self._writers: dict[str, asyncio.Task] = {}
+        self._lost: set[str] = set()  # boards whose log missed ops
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def _key(self, board_id: str, name: str) -> str:
+        return f"{self.prefix}:board:{board_id}:{name}"
+
+    async def append(
+        self, board_id: str, event: str, data: dict, sid: str | None = None
+    ) -> int | None:
+        """Record an event and return its seq (None when it could not be logged)."""
+        if not self.enabled:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(board_id, []).append((event, data, sid, future))
+        if board_id not in self._writers:
+            self._writers[board_id] = asyncio.create_task(self._write(board_id))
+        return await future
+
+    async def _write(self, board_id: str):
+        try:
+            while self._pending.get(board_id):
+                batch = self._pending.pop(board_id)
+                try:
+                    head = await self._write_batch(board_id, batch)
+                except Exception as e:
+                    logger.error(f"Failed to log {len(batch)} ops of board {board_id}: {e}")
+                    self._lost.add(board_id)
+                    seqs = [None] * len(batch)
+                else:
+                    seqs = range(head - len(batch) + 1, head + 1)
+                for (*_, future), seq in zip(batch, seqs):
+                    if not future.done():
+                        future.set_result(seq)
+        finally:
+            self._writers.pop(board_id, None)
+
+    async def _write_batch(self, board_id: str, batch: list[tuple]) -> int:
+        key = lambda name: self._key(board_id, name)  # noqa: E731
+        entries = [_encode_entry(event, data, sid) for event, data, sid, _ in batch]
+        pipe = self.redis.pipeline(transaction=True)
+        if board_id in self._lost:
+            pipe.set(key("opepoch"), uuid4().hex)
+        else:
+            pipe.set(key("opepoch"), uuid4().hex, nx=True)
+        pipe.incrby(key("opseq"), len(batch))
+        pipe.rpush(key("oplog"), *entries)
+        pipe.ltrim(key("oplog"), -self.size, -1)
+        for name in ("opepoch", "opseq", "oplog"):
+            pipe.expire(key(name), self.ttl)
+        results = await pipe.execute()
+        self._lost.discard(board_id)
+        return results[1]
+
+    async def head(self, board_id: str) -> tuple[str | None, int]:
+        """Current (epoch, seq) of a board."""
+        if not self.enabled:
+            return None, 0
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.set(self._key(board_id, "opepoch"), uuid4().hex, nx=True, ex=self.ttl)
+        pipe.get(self._key(board_id, "opepoch"))
+        pipe.get(self._key(board_id, "opseq"))
+        _, epoch, seq = await pipe.execute()
+        return epoch, int(seq or 0)
+
+    async def since(self, board_id: str, epoch: str | None, since_seq) -> list[tuple] | None:
+        """Ops after ``since_seq``, or None if the log no longer covers the gap."""
+        if not self.enabled or epoch is None:
+            return None
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.get(self._key(board_id, "opepoch"))
+        pipe.get(self._key(board_id, "opseq"))
+        pipe.lrange(self._key(board_id, "oplog"), 0, -1)
+        current, head, entries = await pipe.execute()
+        if current is None or epoch != current:
+            return None
+        head = int(head or 0)
+        first = head - len(entries) + 1
+        log = [_decode_entry(first + i, entry) for i, entry in enumerate(entries)]
+        return _covering(log, head, since_seq)
+
+    def discard(self, board_id: str):
+        """Nothing to drop locally; the shared log expires in Redis."""
+
+
+def _covering(log: list[tuple], head: int, since_seq) -> list[tuple] | None:
+    """Entries after ``since_seq`` if ``log`` (oldest first) holds all of them."""
+    if not isinstance(since_seq, int) or isinstance(since_seq, bool) or since_seq < 0:
+        return None
+    if since_seq > head:
+        return None
+    oldest = log[0][0] if log else head + 1
+    if since_seq < oldest - 1:
+        return None
+    ops = [op for op in log if op[0] > since_seq]
+    if any(op[1] == FULL_STATE for op in ops):
+        return None
+    return ops
+
+
+def _encode_entry(event: str, data: dict, sid: str | None) -> str:
+    entry = {"event": event, "sid": sid}
+    points_bin = data.get("points_bin")
+    if isinstance(points_bin, (bytes, bytearray)):
+        data = {**data, "points_bin": base64.b64encode(points_bin).decode()}
+        entry["bin"] = True
+    entry["data"] = data
+    return json.dumps(entry)
+
+
+def _decode_entry(seq: int, entry: str) -> tuple:
+    entry = json.loads(entry)
+    data = entry["data"]
+    if entry.get("bin"):
+        data["points_bin"] = base64.b64decode(data["points_bin"])
+    return seq, entry["event"], data, entry["sid"]
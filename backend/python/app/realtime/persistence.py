@@ -0,0 +1,320 @@
+"""Reading and writing live board state to the database.
+
+Saving happens in two steps so that large boards do not hold the event
+loop: ``snapshot_board`` copies the board's elements on the loop,
+yielding between chunks, and ``encode_canvas`` turns the snapshot into
+JSON text in a worker thread.
+
+Boards with normalized canvas storage (see app.canvas_store) are saved
+as deltas instead: only the elements recorded in ``BoardState.changes``
+are copied and written. Boards with compressed storage are encoded to a
+``canvas_blob`` in the worker thread.
+"""
+
+import asyncio
+import json
+import logging
+from uuid import UUID
+
+from sqlalchemy import Text, cast, literal, select, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import undefer_group
+
+from app.canvas_codec import encode_blob
+from app.canvas_store import (
+    ELEMENT_MODELS,
+    STORAGE_COMPRESSED,
+    STORAGE_DOCUMENT,
+    STORAGE_NORMALIZED,
+    clear_elements,
+    delete_elements,
+    read_canvas,
+    upsert_elements,
+)
+from app.models.board import Board
+from app.realtime.codec import POINT_FORMAT_JSON
+
+logger = logging.getLogger(__name__)
+
+# Rough per-element memory cost (besides stroke points) used for the board memory budget
+_ELEMENT_BYTES = 1024
+
+
+def parse_board_id(board_id: str) -> UUID | None:
+    """Database id of a socket board id (only UUID boards are persisted)."""
+    try:
+        return UUID(board_id)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+async def snapshot_board(board: dict, chunk_size: int = 500) -> dict:
+    """Copy a board's content so that it can be encoded off the event loop.
+
+    Strokes are copied with their point buffers (a memcpy each); objects
+    only get top-level property updates, so shallow copies are enough.
+    """
+    strokes = []
+    for i, stroke in enumerate(list(board["strokes"])):
+        strokes.append(stroke.copy())
+        if i % chunk_size == chunk_size - 1:
+            await asyncio.sleep(0)
+    objects = [{**obj, "properties": dict(obj.get("properties") or {})} for obj in board["objects"]]
+    return {"strokes": strokes, "objects": objects, "layers": list(board["layers"])}
+
+
+def snapshot_canvas(snapshot: dict) -> dict:
+    """The canvas dict of a board snapshot (runs in a thread)."""
+    return {
+        "strokes": [s.serialize(POINT_FORMAT_JSON) for s in snapshot["strokes"]],
+        "objects": snapshot["objects"],
+        "layers": snapshot["layers"],
+    }
+
+
+def encode_canvas(snapshot: dict) -> str:
+    """Encode a board snapshot as ``Board.canvas_data`` JSON (runs in a thread)."""
+    return json.dumps(snapshot_canvas(snapshot))
+
+
+def encode_canvas_blob(snapshot: dict) -> bytes:
+    """Encode a board snapshot as a ``Board.canvas_blob`` (runs in a thread)."""
+    return encode_blob(snapshot_canvas(snapshot))
+
+
+def snapshot_changes(board: dict, changes: dict | None) -> dict:
+    """Copy the changed elements of a board (None for deleted ones)."""
+    changes = changes or {"strokes": (), "objects": (), "cleared": False}
+    strokes = {}
+    for stroke_id in changes["strokes"]:
+        stroke = board["strokes"].get(stroke_id)
+        strokes[stroke_id] = stroke.copy() if stroke is not None else None
+    objects = {}
+    for object_id in changes["objects"]:
+        obj = board["objects"].get(object_id)
+        objects[object_id] = (
+            {**obj, "properties": dict(obj.get("properties") or {})} if obj is not None else None
+        )
+    return {
+        "cleared": changes["cleared"],
+        "strokes": strokes,
+        "objects": objects,
+        "layers": list(board["layers"]),
+    }
+
+
+def encode_changes(snapshot: dict) -> dict:
+    """Serialize the strokes of a ``snapshot_changes`` delta (runs in a thread)."""
+    strokes = {
+        stroke_id: stroke.serialize(POINT_FORMAT_JSON) if stroke is not None else None
+        for stroke_id, stroke in snapshot["strokes"].items()
+    }
+    return {**snapshot, "strokes": strokes}
+
+
+def encode_full_delta(snapshot: dict) -> dict:
+    """A delta replacing all of a board's rows with a ``snapshot_board`` copy."""
+    return {
+        "cleared": True,
+        "strokes": {s.id: s.serialize(POINT_FORMAT_JSON) for s in snapshot["strokes"]},
+        "objects": {obj.get("id"): obj for obj in snapshot["objects"]},
+        "layers": snapshot["layers"],
+    }
+
+
+def estimate_board_bytes(board: dict) -> int:
+    """Approximate memory held by a resident board."""
+    size = (len(board["strokes"]) + len(board["objects"])) * _ELEMENT_BYTES
+    for stroke in board["strokes"]:
+        size += stroke.nbytes
+    return size
+
+
+class BoardPersistence:
+    """Loads and saves socket boards through a SQLAlchemy session factory.
+
+    Each board is saved in the storage mode of its row, learned when it is
+    loaded. With ``storage`` set to normalized, document boards are
+    converted on their next save.
+
+    Saves leave ``Board.canvas_revision`` alone (it counts writes through
+    the API) and only apply to the revision the board was loaded at, so a
+    snapshot taken before an API write cannot overwrite it.
+    """
+
+    def __init__(self, session_maker, storage: str = STORAGE_DOCUMENT):
+        self.session_maker = session_maker
+        self.default_storage = storage
+        self.missing: set[str] = set()  # boards whose last save found no row
+        self.storage: dict[str, str] = {}  # board_id -> storage mode of its row
+        # Boards whose row changed mode under us; their next save writes everything
+        self.needs_full: set[str] = set()
+        self.revisions: dict[str, int] = {}  # board_id -> canvas_revision the board is based on
+
+    def is_stored(self, board_id: str) -> bool:
+        """Whether a board's content can be kept in the database."""
+        return parse_board_id(board_id) is not None and board_id not in self.missing
+
+    async def load(self, board_id: str) -> tuple[dict, dict] | None:
+        """Fetch a board's full canvas and settings, if it has a row."""
+        board_uuid = parse_board_id(board_id)
+        if board_uuid is None:
+            return None
+        async with self.session_maker() as session:
+            result = await session.execute(
+                select(Board).options(undefer_group("canvas")).where(Board.id == board_uuid)
+            )
+            row = result.scalar_one_or_none()
+            if row is None:
+                return None
+            self.storage[board_id] = row.canvas_storage
+            self.revisions[board_id] = row.canvas_revision
+            return await read_canvas(session, row), row.settings or {}
+
+    def forget(self, board_id: str):
+        """Drop what is known about a board's row (when it is evicted)."""
+        self.storage.pop(board_id, None)
+        self.needs_full.discard(board_id)
+        self.revisions.pop(board_id, None)
+
+    async def snapshot(
+        self, board_id: str, board: dict, changes: dict | None
+    ) -> tuple[int | None, str | bytes | dict]:
+        """What ``save`` should write for a board.
+
+        The revision the board is based on, and canvas JSON, a blob or a
+        delta. ``changes`` are the board's entry of ``BoardState.changes``.
+        """
+        revision = self.revisions.get(board_id)
+        storage = self.storage.get(board_id, STORAGE_DOCUMENT)
+        if storage == STORAGE_NORMALIZED and board_id not in self.needs_full:
+            delta = snapshot_changes(board, changes)
+            return revision, await asyncio.to_thread(encode_changes, delta)
+        snapshot = await snapshot_board(board)
+        if storage == STORAGE_DOCUMENT:
+            storage = self.default_storage  # Convert on the way out
+        if storage == STORAGE_NORMALIZED:
+            return revision, await asyncio.to_thread(encode_full_delta, snapshot)
+        if storage == STORAGE_COMPRESSED:
+            return revision, await asyncio.to_thread(encode_canvas_blob, snapshot)
+        return revision, await asyncio.to_thread(encode_canvas, snapshot)
+
+    async def load_settings(self, board_id: str) -> dict | None:
+        """Fetch only a board's settings, if it has a row."""
+        board_uuid = parse_board_id(board_id)
+        if board_uuid is None:
+            return None
+        async with self.session_maker() as session:
+            result = await session.execute(select(Board.settings).where(Board.id == board_uuid))
+            return result.scalar_one_or_none()
+
+    async def save(self, canvases: dict[str, tuple[int | None, str | bytes | dict]]) -> set[str]:
+        """Write several boards' ``snapshot`` results in one transaction.
+
+        Returns the ids of the boards that were stored. Boards without a
+        database row are skipped; boards whose row changed storage mode are
+        skipped too and added to ``needs_full``, and boards whose canvas was
+        written through the API since the snapshot are skipped and based on
+        the new revision, so callers should keep both dirty.
+        """
+        saved = set()
+        changed_mode = set()
+        superseded = set()
+        async with self.session_maker() as session:
+            async with session.begin():
+                for board_id, (revision, canvas) in canvases.items():
+                    board_uuid = parse_board_id(board_id)
+                    if board_uuid is None:
+                        continue
+                    if isinstance(canvas, str):
+                        stored = await self._save_document(session, board_uuid, revision, canvas)
+                    elif isinstance(canvas, bytes):
+                        stored = await self._save_blob(session, board_uuid, revision, canvas)
+                    else:
+                        stored = await self._save_delta(session, board_uuid, revision, canvas)
+                    if stored:
+                        saved.add(board_id)
+                        continue
+                    result = await session.execute(
+                        select(Board.canvas_storage, Board.canvas_revision).where(
+                            Board.id == board_uuid
+                        )
+                    )
+                    row = result.one_or_none()
+                    if row is None:
+                        continue
+                    if revision is not None and row.canvas_revision != revision:
+                        # The resident board has (or will get) the new canvas
+                        self.revisions[board_id] = row.canvas_revision
+                        superseded.add(board_id)
+                    else:
+                        self.storage[board_id] = row.canvas_storage
+                        changed_mode.add(board_id)
+        kept = saved | changed_mode | superseded
+        self.missing.difference_update(saved)
+        self.missing.update(board_id for board_id in canvases if board_id not in kept)
+        self.needs_full.difference_update(saved)
+        self.needs_full.update(changed_mode)
+        for board_id, (_, canvas) in canvases.items():
+            if board_id in saved:
+                if isinstance(canvas, str):
+                    self.storage[board_id] = STORAGE_DOCUMENT
+                elif isinstance(canvas, bytes):
+                    self.storage[board_id] = STORAGE_COMPRESSED
+                else:
+                    self.storage[board_id] = STORAGE_NORMALIZED
+        return saved
+
+    @staticmethod
+    def _update_row(board_uuid, revision: int | None):
+        query = update(Board).where(Board.id == board_uuid)
+        if revision is not None:
+            query = query.where(Board.canvas_revision == revision)
+        return query
+
+    @classmethod
+    async def _save_document(cls, session, board_uuid, revision: int | None, canvas: str) -> bool:
+        result = await session.execute(
+            cls._update_row(board_uuid, revision)
+            .where(Board.canvas_storage == STORAGE_DOCUMENT)
+            .values(canvas_data=cast(literal(canvas, Text), JSONB))
+        )
+        return bool(result.rowcount)
+
+    @classmethod
+    async def _save_blob(cls, session, board_uuid, revision: int | None, blob: bytes) -> bool:
+        # Document boards are converted; normalized ones need their rows
+        # cleared, which a full delta does
+        result = await session.execute(
+            cls._update_row(board_uuid, revision)
+            .where(Board.canvas_storage.in_((STORAGE_DOCUMENT, STORAGE_COMPRESSED)))
+            .values(canvas_blob=blob, canvas_data={}, canvas_storage=STORAGE_COMPRESSED)
+        )
+        return bool(result.rowcount)
+
+    @classmethod
+    async def _save_delta(cls, session, board_uuid, revision: int | None, delta: dict) -> bool:
+        # The board row first: it must exist (element rows reference it) and
+        # a partial delta is only valid on top of normalized rows
+        query = cls._update_row(board_uuid, revision)
+        if not delta["cleared"]:
+            query = query.where(Board.canvas_storage == STORAGE_NORMALIZED)
+        result = await session.execute(
+            query.values(
+                canvas_data={"layers": delta["layers"]},
+                canvas_blob=None,
+                canvas_storage=STORAGE_NORMALIZED,
+            )
+        )
+        if not result.rowcount:
+            return False
+        if delta["cleared"]:
+            await clear_elements(session, board_uuid)
+        for kind in ELEMENT_MODELS:
+            elements = delta[kind]
+            deleted = [element_id for element_id, data in elements.items() if data is None]
+            await delete_elements(session, board_uuid, kind, deleted)
+            await upsert_elements(
+                session, board_uuid, kind, [data for data in elements.values() if data is not None]
+            )
+        return True
@@ -0,0 +1,164 @@
+"""Latest-wins cursor presence with batched cursor frames."""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CursorPresence:
+    """Keeps the latest cursor position per user and flushes it per room.
+
+    ``cursor_move`` samples only overwrite the stored position. A single
+    background task sends one ``cursor_batch`` frame per room every
+    ``interval_ms`` containing the cursors that moved since the last frame:
+    ``{"cursors": [{"sid", "user_id", "display_name", "x", "y"}], "expired": [sid, ...]}``.
+    Cursors idle for longer than ``idle_timeout`` seconds are dropped and
+    reported once in ``expired``. With a ``ViewportInterest``, users only
+    receive the cursors inside their viewport (see app.realtime.interest).
+    With a ``ClientBackpressure``, frames for lagging clients are held and
+    merged instead (see app.realtime.backpressure).
+    """
+
+    def __init__(
+        self,
+        sio,
+        interval_ms: int = 50,
+        idle_timeout: float = 30.0,
+        interest=None,
+        backpressure=None,
+    ):
+        self.sio = sio
+        self.interval = interval_ms / 1000
+        self.idle_timeout = idle_timeout
+        self.interest = interest  # optional ViewportInterest
+        self.backpressure = backpressure  # optional ClientBackpressure
+        # board_id -> sid -> cursor
+        self.cursors: dict[str, dict[str, dict]] = {}
+        self._task: asyncio.Task | None = None
+
+        # Counters
+        self.samples_received = 0
+        self.samples_merged = 0  # overwritten before they were sent
+        self.samples_unchanged = 0  # same position as the last sent frame
+        self.cursors_sent = 0
+        self.frames_sent = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Cursor positions waiting for the next frame."""
+        return sum(c["dirty"] for room in self.cursors.values() for c in room.values())
+
+    @property
+    def drop_ratio(self) -> float:
+        """Fraction of received cursor samples that were never sent on."""
+        if not self.samples_received:
+            return 0.0
+        return (self.samples_merged + self.samples_unchanged) / self.samples_received
+
+    def update(self, board_id: str, sid: str, user: dict, x: float, y: float):
+        """Record the latest cursor position for a user."""
+        self.samples_received += 1
+        room = self.cursors.setdefault(board_id, {})
+        cursor = room.get(sid)
+        if cursor is None:
+            cursor = room[sid] = {
+                "user_id": user["user_id"],
+                "display_name": user["display_name"],
+                "x": x,
+                "y": y,
+                "sent": None,
+                "dirty": True,
+            }
+        else:
+            if cursor["dirty"]:
+                self.samples_merged += 1
+            elif cursor["sent"] == (x, y):
+                self.samples_unchanged += 1
+            cursor["x"] = x
+            cursor["y"] = y
+            cursor["dirty"] = cursor["sent"] != (x, y)
+        cursor["updated_at"] = time.monotonic()
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def remove(self, board_id: str, sid: str):
+        """Forget a user's cursor (on leave/disconnect)."""
+        room = self.cursors.get(board_id)
+        if room is not None:
+            room.pop(sid, None)
+            if not room:
+                del self.cursors[board_id]
+
+    async def _run(self):
+        # Runs while any cursor is tracked; restarted by the next update.
+        while self.cursors:
+            await asyncio.sleep(self.interval)
+            for board_id in list(self.cursors):
+                try:
+                    await self.flush(board_id)
+                except Exception as e:
+                    logger.error(f"Failed to flush cursors for board {board_id}: {e}")
+
+    async def flush(self, board_id: str):
+        """Send one cursor frame for a room."""
+        room = self.cursors.get(board_id)
+        if not room:
+            return
+
+        now = time.monotonic()
+        moved = []
+        expired = []
+        for sid, cursor in list(room.items()):
+            if now - cursor["updated_at"] > self.idle_timeout:
+                del room[sid]
+                expired.append(sid)
+            elif cursor["dirty"]:
+                cursor["dirty"] = False
+                cursor["sent"] = (cursor["x"], cursor["y"])
+                moved.append(
+                    {
+                        "sid": sid,
+                        "user_id": cursor["user_id"],
+                        "display_name": cursor["display_name"],
+                        "x": cursor["x"],
+                        "y": cursor["y"],
+                    }
+                )
+        if not room:
+            del self.cursors[board_id]
+        if not moved and not expired:
+            return
+
+        # Movers must not receive their own cursor and users with a viewport
+        # only the cursors inside it; everyone else shares one emit.
+        hidden: dict[str, set] = {}
+        for cursor in moved:
+            hidden.setdefault(cursor["sid"], set()).add(cursor["sid"])
+            if self.interest is not None:
+                point = (cursor["x"], cursor["y"], cursor["x"], cursor["y"])
+                for sid in self.interest.skip(board_id, point):
+                    hidden.setdefault(sid, set()).add(cursor["sid"])
+        lagging = self.backpressure.lagging_in(board_id) if self.backpressure is not None else []
+        for sid in lagging:
+            hidden.setdefault(sid, set())
+        await self.sio.emit(
+            "cursor_batch",
+            {"cursors": moved, "expired": expired},
+            room=board_id,
+            skip_sid=list(hidden),
+        )
+        self.frames_sent += 1
+        self.cursors_sent += len(moved)
+        for sid, skipped in hidden.items():
+            others = [c for c in moved if c["sid"] not in skipped]
+            if sid in lagging:
+                self.backpressure.hold_cursors(sid, others, expired)
+            elif others or expired:
+                await self.sio.emit(
+                    "cursor_batch",
+                    {"cursors": others, "expired": expired},
+                    to=sid,
+                )
@@ -0,0 +1,235 @@
+"""Token-bucket rate limits for inbound Socket.io events."""
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Allows ``rate`` events per second on average and bursts of ``burst``."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = now
+
+    def ready(self, now: float) -> bool:
+        """Refill for the time passed and tell whether a token is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens >= 1.0
+
+    def take(self, now: float) -> bool:
+        if self.ready(now):
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until the next token is available."""
+        return max(1.0 - self.tokens, 0.0) / self.rate if self.rate > 0 else 1.0
+
+
+def merge_stroke_updates(pending: dict, data: dict) -> dict | None:
+    """Merge two ``stroke_update`` payloads of the same stroke, or None.
+
+    Payloads that are not well-formed are not merged; the handler drops them.
+    """
+    if not isinstance(pending, dict) or not isinstance(data, dict):
+        return None
+    if pending.get("stroke_id") != data.get("stroke_id"):
+        return None
+    if "points_bin" in pending:
+        if "points_bin" not in data or pending.get("t0", 0) != data.get("t0", 0):
+            return None
+        if not all(isinstance(d["points_bin"], (bytes, bytearray)) for d in (pending, data)):
+            return None
+        return {**pending, "points_bin": bytes(pending["points_bin"]) + bytes(data["points_bin"])}
+    if "points_bin" in data:
+        return None
+    points = pending.get("points") or []
+    more = data.get("points") or []
+    if not isinstance(points, list) or not isinstance(more, list):
+        return None
+    return {**pending, "points": [*points, *more]}
+
+
+class EventRateLimiter:
+    """Per-client and per-board token buckets for Socket.io events.
+
+    ``limits`` and ``board_limits`` map event names to ``(rate, burst)``;
+    events without an entry are not limited. Checks run in a wrapper
+    around the handler (see ``install``), so an over-limit event costs a
+    dict lookup and a little arithmetic and never reaches state or emits.
+
+    Over-limit events are dropped, except those with a merge function in
+    ``coalesce``: their payloads are merged per client and handled as one
+    event when the client's next event of that type is allowed, when a
+    token is available again, or right before any other event of the
+    client so that e.g. ``stroke_end`` still follows its points.
+
+    Throttled clients get a ``rate_limited`` event ``{"event", "throttled"}``
+    at most once per ``warn_interval`` seconds (0 disables the warning).
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, tuple[float, float]],
+        board_limits: dict[str, tuple[float, float]] | None = None,
+        coalesce: dict[str, Callable[[dict, dict], dict | None]] | None = None,
+        warn_interval: float = 5.0,
+    ):
+        self.limits = {event: tuple(limit) for event, limit in limits.items()}
+        self.board_limits = {
+            event: tuple(limit) for event, limit in (board_limits or {}).items()
+        }
+        self.coalesce = dict(coalesce or {})
+        self.warn_interval = warn_interval
+        self.sio = None
+        self._buckets: dict[tuple[str, str], TokenBucket] = {}  # (sid, event)
+        self._board_buckets: dict[tuple[str, str], TokenBucket] = {}  # (board_id, event)
+        # sid -> [event, handler, data, flush task]
+        self._pending: dict[str, list] = {}
+        self._warned: dict[str, float] = {}  # sid -> time of the last warning
+
+        # Counters
+        self.throttled: dict[str, int] = {}  # sid -> events dropped or coalesced
+        self.dropped: dict[str, int] = {}  # event -> count
+        self.coalesced: dict[str, int] = {}  # event -> count
+
+    @staticmethod
+    def _bucket(buckets: dict, key: tuple, limit: tuple[float, float], now: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(limit[0], limit[1], now)
+        return bucket
+
+    def allow(self, sid: str, board_id: str | None, event: str) -> bool:
+        """Take a token for an event of a client and its board.
+
+        Tokens are only taken when both buckets have one, so events refused
+        by the board limit do not use up the client's.
+        """
+        now = time.monotonic()
+        buckets = []
+        limit = self.limits.get(event)
+        if limit is not None:
+            buckets.append(self._bucket(self._buckets, (sid, event), limit, now))
+        board_limit = self.board_limits.get(event)
+        if board_limit is not None and board_id is not None:
+            buckets.append(self._bucket(self._board_buckets, (board_id, event), board_limit, now))
+        if not all(bucket.ready(now) for bucket in buckets):
+            return False
+        for bucket in buckets:
+            bucket.tokens -= 1.0
+        return True
+
+    def install(self, sio, board_of: Callable[[str], str | None], namespace: str = "/"):
+        """Wrap the registered handlers (call once all are registered).
+
+        Handlers of events without limits are wrapped too, but only when
+        some client has coalesced events pending do they do any work.
+        """
+        self.sio = sio
+        handlers = sio.handlers.get(namespace, {})
+        for event, handler in list(handlers.items()):
+            if asyncio.iscoroutinefunction(handler) and event != "connect":
+                handlers[event] = self._limited(event, handler, board_of)
+
+    def _limited(self, event: str, handler, board_of):
+        limited = event in self.limits or event in self.board_limits
+        merge = self.coalesce.get(event)
+
+        @functools.wraps(handler)
+        async def wrapper(sid, *args):
+            pending = self._pending.get(sid) if self._pending else None
+            if pending is not None and (pending[0] != event or merge is None):
+                await self.flush(sid)
+                pending = None
+
+            if not limited or self.allow(sid, board_of(sid), event):
+                if pending is not None and args and isinstance(args[0], dict):
+                    # Same coalesced event type: send what was held with it
+                    merged = merge(pending[2], args[0])
+                    if merged is None:
+                        await self.flush(sid)
+                    else:
+                        self._cancel(sid)
+                        args = (merged, *args[1:])
+                return await handler(sid, *args)
+
+            self.throttled[sid] = self.throttled.get(sid, 0) + 1
+            if merge is not None and args and isinstance(args[0], dict):
+                await self._hold(sid, event, handler, merge, args[0])
+                self.coalesced[event] = self.coalesced.get(event, 0) + 1
+            else:
+                self.dropped[event] = self.dropped.get(event, 0) + 1
+            await self._warn(sid, event)
+
+        return wrapper
+
+    async def _hold(self, sid: str, event: str, handler, merge, data: dict):
+        pending = self._pending.get(sid)
+        if pending is not None:
+            merged = merge(pending[2], data)
+            if merged is not None:
+                pending[2] = merged
+                return
+            await self.flush(sid)
+        bucket = self._buckets.get((sid, event))
+        delay = bucket.wait_time() if bucket is not None else 0.0
+        task = asyncio.create_task(self._flush_later(sid, delay))
+        self._pending[sid] = [event, handler, data, task]
+
+    async def _flush_later(self, sid: str, delay: float):
+        await asyncio.sleep(delay)
+        pending = self._pending.get(sid)
+        if pending is not None and pending[3] is asyncio.current_task():
+            del self._pending[sid]
+            try:
+                await pending[1](sid, pending[2])
+            except Exception as e:
+                logger.error(f"Failed to handle coalesced {pending[0]} of {sid}: {e}")
+
+    def _cancel(self, sid: str) -> list | None:
+        pending = self._pending.pop(sid, None)
+        if pending is not None and pending[3] is not asyncio.current_task():
+            pending[3].cancel()
+        return pending
+
+    async def flush(self, sid: str):
+        """Handle a client's coalesced events now."""
+        pending = self._cancel(sid)
+        if pending is not None:
+            await pending[1](sid, pending[2])
+
+    async def _warn(self, sid: str, event: str):
+        if self.warn_interval <= 0 or self.sio is None:
+            return
+        now = time.monotonic()
+        if now - self._warned.get(sid, -self.warn_interval) < self.warn_interval:
+            return
+        self._warned[sid] = now
+        await self.sio.emit(
+            "rate_limited", {"event": event, "throttled": self.throttled[sid]}, to=sid
+        )
+
+    def forget(self, sid: str):
+        """Drop a client's buckets and counters (after disconnect)."""
+        self._cancel(sid)
+        for event in self.limits:
+            self._buckets.pop((sid, event), None)
+        self._warned.pop(sid, None)
+        self.throttled.pop(sid, None)
+
+    def forget_board(self, board_id: str):
+        """Drop a board's buckets (when it is evicted)."""
+        for event in self.board_limits:
+            self._board_buckets.pop((board_id, event), None)
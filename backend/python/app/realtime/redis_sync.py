@@ -0,0 +1,751 @@
+"""Redis-backed board state shared between backend nodes.
+
+Every node keeps its own in-memory ``BoardState`` replica for the boards its
+clients are connected to. Local mutations are applied to the replica first,
+then queued here and written to Redis in ordered, pipelined batches. Each
+write bumps a per-board sequence number in the same transaction and is then
+published on a pub/sub channel so other nodes can apply it to their replicas.
+
+Redis layout per board (``{prefix}:board:{board_id}:...``):
+
+- ``seq``        counter incremented by every operation
+- ``strokes``    hash stroke_id -> stroke metadata (without points)
+- ``points:{id}`` list of point batches for one stroke (a JSON point list,
+  or ``{"bin": base64, "t0": ms}`` for binary batches, see app.realtime.codec)
+- ``ptlen``      hash stroke_id -> number of entries in its points list
+- ``completed``  set of completed stroke ids (a simplified stroke's
+  ``stroke_end`` replaces its point list with a single batch)
+- ``objects``    hash object_id -> object as added
+- ``props:{id}`` hash property -> JSON value of an object's updated
+  properties, merged over the added object's (so concurrent updates merge
+  in seq order)
+- ``order``      sorted set of ``s:{id}`` / ``o:{id}`` members in draw order
+- ``users``      hash sid -> user for every node (with the ``node`` it is on)
+
+``settings`` operations carry a board's changed ``Board.settings`` to the
+nodes holding it (``on_settings``); they store nothing, as a node loading
+the board reads its settings from the database.
+
+Every write refreshes the expiry (``board_ttl``) of the keys it touches, and
+each node refreshes the keys of its resident boards on every heartbeat, so a
+board nobody holds disappears from Redis ``board_ttl`` seconds after its
+last use and is loaded from the database again. Nodes also keep a
+``{prefix}:node:{node_id}`` key alive for three heartbeats; users whose node
+key has expired (the node crashed) are removed from the users hash by the
+first node to notice, which publishes their ``user_leave``.
+
+A ``load`` operation replaces all of the above with content read from the
+database, when Redis has no record of a board yet or its canvas was written
+through the API (see app.realtime.residency); other nodes holding the board
+resync it, so their clients get the new content. When a write fails, Redis may be missing any of
+the batch's operations, so the node republishes the affected boards whole
+as ``load`` operations built from its replica, retrying with backoff, and
+drops the operations still queued for them (the replica already has them).
+
+A node that gets a join for a board it does not hold loads a snapshot
+(``load_board``). The snapshot reads all of the above in one MULTI, so it
+reflects exactly the operations up to the ``seq`` it read; ``ptlen`` bounds
+the point lists that are fetched afterwards. Operations published while the
+snapshot loads are buffered and applied only if their seq is newer. The
+same load resyncs a resident board whose replica may have missed or
+misapplied operations (after the subscription dropped, or an operation
+failed to apply); operations this node has queued but not written yet are
+applied again on top of the snapshot.
+
+Ordering: Redis seqs are the order of record, but each node applies its own
+operations before they get a seq, and other nodes' operations as they
+arrive. Operations on different elements commute, so only operations on
+the same element (or a ``clear``/``load``, which touches every element)
+applied here in a different order than their seqs can leave replicas
+apart -- e.g. a ``clear`` on one node racing an ``object_add`` on another.
+Each node tracks, per element, the highest seq it has applied and its own
+operations not written yet; a remote operation that arrives after a
+conflicting operation with a higher (or not yet assigned) seq resyncs the
+board from Redis, and its clients get a fresh ``board_state``.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import time
+from collections import deque
+from uuid import uuid4
+
+from app.realtime.state import BoardState
+from app.realtime.stroke import Stroke
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of queued operations written in one Redis transaction
+MAX_BATCH_SIZE = 500
+
+# Backoff between attempts to resubscribe after the connection drops, in seconds
+RETRY_MIN_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+# Board keys besides the per-stroke point lists
+BOARD_KEYS = ("seq", "strokes", "ptlen", "completed", "objects", "order", "users")
+
+# Heartbeats a node may miss before its users are pruned
+HEARTBEAT_MISSES = 3
+
+# Operations on the users hash rather than on board content
+USER_OPS = ("user_join", "user_leave")
+
+
+def op_element(op: dict) -> str | None:
+    """The element an operation changes: ``s:{id}``, ``o:{id}``, ``*`` for all, or None."""
+    op_type = op["type"]
+    if op_type.startswith("stroke_"):
+        return f"s:{op['stroke']['id'] if op_type == 'stroke_start' else op['stroke_id']}"
+    if op_type == "object_add":
+        return f"o:{op['object']['id']}"
+    if op_type.startswith("object_"):
+        return f"o:{op['object_id']}"
+    if op_type in USER_OPS or op_type == "settings":
+        return None
+    return "*"
+
+
+class OpOrder:
+    """Seqs of the operations applied to one board's replica (see module docstring)."""
+
+    __slots__ = ("applied", "top", "pending")
+
+    def __init__(self, top: int = 0):
+        self.applied: dict[str, int] = {}  # element -> highest seq applied
+        self.top = top  # highest seq applied to any element
+        self.pending: dict[str, int] = {}  # element -> local ops without a seq yet
+
+    def conflicts(self, element: str | None, seq: int) -> bool:
+        """Whether an operation with this seq arrives after one it should precede."""
+        if element is None:
+            return False
+        if element == "*":
+            return self.top > seq or bool(self.pending)
+        return (
+            max(self.applied.get(element, 0), self.applied.get("*", 0)) > seq
+            or element in self.pending
+            or "*" in self.pending
+        )
+
+    def record(self, element: str | None, seq: int):
+        if element is None:
+            return
+        if element == "*":
+            # Earlier element seqs no longer matter: anything older conflicts with this
+            self.applied = {"*": max(self.applied.get("*", 0), seq)}
+        else:
+            self.applied[element] = max(self.applied.get(element, 0), seq)
+        self.top = max(self.top, seq)
+
+    def add_pending(self, element: str | None):
+        if element is not None:
+            self.pending[element] = self.pending.get(element, 0) + 1
+
+    def remove_pending(self, element: str | None):
+        count = self.pending.get(element, 0)
+        if count > 1:
+            self.pending[element] = count - 1
+        else:
+            self.pending.pop(element, None)
+
+
+def replica_load_op(board: dict) -> dict:
+    """A ``load`` operation carrying a resident board's whole content."""
+    strokes = []
+    for stroke in board["strokes"]:
+        data = stroke.metadata()
+        data["completed"] = stroke.completed
+        if stroke.is_binary:
+            data["points_bin"] = base64.b64encode(stroke.points_bin).decode()
+        else:
+            data["points"] = stroke.points()
+        strokes.append(data)
+    return {
+        "type": "load",
+        "strokes": strokes,
+        "objects": board["objects"].to_list(),
+        "layers": board["layers"],
+    }
+
+
+class RedisBoardSync:
+    """Replicates board operations between nodes through Redis."""
+
+    def __init__(
+        self,
+        redis,
+        state: BoardState,
+        prefix: str = "whiteboard",
+        board_ttl: int = 3600,
+        heartbeat: float = 10.0,
+    ):
+        # ``redis`` is a redis.asyncio client created with decode_responses=True
+        # (fakeredis.aioredis.FakeRedis works as well).
+        self.redis = redis
+        self.state = state
+        self.prefix = prefix
+        self.board_ttl = max(int(board_ttl), 1)
+        self.heartbeat = heartbeat
+        self.node_id = uuid4().hex
+        self.channel = f"{prefix}:board-ops"
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._pubsub = None
+        self._loading: dict[str, asyncio.Task] = {}  # board_id -> snapshot load
+        self._buffered: dict[str, list[tuple[int, dict]]] = {}  # ops received while loading
+        self._snapshot_seq: dict[str, int] = {}  # board_id -> seq of installed snapshot
+        self._unwritten: dict[str, deque] = {}  # board_id -> queued ops not written yet
+        self._republish: set[str] = set()  # boards to store whole after a failed write
+        self._republished_ops: set[int] = set()  # ids of queued ops a republish included
+        self._order: dict[str, OpOrder] = {}  # board_id -> seqs applied to the replica
+        # Awaited with a board_id after a resident board was resynced
+        self.on_resync = None
+        # Awaited with (board_id, sids) after users of a dead node were removed
+        self.on_users_pruned = None
+        # Called with (board_id, Board.settings) when another node changed them
+        self.on_settings = None
+
+    def _key(self, board_id: str, name: str) -> str:
+        return f"{self.prefix}:board:{board_id}:{name}"
+
+    def _node_key(self, node_id: str) -> str:
+        return f"{self.prefix}:node:{node_id}"
+
+    async def start(self):
+        """Subscribe to the operations channel and start the writer and heartbeat."""
+        self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+        await self._beat()
+        self._tasks = [
+            asyncio.create_task(self._writer()),
+            asyncio.create_task(self._listener()),
+        ]
+        if self.heartbeat > 0:
+            self._tasks.append(asyncio.create_task(self._maintain()))
+        logger.info(f"Redis board sync started (node {self.node_id})")
+
+    async def stop(self):
+        """Flush queued operations and stop background tasks."""
+        if self._tasks:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        try:
+            # Other nodes prune our users right away
+            await self.redis.delete(self._node_key(self.node_id))
+        except Exception as e:
+            logger.warning(f"Failed to remove node heartbeat: {e}")
+        await self.redis.aclose()
+
+    def publish(self, board_id: str, op: dict):
+        """Queue an operation that was already applied to the local replica."""
+        self._queue.put_nowait((board_id, op))
+        self._unwritten.setdefault(board_id, deque()).append(op)
+        self._order.setdefault(board_id, OpOrder()).add_pending(op_element(op))
+
+    def resync(self, board_id: str):
+        """Reload a resident board from Redis once the ops queued so far are written."""
+        self._queue.put_nowait((board_id, None))
+
+    def discard(self, board_id: str):
+        """Forget an evicted board."""
+        self._snapshot_seq.pop(board_id, None)
+        if board_id not in self._unwritten:
+            self._order.pop(board_id, None)
+
+    # Writing
+
+    async def _writer(self):
+        delay = RETRY_MIN_DELAY
+        while True:
+            if self._republish:
+                try:
+                    await self._republish_boards()
+                    delay = RETRY_MIN_DELAY
+                except Exception as e:
+                    logger.error(f"Failed to republish boards to Redis, retrying in {delay:.1f}s: {e}")
+                    delay = min(delay * 2, RETRY_MAX_DELAY)
+            try:
+                item = await asyncio.wait_for(
+                    self._queue.get(), delay if self._republish else None
+                )
+            except asyncio.TimeoutError:
+                continue
+            items = [item]
+            while not self._queue.empty() and len(items) < MAX_BATCH_SIZE:
+                items.append(self._queue.get_nowait())
+            try:
+                batch = []
+                for board_id, op in items:
+                    if op is None:
+                        await self._write(batch)
+                        batch = []
+                        await self._reload(board_id)
+                    elif self._covered(board_id, op):
+                        self._written(board_id)
+                    else:
+                        batch.append((board_id, op))
+                await self._write(batch)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    async def _write(self, batch: list[tuple[str, dict]]):
+        if not batch:
+            return
+        try:
+            await self._write_batch(batch)
+        except Exception as e:
+            # Redis may now be missing any of these ops: store the boards whole
+            boards = {board_id for board_id, op in batch if op["type"] not in USER_OPS}
+            logger.error(
+                f"Failed to write {len(batch)} board ops to Redis, "
+                f"republishing {len(boards)} boards: {e}"
+            )
+            self._republish |= boards
+        finally:
+            for board_id, _ in batch:
+                self._written(board_id)
+
+    def _written(self, board_id: str):
+        unwritten = self._unwritten.get(board_id)
+        if unwritten:
+            op = unwritten.popleft()
+            order = self._order.get(board_id)
+            if order is not None:
+                order.remove_pending(op_element(op))
+        if not unwritten:
+            self._unwritten.pop(board_id, None)
+
+    def _covered(self, board_id: str, op: dict) -> bool:
+        """Whether a queued op is part of a board republished (or to be) whole."""
+        if op["type"] in USER_OPS:
+            return False
+        if id(op) in self._republished_ops:
+            self._republished_ops.discard(id(op))
+            return True
+        return board_id in self._republish
+
+    async def _republish_boards(self):
+        """Replace boards in Redis with the local replicas after failed writes.
+
+        Every content op queued for such a board so far is already part of
+        its replica, so those ops are dropped instead of written.
+        """
+        batch = []
+        for board_id in self._republish:
+            board = self.state.boards.get(board_id)
+            if board is None:
+                continue
+            self._republished_ops.update(
+                id(op) for op in self._unwritten.get(board_id, ()) if op["type"] not in USER_OPS
+            )
+            batch.append((board_id, replica_load_op(board)))
+            for sid in self.state.board_users.get(board_id, ()):
+                if sid in self.state.users:
+                    batch.append(
+                        (board_id, {"type": "user_join", "sid": sid, "user": self.state.users[sid]})
+                    )
+        if batch:
+            await self._write_batch(batch)
+        self._republish.clear()
+
+    async def _write_batch(self, batch: list[tuple[str, dict]]):
+        # Point lists and property hashes of cleared boards are found before
+        # the transaction; an element added concurrently on another node only
+        # leaves an orphaned key that no snapshot will read.
+        cleared_keys = {}
+        for board_id, op in batch:
+            if op["type"] in ("clear", "load"):
+                cleared_keys[board_id] = await self._element_keys(board_id)
+
+        pipe = self.redis.pipeline(transaction=True)
+        seq_positions = []
+        touched_keys = {}
+        for board_id, op in batch:
+            seq_positions.append(len(pipe))
+            pipe.incr(self._key(board_id, "seq"))
+            self._queue_writes(pipe, board_id, op, cleared_keys.get(board_id, []))
+            touched_keys.setdefault(board_id, set()).update(_element_key_names(op))
+        for board_id, names in touched_keys.items():
+            self._queue_expire(pipe, board_id, names)
+        results = await pipe.execute()
+
+        pub = self.redis.pipeline(transaction=False)
+        for (board_id, op), position in zip(batch, seq_positions):
+            self._order.setdefault(board_id, OpOrder()).record(op_element(op), results[position])
+            message = {
+                "node": self.node_id,
+                "board_id": board_id,
+                "seq": results[position],
+                "op": op,
+            }
+            pub.publish(self.channel, json.dumps(message))
+        await pub.execute()
+
+    async def _element_keys(self, board_id: str) -> list[str]:
+        """Names of a board's per-stroke and per-object keys."""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hkeys(self._key(board_id, "ptlen"))
+        pipe.hkeys(self._key(board_id, "objects"))
+        stroke_ids, object_ids = await pipe.execute()
+        return [f"points:{id}" for id in stroke_ids] + [f"props:{id}" for id in object_ids]
+
+    def _queue_writes(self, pipe, board_id: str, op: dict, cleared_keys: list[str]):
+        key = lambda name: self._key(board_id, name)  # noqa: E731
+        op_type = op["type"]
+
+        if op_type == "stroke_start":
+            stroke = op["stroke"]  # metadata only, points follow as stroke_points
+            pipe.hset(key("strokes"), stroke["id"], json.dumps(stroke))
+            pipe.hset(key("ptlen"), stroke["id"], 0)
+            pipe.zadd(key("order"), {f"s:{stroke['id']}": time.time()})
+        elif op_type == "stroke_points":
+            batch = {"bin": op["points_bin"], "t0": op["t0"]} if "points_bin" in op else op["points"]
+            pipe.rpush(key(f"points:{op['stroke_id']}"), json.dumps(batch))
+            pipe.hincrby(key("ptlen"), op["stroke_id"], 1)
+        elif op_type == "stroke_end":
+            pipe.sadd(key("completed"), op["stroke_id"])
+            if "points" in op or "points_bin" in op:
+                # Simplified stroke: one batch replaces the streamed ones
+                batch = {"bin": op["points_bin"]} if "points_bin" in op else op["points"]
+                pipe.delete(key(f"points:{op['stroke_id']}"))
+                pipe.rpush(key(f"points:{op['stroke_id']}"), json.dumps(batch))
+                pipe.hset(key("ptlen"), op["stroke_id"], 1)
+        elif op_type == "object_add":
+            obj = op["object"]
+            pipe.hset(key("objects"), obj["id"], json.dumps(obj))
+            pipe.delete(key(f"props:{obj['id']}"))
+            pipe.zadd(key("order"), {f"o:{obj['id']}": time.time()})
+        elif op_type == "object_update":
+            if op["properties"]:
+                pipe.hset(
+                    key(f"props:{op['object_id']}"),
+                    mapping={k: json.dumps(v) for k, v in op["properties"].items()},
+                )
+        elif op_type == "object_delete":
+            pipe.hdel(key("objects"), op["object_id"])
+            pipe.delete(key(f"props:{op['object_id']}"))
+            pipe.zrem(key("order"), f"o:{op['object_id']}")
+        elif op_type in ("clear", "load"):
+            for name in cleared_keys:
+                pipe.unlink(key(name))
+            pipe.unlink(key("strokes"), key("ptlen"), key("completed"), key("objects"), key("order"))
+            if op_type == "load":
+                self._queue_load(pipe, board_id, op)
+        elif op_type == "user_join":
+            pipe.hset(key("users"), op["sid"], json.dumps({**op["user"], "node": self.node_id}))
+        elif op_type == "user_leave":
+            pipe.hdel(key("users"), op["sid"])
+
+    def _queue_expire(self, pipe, board_id: str, names):
+        for name in (*BOARD_KEYS, *names):
+            pipe.expire(self._key(board_id, name), self.board_ttl)
+
+    def _queue_load(self, pipe, board_id: str, op: dict):
+        key = lambda name: self._key(board_id, name)  # noqa: E731
+        # Loaded content sorts before anything drawn later (scored by time)
+        rank = 0
+        for stroke in op["strokes"]:
+            meta = {
+                k: v for k, v in stroke.items() if k not in ("points", "points_bin", "completed")
+            }
+            if stroke.get("points_bin"):
+                batch = {"bin": stroke["points_bin"], "t0": stroke.get("t0") or 0}
+            else:
+                batch = stroke.get("points") or []
+            pipe.hset(key("strokes"), stroke["id"], json.dumps(meta))
+            pipe.rpush(key(f"points:{stroke['id']}"), json.dumps(batch))
+            pipe.hset(key("ptlen"), stroke["id"], 1)
+            if stroke.get("completed", True):
+                pipe.sadd(key("completed"), stroke["id"])
+            pipe.zadd(key("order"), {f"s:{stroke['id']}": rank})
+            rank += 1
+        for obj in op["objects"]:
+            pipe.hset(key("objects"), obj["id"], json.dumps(obj))
+            pipe.zadd(key("order"), {f"o:{obj['id']}": rank})
+            rank += 1
+
+    # Expiry and presence
+
+    async def _beat(self):
+        await self.redis.set(
+            self._node_key(self.node_id),
+            1,
+            ex=max(int(self.heartbeat * HEARTBEAT_MISSES), 1),
+        )
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                await self._beat()
+                board_ids = list(self.state.boards)
+                await self._refresh_expiry(board_ids)
+                await self._prune_users(board_ids)
+            except Exception as e:
+                logger.error(f"Redis board sync heartbeat failed: {e}")
+
+    async def _refresh_expiry(self, board_ids: list[str]):
+        """Keep the keys of the boards held here from expiring."""
+        if not board_ids:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for board_id in board_ids:
+            self._queue_expire(pipe, board_id, await self._element_keys(board_id))
+        await pipe.execute()
+
+    async def _prune_users(self, board_ids: list[str]):
+        """Remove users of nodes whose heartbeat expired from the boards held here."""
+        if not board_ids:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for board_id in board_ids:
+            pipe.hgetall(self._key(board_id, "users"))
+        user_hashes = await pipe.execute()
+
+        nodes = {}  # sid -> node, per board
+        for board_id, users in zip(board_ids, user_hashes):
+            for sid, user in users.items():
+                try:
+                    node = json.loads(user).get("node")
+                except (AttributeError, ValueError):
+                    node = None
+                if node != self.node_id:
+                    nodes.setdefault(board_id, {})[sid] = node
+        node_ids = sorted({node for users in nodes.values() for node in users.values() if node})
+        pipe = self.redis.pipeline(transaction=False)
+        for node_id in node_ids:
+            pipe.exists(self._node_key(node_id))
+        alive = {node_id for node_id, found in zip(node_ids, await pipe.execute()) if found}
+
+        for board_id, users in nodes.items():
+            dead = [sid for sid, node in users.items() if node not in alive]
+            if not dead:
+                continue
+            pipe = self.redis.pipeline(transaction=False)
+            for sid in dead:
+                pipe.hdel(self._key(board_id, "users"), sid)
+            # Only the node whose HDEL removed a user announces it
+            removed = [sid for sid, count in zip(dead, await pipe.execute()) if count]
+            for sid in dead:
+                self.state.remote_users.get(board_id, {}).pop(sid, None)
+            for sid in removed:
+                self.publish(board_id, {"type": "user_leave", "sid": sid})
+            if removed:
+                logger.info(f"Removed {len(removed)} users of stopped nodes from board {board_id}")
+                if self.on_users_pruned is not None:
+                    await self.on_users_pruned(board_id, removed)
+
+    async def has_board(self, board_id: str) -> bool:
+        """Whether Redis holds a board (some node has used it within ``board_ttl``)."""
+        return bool(await self.redis.exists(self._key(board_id, "seq")))
+
+    def snapshot_seq(self, board_id: str) -> int:
+        """Seq of the last snapshot loaded for a board (0: unknown to Redis)."""
+        return self._snapshot_seq.get(board_id, 0)
+
+    # Reading
+
+    async def _listener(self):
+        delay = RETRY_MIN_DELAY
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                    await self._pubsub.subscribe(self.channel)
+                    logger.info("Redis board sync resubscribed")
+                    # Operations published in the meantime are lost
+                    for board_id in list(self.state.boards):
+                        self.resync(board_id)
+                async for message in self._pubsub.listen():
+                    delay = RETRY_MIN_DELAY
+                    self._handle_message(message)
+                raise ConnectionError("subscription closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis board sync subscription lost, retrying in {delay:.1f}s: {e}")
+                pubsub, self._pubsub = self._pubsub, None
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    def _handle_message(self, message: dict):
+        try:
+            data = json.loads(message["data"])
+            node, board_id, op = data["node"], data["board_id"], data["op"]
+            seq = int(data["seq"])
+            if not isinstance(op, dict):
+                raise TypeError(op)
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Ignoring malformed board op message")
+            return
+        if node == self.node_id:
+            return
+        if board_id in self._loading:
+            self._buffered.setdefault(board_id, []).append((seq, op))
+        elif board_id in self.state.boards and seq > self._snapshot_seq.get(board_id, 0):
+            try:
+                element = op_element(op)
+                order = self._order.setdefault(board_id, OpOrder())
+                conflict = order.conflicts(element, seq)
+                order.record(element, seq)
+                self._apply(board_id, op)
+            except Exception as e:
+                # The replica may be half-updated: start over from Redis
+                logger.error(f"Failed to apply {op.get('type')} op to board {board_id}: {e}")
+                self.resync(board_id)
+                return
+            if conflict:
+                logger.info(f"Board {board_id} ops applied out of order; resyncing")
+                self.resync(board_id)
+            elif op["type"] == "load":
+                # The board was replaced (written through the API, or
+                # republished); the resync sends clients a fresh board_state
+                self.resync(board_id)
+
+    def _apply(self, board_id: str, op: dict):
+        if op["type"] == "settings":
+            if self.on_settings is not None:
+                self.on_settings(board_id, op["settings"])
+        else:
+            self.state.apply_op(board_id, op)
+
+    async def _reload(self, board_id: str):
+        if board_id not in self.state.boards or board_id in self._republish:
+            # A board waiting to be republished is more current than Redis
+            return
+        try:
+            await self.load_board(board_id)
+        except Exception as e:
+            logger.error(f"Failed to resync board {board_id} from Redis: {e}")
+            return
+        # Local changes still on their way to Redis
+        for op in list(self._unwritten.get(board_id, ())):
+            try:
+                self.state.apply_op(board_id, op)
+            except Exception as e:
+                logger.error(f"Failed to reapply {op['type']} op to board {board_id}: {e}")
+        if self.on_resync is not None:
+            try:
+                await self.on_resync(board_id)
+            except Exception as e:
+                logger.error(f"Resync callback failed for board {board_id}: {e}")
+
+    async def load_board(self, board_id: str) -> dict:
+        """Load a board snapshot from Redis into the local replica.
+
+        Concurrent callers for the same board share a single load.
+        """
+        task = self._loading.get(board_id)
+        if task is None:
+            self._buffered[board_id] = []
+            task = asyncio.create_task(self._load_snapshot(board_id))
+            self._loading[board_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(board_id, None))
+        return await asyncio.shield(task)
+
+    async def _load_snapshot(self, board_id: str) -> dict:
+        key = lambda name: self._key(board_id, name)  # noqa: E731
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.get(key("seq"))
+            pipe.hgetall(key("strokes"))
+            pipe.hgetall(key("ptlen"))
+            pipe.smembers(key("completed"))
+            pipe.hgetall(key("objects"))
+            pipe.zrange(key("order"), 0, -1)
+            pipe.hgetall(key("users"))
+            seq, strokes, ptlen, completed, objects, order, users = await pipe.execute()
+            seq = int(seq or 0)
+
+            stroke_ids = [m[2:] for m in order if m.startswith("s:") and m[2:] in strokes]
+            object_ids = [m[2:] for m in order if m.startswith("o:") and m[2:] in objects]
+            pipe = self.redis.pipeline(transaction=False)
+            for stroke_id in stroke_ids:
+                pipe.lrange(key(f"points:{stroke_id}"), 0, int(ptlen.get(stroke_id, 0)) - 1)
+            # Updates newer than the snapshot may be read here too; merging
+            # them again from the buffered ops gives the same result
+            for object_id in object_ids:
+                pipe.hgetall(key(f"props:{object_id}"))
+            results = await pipe.execute()
+            point_batches = dict(zip(stroke_ids, results))
+            updates = dict(zip(object_ids, results[len(stroke_ids) :]))
+
+            stroke_list = []
+            object_list = []
+            for member in order:
+                element_id = member[2:]
+                if member.startswith("s:") and element_id in strokes:
+                    stroke = Stroke.from_dict(json.loads(strokes[element_id]))
+                    for batch in point_batches.get(element_id, []):
+                        batch = json.loads(batch)
+                        if isinstance(batch, dict):
+                            stroke.append_bin(
+                                base64.b64decode(batch["bin"]), batch.get("t0", stroke.t0 or 0)
+                            )
+                        else:
+                            stroke.append_points(batch)
+                    stroke.completed = element_id in completed
+                    stroke_list.append(stroke)
+                elif member.startswith("o:") and element_id in objects:
+                    obj = json.loads(objects[element_id])
+                    if updates.get(element_id):
+                        obj.setdefault("properties", {}).update(
+                            {k: json.loads(v) for k, v in updates[element_id].items()}
+                        )
+                    object_list.append(obj)
+
+            board = self.state.load_board(board_id, stroke_list, object_list)
+            local_sids = self.state.board_users.get(board_id, set())
+            self.state.remote_users[board_id] = {
+                sid: _without_node(json.loads(user))
+                for sid, user in users.items()
+                if sid not in local_sids
+            }
+            self._snapshot_seq[board_id] = seq
+            order = self._order.setdefault(board_id, OpOrder())
+            order.applied = {}
+            order.top = seq
+
+            for op_seq, op in sorted(self._buffered.get(board_id, []), key=lambda item: item[0]):
+                if op_seq > seq:
+                    try:
+                        order.record(op_element(op), op_seq)
+                        self._apply(board_id, op)
+                    except Exception as e:
+                        logger.error(f"Failed to apply {op.get('type')} op to board {board_id}: {e}")
+                        self.resync(board_id)
+            return board
+        finally:
+            self._buffered.pop(board_id, None)
+
+
+def _element_key_names(op: dict) -> list:
+    """Names of the per-stroke and per-object keys an operation writes."""
+    if op["type"] in ("stroke_points", "stroke_end"):
+        return [f"points:{op['stroke_id']}"]
+    if op["type"] == "object_update":
+        return [f"props:{op['object_id']}"]
+    if op["type"] == "load":
+        return [f"points:{stroke['id']}" for stroke in op["strokes"]]
+    return []
+
+
+def _without_node(user: dict) -> dict:
+    user.pop("node", None)
+    return user
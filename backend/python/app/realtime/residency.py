@@ -0,0 +1,309 @@
+"""Lazy loading and idle eviction of resident boards."""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from app.realtime.persistence import BoardPersistence, estimate_board_bytes
+from app.realtime.state import BoardState
+
+logger = logging.getLogger(__name__)
+
+
+class BoardResidency:
+    """Keeps only the boards that are in use in memory.
+
+    ``get_board`` returns a resident board or loads it: from Redis when
+    cross-node sync is enabled and Redis knows the board, otherwise from
+    ``Board.canvas_data`` in Postgres. Concurrent callers for the same board
+    share one load.
+
+    A background sweep evicts boards without connected users on this node
+    once they have been idle for ``idle_ttl`` seconds, and evicts the least
+    recently used idle boards early while the estimated size of all
+    resident boards exceeds ``memory_budget`` bytes. A board with unsaved
+    changes is written to the database before it is evicted;
+    boards that cannot be stored (no database row) stay resident unless
+    they are empty.
+
+    Canvases written through the API replace the board wherever it is live
+    (``replace_canvas``), or patch it (``patch_canvas``), so the next save
+    does not overwrite them.
+    """
+
+    def __init__(
+        self,
+        state: BoardState,
+        persistence: BoardPersistence,
+        board_sync=None,
+        idle_ttl: float = 300.0,
+        memory_budget: int = 512 * 1024 * 1024,
+        sweep_interval: float = 30.0,
+        on_load: Callable[[str, dict], None] | None = None,
+        on_evict: Callable[[str], None] | None = None,
+    ):
+        self.state = state
+        self.persistence = persistence
+        self.board_sync = board_sync  # optional RedisBoardSync
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self.sweep_interval = sweep_interval
+        self.on_load = on_load  # called with (board_id, Board.settings)
+        self.on_evict = on_evict
+        # Awaited with a board_id after its resident content was replaced
+        self.on_replace: Callable[[str], Awaitable[None]] | None = None
+        # Awaited with (board_id, ops, user_id) to apply canvas patch ops to
+        # a resident board; returns False if they cannot be applied as such
+        self.on_patch: Callable[[str, list, object], Awaitable[bool]] | None = None
+
+        self._loading: dict[str, asyncio.Task] = {}
+        self._idle_since: dict[str, float] = {}  # board_id -> monotonic time
+        self._task: asyncio.Task | None = None
+
+        # Counters
+        self.loads = 0
+        self.evictions = 0
+
+    def start(self):
+        """Start the periodic eviction sweep."""
+        if self._task is None and self.sweep_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the sweep (resident boards are left as they are)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # Loading
+
+    async def get_board(self, board_id: str) -> dict:
+        """Return a resident board, loading it if needed."""
+        board = self.state.boards.get(board_id)
+        if board is not None:
+            return board
+        task = self._loading.get(board_id)
+        if task is None:
+            task = asyncio.create_task(self._load(board_id))
+            self._loading[board_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(board_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, board_id: str) -> dict:
+        self.loads += 1
+        if self.board_sync is not None:
+            try:
+                board = await self.board_sync.load_board(board_id)
+                if self.board_sync.snapshot_seq(board_id):
+                    await self._load_settings(board_id)
+                    return board
+            except Exception as e:
+                logger.error(f"Failed to load board {board_id} from Redis: {e}")
+
+        try:
+            row = await self.persistence.load(board_id)
+        except Exception as e:
+            logger.error(f"Failed to load board {board_id} from the database: {e}")
+            row = None
+        if row is None:
+            return self.state.get_or_create_board(board_id)
+
+        canvas, board_settings = row
+        strokes, objects, layers = canvas_elements(canvas)
+        board = self.state.load_board(board_id, strokes, objects, layers)
+        if self.board_sync is not None:
+            # Seed Redis so other nodes see the same content
+            self.board_sync.publish(
+                board_id,
+                {"type": "load", "strokes": strokes, "objects": objects, "layers": layers},
+            )
+        if self.on_load is not None:
+            self.on_load(board_id, board_settings)
+        logger.info(f"Loaded board {board_id} from the database ({len(strokes)} strokes)")
+        return board
+
+    async def is_live(self, board_id: str) -> bool:
+        """Whether a board is resident here or, with Redis, held by Redis."""
+        if board_id in self.state.boards or board_id in self._loading:
+            return True
+        if self.board_sync is None:
+            return False
+        try:
+            return await self.board_sync.has_board(board_id)
+        except Exception as e:
+            logger.error(f"Failed to look up board {board_id} in Redis: {e}")
+            return True
+
+    async def replace_canvas(self, board_id: str, canvas: dict, revision: int):
+        """Install a canvas committed through the API at ``revision``.
+
+        The resident board is replaced and no longer dirty, as the database
+        has its content; with Redis, the other nodes and later loads get it
+        as a ``load`` operation. Live edits made since the last save are lost.
+        """
+        if not await self.is_live(board_id):
+            return
+        task = self._loading.get(board_id)
+        if task is not None:
+            # The load may have read the canvas before it was written
+            await asyncio.gather(asyncio.shield(task), return_exceptions=True)
+        strokes, objects, layers = canvas_elements(canvas)
+        if self.board_sync is not None:
+            self.board_sync.publish(
+                board_id,
+                {"type": "load", "strokes": strokes, "objects": objects, "layers": layers},
+            )
+        if board_id not in self.state.boards:
+            return
+        self.state.load_board(board_id, strokes, objects, layers)
+        self.state.dirty.pop(board_id, None)
+        self.state.changes.pop(board_id, None)
+        self.persistence.revisions[board_id] = revision
+        if self.on_replace is not None:
+            await self.on_replace(board_id)
+
+    async def patch_canvas(
+        self, board_id: str, ops: list[dict], revision: int, user_id=None
+    ) -> bool:
+        """Apply canvas patch ops committed through the API at ``revision``.
+
+        A board held by other nodes is loaded here first. Returns False if
+        the ops could not be applied one by one (see ``on_patch``); the
+        caller should ``replace_canvas`` then.
+        """
+        if self.on_patch is None:
+            return False
+        if board_id not in self.state.boards:
+            await self.get_board(board_id)
+        if not await self.on_patch(board_id, ops, user_id):
+            return False
+        self.persistence.revisions[board_id] = revision
+        return True
+
+    def update_settings(self, board_id: str, board_settings: dict | None):
+        """Apply changed ``Board.settings`` here and on the other nodes holding the board."""
+        if self.on_load is not None and board_id in self.state.boards:
+            self.on_load(board_id, board_settings)
+        if self.board_sync is not None:
+            self.board_sync.publish(board_id, {"type": "settings", "settings": board_settings})
+
+    async def _load_settings(self, board_id: str):
+        if self.on_load is None:
+            return
+        try:
+            board_settings = await self.persistence.load_settings(board_id)
+        except Exception as e:
+            logger.error(f"Failed to load settings of board {board_id}: {e}")
+            return
+        if board_settings is not None:
+            self.on_load(board_id, board_settings)
+
+    # Eviction
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Board eviction sweep failed: {e}")
+
+    def _idle_boards(self) -> list[str]:
+        """Resident boards without local users, least recently used first."""
+        now = time.monotonic()
+        idle = []
+        for board_id in self.state.boards:
+            if self.state.board_users.get(board_id) or board_id in self._loading:
+                self._idle_since.pop(board_id, None)
+            else:
+                self._idle_since.setdefault(board_id, now)
+                idle.append(board_id)
+        for board_id in list(self._idle_since):
+            if board_id not in self.state.boards:
+                del self._idle_since[board_id]
+        idle.sort(key=self._idle_since.__getitem__)
+        return idle
+
+    async def sweep(self):
+        """Evict expired idle boards, then idle boards over the memory budget."""
+        idle = self._idle_boards()
+        now = time.monotonic()
+        expired = [b for b in idle if now - self._idle_since[b] >= self.idle_ttl]
+        if expired:
+            await self.evict(expired)
+
+        if self.memory_budget > 0:
+            sizes = {b: estimate_board_bytes(board) for b, board in self.state.boards.items()}
+            excess = sum(sizes.values()) - self.memory_budget
+            over_budget = []
+            for board_id in idle:
+                if excess <= 0:
+                    break
+                if board_id in self.state.boards:
+                    over_budget.append(board_id)
+                    excess -= sizes.get(board_id, 0)
+            if over_budget:
+                await self.evict(over_budget)
+
+    async def evict(self, board_ids: list[str]) -> list[str]:
+        """Store and drop idle boards; returns the ids actually evicted.
+
+        Boards without unsaved changes are dropped as they are.
+        """
+        canvases = {}
+        changes = {}
+        for board_id in board_ids:
+            board = self.state.boards.get(board_id)
+            if board is not None and board_id in self.state.dirty:
+                self.state.dirty.pop(board_id)
+                changes[board_id] = self.state.changes.pop(board_id, None)
+                canvases[board_id] = await self.persistence.snapshot(
+                    board_id, board, changes[board_id]
+                )
+        if canvases:
+            try:
+                saved = await self.persistence.save(canvases)
+            except Exception as e:
+                logger.error(f"Failed to store {len(canvases)} boards before eviction: {e}")
+                saved = set()
+            for board_id in canvases:
+                if board_id not in saved and self.persistence.is_stored(board_id):
+                    # Failed, or the row changed storage mode: keep it resident
+                    self.state.mark_dirty(board_id)
+                    if changes[board_id] is not None:
+                        self.state.restore_changes(board_id, changes[board_id])
+
+        evicted = []
+        for board_id in board_ids:
+            board = self.state.boards.get(board_id)
+            if board is None:
+                continue
+            if not self.persistence.is_stored(board_id) and (board["strokes"] or board["objects"]):
+                # No database row: only an empty board can go
+                continue
+            # Someone may have joined, or the board changed, while it was stored
+            if (
+                self.state.board_users.get(board_id)
+                or board_id in self._loading
+                or board_id in self.state.dirty
+            ):
+                continue
+            self.state.evict_board(board_id)
+            self.persistence.forget(board_id)
+            self._idle_since.pop(board_id, None)
+            if self.on_evict is not None:
+                self.on_evict(board_id)
+            evicted.append(board_id)
+        self.evictions += len(evicted)
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} idle boards")
+        return evicted
+
+
+def canvas_elements(canvas: dict) -> tuple[list, list, list | None]:
+    """Strokes, objects and layers of a stored canvas, to load into a board."""
+    # Whoever was drawing when the board was stored is gone
+    strokes = [{**stroke, "completed": True} for stroke in canvas.get("strokes") or []]
+    return strokes, canvas.get("objects") or [], canvas.get("layers") or None
@@ -0,0 +1,65 @@
+"""Realtime services shared by the Socket.io handlers and the REST API.
+
+The board replica and the services that load, replicate and store it live
+here, so that API routes can reach resident boards without importing
+app.socket_handlers. The handlers attach their callbacks (eviction cleanup,
+resync broadcasts) after import.
+"""
+
+import redis.asyncio as redis
+
+from app.config import get_settings
+from app.database import async_session_maker
+from app.realtime.persistence import BoardPersistence
+from app.realtime.redis_sync import RedisBoardSync
+from app.realtime.residency import BoardResidency
+from app.realtime.simplify import StrokeSimplifier
+from app.realtime.state import BoardState
+from app.realtime.writer import WriteBehindPersister
+
+settings = get_settings()
+
+# Global state instance
+state = BoardState(index_cell_size=settings.spatial_index_cell_size)
+
+# Cross-node board state replication (started in the app lifespan)
+board_sync: RedisBoardSync | None = (
+    RedisBoardSync(
+        redis.Redis.from_url(settings.redis_url, decode_responses=True),
+        state,
+        prefix=settings.redis_key_prefix,
+        board_ttl=settings.redis_board_ttl_seconds,
+        heartbeat=settings.redis_heartbeat_seconds,
+    )
+    if settings.redis_enabled
+    else None
+)
+
+# RDP simplification of completed strokes; per-board settings changed on
+# another node arrive through the board sync
+stroke_simplifier = StrokeSimplifier(settings.stroke_simplify_tolerance)
+if board_sync is not None:
+    board_sync.on_settings = stroke_simplifier.configure
+
+board_persistence = BoardPersistence(async_session_maker, storage=settings.canvas_storage)
+
+# Lazy board loading and idle board eviction (started in the app lifespan);
+# the eviction callback is set by app.socket_handlers
+board_residency = BoardResidency(
+    state,
+    board_persistence,
+    board_sync=board_sync,
+    idle_ttl=settings.board_idle_ttl_seconds,
+    memory_budget=settings.board_memory_budget_mb * 1024 * 1024,
+    sweep_interval=settings.board_sweep_interval_seconds,
+    on_load=stroke_simplifier.configure,
+)
+
+# Write-behind saving of live edits to Board.canvas_data (started in the app lifespan)
+board_persister = WriteBehindPersister(
+    state,
+    board_persistence,
+    debounce=settings.persist_debounce_seconds,
+    max_delay=settings.persist_max_delay_seconds,
+    batch_size=settings.persist_batch_size,
+)
@@ -0,0 +1,179 @@
+"""Point reduction for completed strokes (Ramer-Douglas-Peucker).
+
+Raw strokes carry every input sample, which at stylus rates is mostly
+near-collinear points. When a stroke ends, ``StrokeSimplifier`` drops the
+points that do not change its rendered shape by more than a tolerance (in
+canvas units) and the simplified stroke replaces the raw one everywhere.
+
+The error of a dropped point is measured against the rendered outline, not
+just the centre line: besides its distance from the simplified segment, the
+difference between its pressure and the pressure interpolated along the
+segment counts as a change of half the stroke width. Pressure swells and
+tapers are therefore kept even where the path itself is straight.
+
+The tolerance is ``stroke_simplify_tolerance`` from the server settings and
+can be overridden per board with the same key in ``Board.settings``; 0
+disables simplification. NumPy is required; without it strokes are kept
+as drawn.
+"""
+
+import logging
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from app.realtime.stroke import Stroke
+
+logger = logging.getLogger(__name__)
+
+# Board.settings key holding a per-board tolerance
+SETTINGS_KEY = "stroke_simplify_tolerance"
+
+if np is not None:
+    # Same layout as app.realtime.codec.POINT_RECORD
+    POINT_DTYPE = np.dtype(
+        [("x", "<f4"), ("y", "<f4"), ("pressure", "u1"), ("tilt", "i1"), ("dt", "<u2")]
+    )
+
+
+def rdp_mask(xy, pressure, tolerance: float, width: float):
+    """Mask of the points kept by pressure-aware Ramer-Douglas-Peucker.
+
+    ``xy`` is an (n, 2) array and ``pressure`` an (n,) array in 0..1. Each
+    split tests all points of a segment at once.
+    """
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    half_width = width / 2
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a = xy[start]
+        ab = xy[end] - a
+        ap = xy[start + 1 : end] - a
+        length_sq = float(ab @ ab)
+        if length_sq > 0:
+            t = np.clip((ap @ ab) / length_sq, 0.0, 1.0)
+            distance = np.abs(ab[0] * ap[:, 1] - ab[1] * ap[:, 0]) / np.sqrt(length_sq)
+        else:
+            t = np.linspace(0.0, 1.0, end - start + 1)[1:-1]
+            distance = np.hypot(ap[:, 0], ap[:, 1])
+        expected = pressure[start] + t * (pressure[end] - pressure[start])
+        error = distance + np.abs(pressure[start + 1 : end] - expected) * half_width
+
+        i = int(np.argmax(error))
+        if error[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+class StrokeSimplifier:
+    """Simplifies strokes on ``stroke_end`` and tracks the reduction per board."""
+
+    def __init__(self, tolerance: float = 0.0, min_points: int = 3):
+        self.tolerance = tolerance
+        self.min_points = min_points
+        self.tolerances: dict[str, float] = {}  # board_id -> tolerance from Board.settings
+        # board_id -> [points before, points after]
+        self.stats: dict[str, list[int]] = {}
+        if np is None and tolerance > 0:
+            logger.warning("NumPy is not installed, stroke simplification is disabled")
+
+    @property
+    def enabled(self) -> bool:
+        """Whether simplification can run at all (NumPy is installed)."""
+        return np is not None
+
+    def configure(self, board_id: str, board_settings: dict | None):
+        """Apply a board's ``Board.settings`` (per-board tolerance override)."""
+        value = (board_settings or {}).get(SETTINGS_KEY)
+        try:
+            self.tolerances[board_id] = float(value)
+        except (TypeError, ValueError):
+            self.tolerances.pop(board_id, None)
+
+    def tolerance_for(self, board_id: str) -> float:
+        return self.tolerances.get(board_id, self.tolerance)
+
+    def reduction_ratio(self, board_id: str | None = None) -> float:
+        """Fraction of the points of simplified strokes that were dropped.
+
+        For one board, or for all resident boards when ``board_id`` is None.
+        """
+        if board_id is None:
+            before = sum(counts[0] for counts in self.stats.values())
+            after = sum(counts[1] for counts in self.stats.values())
+        else:
+            before, after = self.stats.get(board_id, (0, 0))
+        if not before:
+            return 0.0
+        return 1 - after / before
+
+    def discard(self, board_id: str):
+        """Forget a board's settings and counters."""
+        self.tolerances.pop(board_id, None)
+        self.stats.pop(board_id, None)
+
+    def simplify(self, board_id: str, stroke: Stroke) -> bool:
+        """Replace a completed stroke's points with a simplified set.
+
+        Returns True if points were dropped.
+        """
+        tolerance = self.tolerance_for(board_id)
+        if np is None or tolerance <= 0:
+            return False
+
+        width = float(stroke.size or 0)
+        if stroke.is_binary:
+            before, after = self._simplify_bin(stroke, tolerance, width)
+        else:
+            before, after = self._simplify_columns(stroke, tolerance, width)
+        if before == after:
+            return False
+
+        counts = self.stats.setdefault(board_id, [0, 0])
+        counts[0] += before
+        counts[1] += after
+        logger.debug(f"Simplified stroke {stroke.id}: {before} -> {after} points")
+        return True
+
+    def _simplify_columns(self, stroke: Stroke, tolerance: float, width: float) -> tuple[int, int]:
+        count = stroke.point_count
+        if count < self.min_points:
+            return count, count
+        # Copies, so the arrays are not locked against resizing by exported buffers
+        xy = np.column_stack(
+            (np.array(stroke.x, dtype=np.float64), np.array(stroke.y, dtype=np.float64))
+        )
+        pressure = np.array(stroke.pressure, dtype=np.float64)
+        keep = np.flatnonzero(rdp_mask(xy, pressure, tolerance, width))
+        for name in ("x", "y", "pressure", "tilt", "timestamp"):
+            column = getattr(stroke, name)
+            kept = np.array(column, dtype=column.typecode)[keep]
+            setattr(stroke, name, array(column.typecode, kept.tobytes()))
+        return count, len(keep)
+
+    def _simplify_bin(self, stroke: Stroke, tolerance: float, width: float) -> tuple[int, int]:
+        records = np.frombuffer(bytes(stroke.points_bin), dtype=POINT_DTYPE)
+        count = len(records)
+        if count < self.min_points:
+            return count, count
+        xy = np.column_stack((records["x"], records["y"])).astype(np.float64)
+        pressure = records["pressure"] / 255
+        keep = np.flatnonzero(rdp_mask(xy, pressure, tolerance, width))
+
+        kept = records[keep].copy()
+        # dt is relative to the previous record, so re-base it on the kept ones
+        timestamps = np.cumsum(records["dt"], dtype=np.int64)[keep]
+        kept["dt"][1:] = np.clip(np.diff(timestamps), 0, 0xFFFF)
+        stroke.points_bin = bytearray(kept.tobytes())
+        return count, len(kept)
@@ -0,0 +1,170 @@
+"""Chunked, viewport-first delivery of the initial board state."""
+
+import asyncio
+import logging
+from typing import Any
+
+from app.realtime.geometry import BBox
+
+logger = logging.getLogger(__name__)
+
+
+class BoardStateStreamer:
+    """Streams a board to a joining client in bounded chunks.
+
+    Clients that join with ``chunked: true`` first receive a ``board_state``
+    with layers and users but no content (``chunked: true``, plus totals),
+    then ``board_state_chunk`` events ``{"board_id", "index", "strokes",
+    "objects"}`` and finally ``board_state_complete {"board_id", "chunks"}``.
+
+    In-progress strokes go out in the first chunk, right away, so live
+    ``stroke_update`` events always refer to a stroke the client knows.
+    Then comes content intersecting the client's viewport, then the rest
+    grouped by layer. A chunk holds at most ``max_elements`` elements or
+    ``max_points`` stroke points.
+
+    Flow control: the remaining chunks are sent from a background task,
+    at most ``max_concurrent`` streams run at once per process, and each
+    stream yields to the event loop between chunks so that joiners cannot
+    starve the rest of the room.
+    """
+
+    def __init__(
+        self,
+        sio,
+        max_points: int = 20000,
+        max_elements: int = 500,
+        max_concurrent: int = 4,
+    ):
+        self.sio = sio
+        self.max_points = max_points
+        self.max_elements = max_elements
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(
+        self,
+        sid: str,
+        board_id: str,
+        board: dict,
+        users: list[dict],
+        point_format: str,
+        viewport: BBox | None = None,
+        epoch: str | None = None,
+        seq: int = 0,
+    ):
+        """Send the board header and in-progress strokes, then stream the rest.
+
+        The caller flushes the room's buffered stroke points first (see
+        StrokeBroadcaster.flush); they are part of the board sent here.
+        """
+        # Current points only; later points arrive as live updates
+        active = [stroke.serialize(point_format) for stroke in board["active_strokes"].values()]
+        active_ids = set(board["active_strokes"])
+        strokes = [s for s in board["strokes"] if s.id not in active_ids]
+        objects = board["objects"].to_list()
+
+        await self.sio.emit(
+            "board_state",
+            {
+                "board_id": board_id,
+                "epoch": epoch,
+                "seq": seq,
+                "point_format": point_format,
+                "chunked": True,
+                "total_strokes": len(strokes) + len(active),
+                "total_objects": len(objects),
+                "strokes": [],
+                "objects": [],
+                "layers": board["layers"],
+                "users": users,
+            },
+            to=sid,
+        )
+        await self.sio.emit(
+            "board_state_chunk",
+            {"board_id": board_id, "index": 0, "strokes": active, "objects": []},
+            to=sid,
+        )
+
+        task = asyncio.create_task(
+            self._stream(sid, board_id, board, strokes, objects, point_format, viewport)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _order(
+        self, board: dict, strokes: list, objects: list[dict], viewport: BBox | None
+    ) -> list[tuple[str, Any]]:
+        """Viewport content first, then everything else grouped by layer."""
+        layer_rank = {layer["id"]: i for i, layer in enumerate(board["layers"])}
+        visible = board["index"].query(viewport) if viewport is not None else set()
+        first = []
+        rest = []
+        for kind, elements in (("stroke", strokes), ("object", objects)):
+            for i, element in enumerate(elements):
+                if (kind, element.get("id")) in visible:
+                    first.append((kind, element))
+                else:
+                    rest.append((kind, element))
+                if i % self.max_elements == self.max_elements - 1:
+                    await asyncio.sleep(0)
+        rest.sort(key=lambda item: layer_rank.get(item[1].get("layer_id"), len(layer_rank)))
+        return first + rest
+
+    async def _stream(
+        self,
+        sid: str,
+        board_id: str,
+        board: dict,
+        strokes: list,
+        objects: list[dict],
+        point_format: str,
+        viewport: BBox | None,
+    ):
+        index = 1
+        try:
+            async with self._slots:
+                chunk = {"strokes": [], "objects": []}
+                size = 0
+                for kind, element in await self._order(board, strokes, objects, viewport):
+                    # Skip elements deleted or cleared since the join
+                    store = board["strokes"] if kind == "stroke" else board["objects"]
+                    if store.get(element.get("id")) is not element:
+                        continue
+                    if kind == "stroke":
+                        chunk["strokes"].append(element.serialize(point_format))
+                        size += max(element.point_count, 1)
+                    else:
+                        chunk["objects"].append(element)
+                        size += 1
+
+                    count = len(chunk["strokes"]) + len(chunk["objects"])
+                    if size >= self.max_points or count >= self.max_elements:
+                        if not self.sio.manager.is_connected(sid, "/"):
+                            return
+                        await self.sio.emit(
+                            "board_state_chunk",
+                            {"board_id": board_id, "index": index, **chunk},
+                            to=sid,
+                        )
+                        index += 1
+                        chunk = {"strokes": [], "objects": []}
+                        size = 0
+                        await asyncio.sleep(0)
+
+                if chunk["strokes"] or chunk["objects"]:
+                    await self.sio.emit(
+                        "board_state_chunk",
+                        {"board_id": board_id, "index": index, **chunk},
+                        to=sid,
+                    )
+                    index += 1
+
+            await self.sio.emit(
+                "board_state_complete",
+                {"board_id": board_id, "chunks": index},
+                to=sid,
+            )
+        except Exception as e:
+            logger.error(f"Failed to stream board {board_id} to {sid}: {e}")
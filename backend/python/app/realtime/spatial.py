@@ -0,0 +1,135 @@
+"""Uniform-grid spatial index over element bounding boxes."""
+
+import math
+from typing import Any, Iterator
+
+from app.realtime.geometry import BBox, intersects, union
+
+# Elements spanning more cells than this are kept in a separate list that
+# every query scans, instead of being registered in each cell.
+MAX_CELLS_PER_ELEMENT = 256
+
+
+class GridIndex:
+    """Maps canvas cells to the elements whose bounding box touches them.
+
+    Keys are opaque (``BoardState`` uses ``("stroke", id)`` / ``("object", id)``).
+    Boxes can grow in place with ``extend``, which only registers the new
+    cells, so streaming stroke points costs O(new cells) per update.
+    """
+
+    __slots__ = ("cell_size", "_cells", "_boxes", "_ranges", "_large")
+
+    def __init__(self, cell_size: float = 512.0):
+        self.cell_size = cell_size
+        self._cells: dict[tuple[int, int], set] = {}
+        self._boxes: dict[Any, BBox] = {}
+        self._ranges: dict[Any, tuple[int, int, int, int]] = {}  # key -> cell range
+        self._large: set = set()
+
+    def _range(self, box: BBox) -> tuple[int, int, int, int]:
+        size = self.cell_size
+        return (
+            math.floor(box[0] / size),
+            math.floor(box[1] / size),
+            math.floor(box[2] / size),
+            math.floor(box[3] / size),
+        )
+
+    @staticmethod
+    def _cells_in(cells: tuple[int, int, int, int]) -> Iterator[tuple[int, int]]:
+        for cx in range(cells[0], cells[2] + 1):
+            for cy in range(cells[1], cells[3] + 1):
+                yield cx, cy
+
+    @staticmethod
+    def _cell_count(cells: tuple[int, int, int, int]) -> int:
+        return (cells[2] - cells[0] + 1) * (cells[3] - cells[1] + 1)
+
+    def insert(self, key: Any, box: BBox | None):
+        """Index an element's box, replacing any previous one (None removes it)."""
+        self.remove(key)
+        if box is None:
+            return
+        self._boxes[key] = box
+        cells = self._range(box)
+        if self._cell_count(cells) > MAX_CELLS_PER_ELEMENT:
+            self._large.add(key)
+            return
+        self._ranges[key] = cells
+        for cell in self._cells_in(cells):
+            self._cells.setdefault(cell, set()).add(key)
+
+    def extend(self, key: Any, box: BBox | None):
+        """Grow an element's box to also cover ``box``."""
+        if box is None:
+            return
+        old_cells = self._ranges.get(key)
+        if old_cells is None:
+            # New or large element
+            if key in self._large:
+                self._boxes[key] = union(self._boxes[key], box)
+            else:
+                self.insert(key, box)
+            return
+
+        merged = union(self._boxes[key], box)
+        cells = self._range(merged)
+        if self._cell_count(cells) > MAX_CELLS_PER_ELEMENT:
+            self.insert(key, merged)
+            return
+        self._boxes[key] = merged
+        if cells != old_cells:
+            for cell in self._cells_in(cells):
+                if not (
+                    old_cells[0] <= cell[0] <= old_cells[2]
+                    and old_cells[1] <= cell[1] <= old_cells[3]
+                ):
+                    self._cells.setdefault(cell, set()).add(key)
+            self._ranges[key] = cells
+
+    def remove(self, key: Any):
+        """Drop an element from the index."""
+        self._boxes.pop(key, None)
+        self._large.discard(key)
+        cells = self._ranges.pop(key, None)
+        if cells is None:
+            return
+        for cell in self._cells_in(cells):
+            keys = self._cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._cells[cell]
+
+    def clear(self):
+        """Remove every element."""
+        self._cells.clear()
+        self._boxes.clear()
+        self._ranges.clear()
+        self._large.clear()
+
+    def box(self, key: Any) -> BBox | None:
+        """Indexed box of an element."""
+        return self._boxes.get(key)
+
+    def query(self, bbox: BBox) -> set:
+        """Keys of the elements whose box intersects ``bbox``."""
+        cells = self._range(bbox)
+        found = set()
+        if self._cell_count(cells) > len(self._cells):
+            # Query larger than the populated area: walk the occupied cells
+            for (cx, cy), keys in self._cells.items():
+                if cells[0] <= cx <= cells[2] and cells[1] <= cy <= cells[3]:
+                    found.update(keys)
+        else:
+            for cell in self._cells_in(cells):
+                keys = self._cells.get(cell)
+                if keys:
+                    found.update(keys)
+        found.update(self._large)
+        boxes = self._boxes
+        return {key for key in found if intersects(boxes[key], bbox)}
+
+    def __len__(self) -> int:
+        return len(self._boxes)
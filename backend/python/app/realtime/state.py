@@ -0,0 +1,364 @@
+"""In-memory board state and connected user tracking."""
+
+import base64
+import time
+from datetime import datetime
+
+from app.realtime.codec import POINT_FORMAT_JSON
+from app.realtime.geometry import (
+    BBox,
+    expand,
+    object_bounds,
+    points_bin_bounds,
+    points_bounds,
+    stroke_bounds,
+)
+from app.realtime.spatial import GridIndex
+from app.realtime.store import ElementStore
+from app.realtime.stroke import Stroke
+
+
+# In-memory storage for Phase 1 (will move to Redis in Phase 2)
+class BoardState:
+    """Manages board state and connected users."""
+
+    def __init__(self, index_cell_size: float = 512.0):
+        self.index_cell_size = index_cell_size
+        self.boards: dict[str, dict] = {}  # board_id -> {strokes, objects, layers, active_strokes, index}
+        self.users: dict[str, dict] = {}  # sid -> {user_id, display_name, board_id}
+        self.board_users: dict[str, set] = {}  # board_id -> set of sids
+        self.remote_users: dict[str, dict] = {}  # board_id -> {sid: user} connected to other nodes
+        # board_id -> [first, last] monotonic time of changes not yet persisted
+        self.dirty: dict[str, list[float]] = {}
+        # board_id -> {"strokes": ids, "objects": ids, "cleared": bool} changed
+        # since the last save, for normalized canvas storage (see app.canvas_store)
+        self.changes: dict[str, dict] = {}
+
+    def get_or_create_board(self, board_id: str) -> dict:
+        """Get or create a board state."""
+        if board_id not in self.boards:
+            self.boards[board_id] = {
+                "strokes": ElementStore(),
+                "objects": ElementStore(),
+                "layers": [{"id": "default", "name": "Layer 1", "visible": True, "locked": False}],
+                # stroke_id -> stroke for strokes that have not received stroke_end yet
+                "active_strokes": {},
+                # Bounding boxes of strokes and objects, see query_region()
+                "index": GridIndex(self.index_cell_size),
+            }
+            self.board_users[board_id] = set()
+        return self.boards[board_id]
+
+    def add_user(
+        self,
+        sid: str,
+        user_id: str,
+        display_name: str,
+        board_id: str,
+        point_format: str = POINT_FORMAT_JSON,
+    ):
+        """Add a user to a board."""
+        self.users[sid] = {
+            "user_id": user_id,
+            "display_name": display_name,
+            "board_id": board_id,
+            "point_format": point_format,
+            "joined_at": datetime.utcnow().isoformat(),
+        }
+        if board_id in self.board_users:
+            self.board_users[board_id].add(sid)
+
+    def remove_user(self, sid: str) -> str | None:
+        """Remove a user and return their board_id."""
+        if sid in self.users:
+            board_id = self.users[sid]["board_id"]
+            del self.users[sid]
+            if board_id in self.board_users:
+                self.board_users[board_id].discard(sid)
+            return board_id
+        return None
+
+    def get_board_user_count(self, board_id: str) -> int:
+        """Get number of users in a board."""
+        return len(self.board_users.get(board_id, set())) + len(
+            self.remote_users.get(board_id, {})
+        )
+
+    def get_board_users(self, board_id: str) -> list[dict]:
+        """Get list of users in a board."""
+        users = [
+            self.users[sid]
+            for sid in self.board_users.get(board_id, set())
+            if sid in self.users
+        ]
+        users.extend(self.remote_users.get(board_id, {}).values())
+        return users
+
+    def get_point_formats(self, board_id: str) -> set[str]:
+        """Get the stroke point formats used by the users of a board."""
+        return {
+            user.get("point_format", POINT_FORMAT_JSON)
+            for user in self.get_board_users(board_id)
+        }
+
+    def load_board(
+        self,
+        board_id: str,
+        strokes: list[Stroke | dict],
+        objects: list[dict],
+        layers: list[dict] | None = None,
+    ) -> dict:
+        """Install board content loaded from a shared or persistent store.
+
+        Strokes may be given in their JSON form.
+        """
+        strokes = [s if isinstance(s, Stroke) else Stroke.from_dict(s) for s in strokes]
+        board = self.get_or_create_board(board_id)
+        board["strokes"] = ElementStore(strokes)
+        board["objects"] = ElementStore(objects)
+        board["active_strokes"] = {
+            stroke.id: stroke for stroke in strokes if not stroke.completed
+        }
+        index = board["index"]
+        index.clear()
+        for stroke in board["strokes"]:
+            index.insert(("stroke", stroke.id), stroke_bounds(stroke))
+        for obj in board["objects"]:
+            index.insert(("object", obj["id"]), object_bounds(obj))
+        if layers:
+            board["layers"] = layers
+        return board
+
+    def evict_board(self, board_id: str):
+        """Drop a board from memory (see app.realtime.residency)."""
+        self.boards.pop(board_id, None)
+        self.board_users.pop(board_id, None)
+        self.remote_users.pop(board_id, None)
+        self.dirty.pop(board_id, None)
+        self.changes.pop(board_id, None)
+
+    def mark_dirty(self, board_id: str, kind: str | None = None, element_id=None):
+        """Record that a board has changes to persist (see app.realtime.writer).
+
+        ``kind`` ("strokes" or "objects") and ``element_id`` name the
+        element that changed.
+        """
+        now = time.monotonic()
+        times = self.dirty.get(board_id)
+        if times is None:
+            self.dirty[board_id] = [now, now]
+        else:
+            times[1] = now
+        if kind is not None:
+            changes = self.changes.get(board_id)
+            if changes is None:
+                changes = self.changes[board_id] = _no_changes()
+            changes[kind].add(element_id)
+
+    def restore_changes(self, board_id: str, changes: dict):
+        """Put back element changes taken for a save that failed."""
+        if board_id not in self.boards:
+            return
+        current = self.changes.get(board_id)
+        if current is None:
+            self.changes[board_id] = changes
+        elif not current["cleared"]:
+            # A newer clear makes the older changes irrelevant
+            current["strokes"] |= changes["strokes"]
+            current["objects"] |= changes["objects"]
+            current["cleared"] = changes["cleared"]
+
+    # Board mutations
+
+    def start_stroke(self, board_id: str, stroke: Stroke) -> Stroke | None:
+        """Add a new in-progress stroke to a board."""
+        board = self.boards.get(board_id)
+        if not board:
+            return None
+        self.mark_dirty(board_id, "strokes", stroke.id)
+        board["strokes"].add(stroke)
+        board["active_strokes"][stroke.id] = stroke
+        board["index"].insert(("stroke", stroke.id), stroke_bounds(stroke))
+        return stroke
+
+    def append_stroke_points(self, board_id: str, stroke_id: str, points: list) -> Stroke | None:
+        """Append points to an in-progress stroke."""
+        board = self.boards.get(board_id)
+        if not board:
+            return None
+        self.mark_dirty(board_id, "strokes", stroke_id)
+        stroke = board["active_strokes"].get(stroke_id)
+        if stroke:
+            stroke.append_points(points)
+            self._extend_stroke_bounds(board, stroke, points_bounds(points))
+        return stroke
+
+    def append_stroke_points_bin(
+        self, board_id: str, stroke_id: str, points_bin: bytes, t0: int
+    ) -> Stroke | None:
+        """Append packed binary points (see app.realtime.codec) to an in-progress stroke."""
+        board = self.boards.get(board_id)
+        if not board:
+            return None
+        self.mark_dirty(board_id, "strokes", stroke_id)
+        stroke = board["active_strokes"].get(stroke_id)
+        if stroke:
+            stroke.append_bin(points_bin, t0)
+            self._extend_stroke_bounds(board, stroke, points_bin_bounds(points_bin))
+        return stroke
+
+    @staticmethod
+    def _extend_stroke_bounds(board: dict, stroke: Stroke, box: BBox | None):
+        if box is not None:
+            box = expand(box, (stroke.size or 0) / 2)
+            board["index"].extend(("stroke", stroke.id), box)
+
+    def end_stroke(self, board_id: str, stroke_id: str) -> Stroke | None:
+        """Mark a stroke as completed."""
+        board = self.boards.get(board_id)
+        if not board:
+            return None
+        self.mark_dirty(board_id, "strokes", stroke_id)
+        board["active_strokes"].pop(stroke_id, None)
+        stroke = board["strokes"].get(stroke_id)
+        if stroke:
+            stroke.completed = True
+        return stroke
+
+    def replace_stroke_points(
+        self,
+        board_id: str,
+        stroke_id: str,
+        points: list | None = None,
+        points_bin: bytes | None = None,
+    ) -> Stroke | None:
+        """Replace a stroke's points (e.g. with a simplified set)."""
+        board = self.boards.get(board_id)
+        if not board:
+            return None
+        self.mark_dirty(board_id, "strokes", stroke_id)
+        stroke = board["strokes"].get(stroke_id)
+        if stroke:
+            stroke.replace_points(points, points_bin)
+            board["index"].insert(("stroke", stroke_id), stroke_bounds(stroke))
+        return stroke
+
+    def add_object(self, board_id: str, obj: dict) -> dict | None:
+        """Add a shape or object to a board."""
+        board = self.boards.get(board_id)
+        if not board:
+            return None
+        self.mark_dirty(board_id, "objects", obj.get("id"))
+        board["index"].insert(("object", obj.get("id")), object_bounds(obj))
+        return board["objects"].add(obj)
+
+    def update_object(self, board_id: str, object_id: str, properties: dict) -> dict | None:
+        """Merge properties into an existing object."""
+        board = self.boards.get(board_id)
+        if not board:
+            return None
+        self.mark_dirty(board_id, "objects", object_id)
+        obj = board["objects"].get(object_id)
+        if obj:
+            obj["properties"].update(properties)
+            board["index"].insert(("object", object_id), object_bounds(obj))
+        return obj
+
+    def delete_object(self, board_id: str, object_id: str) -> dict | None:
+        """Remove an object from a board."""
+        board = self.boards.get(board_id)
+        if not board:
+            return None
+        self.mark_dirty(board_id, "objects", object_id)
+        board["index"].remove(("object", object_id))
+        return board["objects"].remove(object_id)
+
+    def clear_board(self, board_id: str):
+        """Remove all strokes and objects from a board."""
+        board = self.boards.get(board_id)
+        if board:
+            self.mark_dirty(board_id)
+            self.changes[board_id] = {**_no_changes(), "cleared": True}
+            board["strokes"].clear()
+            board["objects"].clear()
+            board["active_strokes"].clear()
+            board["index"].clear()
+
+    def query_region(self, board_id: str, bbox: BBox) -> dict:
+        """Strokes and objects whose bounds intersect a canvas rectangle.
+
+        Uses the board's spatial index, so the cost depends on the area
+        queried rather than on the size of the board. Elements without
+        known bounds (no points yet, objects without x/y) are not returned.
+        Results are not in draw order.
+        """
+        board = self.boards.get(board_id)
+        if not board:
+            return {"strokes": [], "objects": []}
+        strokes = []
+        objects = []
+        for kind, element_id in board["index"].query(bbox):
+            if kind == "stroke":
+                stroke = board["strokes"].get(element_id)
+                if stroke is not None:
+                    strokes.append(stroke)
+            else:
+                obj = board["objects"].get(element_id)
+                if obj is not None:
+                    objects.append(obj)
+        return {"strokes": strokes, "objects": objects}
+
+    def apply_op(self, board_id: str, op: dict):
+        """Apply a replicated board operation (see RedisBoardSync).
+
+        Replicated changes are persisted by the node that made them, so
+        they do not mark the board dirty here.
+        """
+        was_dirty = board_id in self.dirty
+        self._apply_op(board_id, op)
+        if not was_dirty:
+            self.dirty.pop(board_id, None)
+            self.changes.pop(board_id, None)
+
+    def _apply_op(self, board_id: str, op: dict):
+        op_type = op["type"]
+        if op_type == "stroke_start":
+            self.start_stroke(board_id, Stroke.from_dict(op["stroke"]))
+        elif op_type == "stroke_points":
+            if "points_bin" in op:
+                self.append_stroke_points_bin(
+                    board_id, op["stroke_id"], base64.b64decode(op["points_bin"]), op["t0"]
+                )
+            else:
+                self.append_stroke_points(board_id, op["stroke_id"], op["points"])
+        elif op_type == "stroke_end":
+            self.end_stroke(board_id, op["stroke_id"])
+            # Simplified points replace the streamed ones
+            if "points_bin" in op:
+                self.replace_stroke_points(
+                    board_id, op["stroke_id"], points_bin=base64.b64decode(op["points_bin"])
+                )
+            elif "points" in op:
+                self.replace_stroke_points(board_id, op["stroke_id"], points=op["points"])
+        elif op_type == "object_add":
+            self.add_object(board_id, op["object"])
+        elif op_type == "object_update":
+            self.update_object(board_id, op["object_id"], op["properties"])
+        elif op_type == "object_delete":
+            self.delete_object(board_id, op["object_id"])
+        elif op_type == "clear":
+            self.clear_board(board_id)
+        elif op_type == "load":
+            strokes = [
+                {**s, "points_bin": base64.b64decode(s["points_bin"])} if s.get("points_bin") else s
+                for s in op["strokes"]
+            ]
+            self.load_board(board_id, strokes, op["objects"], op.get("layers"))
+        elif op_type == "user_join":
+            self.remote_users.setdefault(board_id, {})[op["sid"]] = op["user"]
+        elif op_type == "user_leave":
+            self.remote_users.get(board_id, {}).pop(op["sid"], None)
+
+
+def _no_changes() -> dict:
+    return {"strokes": set(), "objects": set(), "cleared": False}
@@ -0,0 +1,51 @@
+"""Insertion-ordered, id-keyed element storage for board state."""
+
+from typing import Any, Iterator
+
+
+class ElementStore:
+    """Ordered mapping of element id -> element (object dict or ``Stroke``).
+
+    Backed by a plain dict, which preserves insertion order, so lookup,
+    update and delete are O(1) while iteration still yields elements in
+    draw order. Re-adding an existing id moves it to the top of the stack.
+    """
+
+    __slots__ = ("_items",)
+
+    def __init__(self, elements: list[dict] | None = None):
+        self._items: dict[Any, dict] = {}
+        for element in elements or []:
+            self.add(element)
+
+    def add(self, element: dict) -> dict:
+        """Add (or replace) an element, placing it last in draw order."""
+        element_id = element.get("id")
+        self._items.pop(element_id, None)
+        self._items[element_id] = element
+        return element
+
+    def get(self, element_id: Any) -> dict | None:
+        """Get an element by id."""
+        return self._items.get(element_id)
+
+    def remove(self, element_id: Any) -> dict | None:
+        """Remove an element and return it, if present."""
+        return self._items.pop(element_id, None)
+
+    def clear(self):
+        """Remove all elements."""
+        self._items.clear()
+
+    def to_list(self) -> list[dict]:
+        """Return elements as a list in draw order (for serialization)."""
+        return list(self._items.values())
+
+    def __contains__(self, element_id: Any) -> bool:
+        return element_id in self._items
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self._items.values())
+
+    def __len__(self) -> int:
+        return len(self._items)
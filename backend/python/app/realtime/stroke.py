@@ -0,0 +1,249 @@
+"""Compact in-memory stroke records."""
+
+from array import array
+from typing import Any
+
+from app.realtime.codec import (
+    POINT_FORMAT_BINARY,
+    POINT_RECORD,
+    POINT_SIZE,
+    decode_points,
+    encode_points,
+    points_bin_end,
+)
+from app.realtime.geometry import BBox, points_bin_bounds
+
+# Metadata every stroke has; anything else a client sends is kept in ``extra``
+_META_FIELDS = ("id", "user_id", "tool", "color", "size", "layer_id")
+
+# Keys of a serialized stroke that are not metadata
+_POINT_KEYS = ("points", "points_bin", "t0", "completed")
+
+# Decimals kept for pressure and tilt when writing JSON points (float32 noise)
+_FLOAT32_DECIMALS = 4
+
+
+class Stroke:
+    """A stroke held in board state.
+
+    Metadata lives in slots and points in parallel typed arrays: float64
+    ``x``/``y``, float32 ``pressure``/``tilt`` and int64 ``timestamp``
+    (32 bytes per point instead of a dict per point). Strokes drawn by
+    binary clients (``t0`` set) keep their packed records in ``points_bin``
+    as received instead, see app.realtime.codec. Appending points is
+    amortised O(1) per point either way.
+
+    Points are turned back into wire payloads only at the edges:
+    ``serialize`` for clients, snapshots and ``Board.canvas_data``.
+    """
+
+    __slots__ = (
+        "id",
+        "user_id",
+        "tool",
+        "color",
+        "size",
+        "layer_id",
+        "completed",
+        "extra",
+        "t0",
+        "points_bin",
+        "x",
+        "y",
+        "pressure",
+        "tilt",
+        "timestamp",
+    )
+
+    def __init__(
+        self,
+        id: Any,
+        user_id: Any = None,
+        tool: str = "pen",
+        color: str = "#000000",
+        size: float = 2,
+        layer_id: str = "default",
+        completed: bool = False,
+        t0: int | None = None,
+        extra: dict | None = None,
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.tool = tool
+        self.color = color
+        self.size = size
+        self.layer_id = layer_id
+        self.completed = completed
+        self.extra = extra or None
+        self.t0 = t0
+        if t0 is not None:
+            self.points_bin = bytearray()
+            self.x = self.y = self.pressure = self.tilt = self.timestamp = None
+        else:
+            self.points_bin = None
+            self.x = array("d")
+            self.y = array("d")
+            self.pressure = array("f")
+            self.tilt = array("f")
+            self.timestamp = array("q")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Stroke":
+        """Build a stroke from its wire/JSON form (metadata plus any points)."""
+        meta = {key: data[key] for key in _META_FIELDS[1:] if key in data}
+        extra = {k: v for k, v in data.items() if k not in _META_FIELDS and k not in _POINT_KEYS}
+        stroke = cls(
+            data.get("id"),
+            completed=bool(data.get("completed")),
+            t0=data.get("t0"),
+            extra=extra,
+            **meta,
+        )
+        if data.get("points_bin"):
+            stroke.append_bin(bytes(data["points_bin"]), data.get("t0") or 0)
+        if data.get("points"):
+            stroke.append_points(data["points"])
+        return stroke
+
+    @property
+    def is_binary(self) -> bool:
+        return self.points_bin is not None
+
+    @property
+    def point_count(self) -> int:
+        if self.points_bin is not None:
+            return len(self.points_bin) // POINT_SIZE
+        return len(self.x)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the stroke's point buffers."""
+        if self.points_bin is not None:
+            return len(self.points_bin)
+        return sum(
+            len(column) * column.itemsize
+            for column in (self.x, self.y, self.pressure, self.tilt, self.timestamp)
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Metadata lookup with dict semantics, as for objects."""
+        if key in _META_FIELDS or key == "completed":
+            return getattr(self, key)
+        return (self.extra or {}).get(key, default)
+
+    # Points
+
+    def append_points(self, points: list[dict]):
+        """Append JSON points."""
+        if self.points_bin is not None:
+            # Record dts continue from the stroke's last point
+            self.points_bin += encode_points(points, points_bin_end(self.points_bin, self.t0))
+            return
+        # Convert everything first so a bad point leaves the stroke untouched
+        xs = [float(p["x"]) for p in points]
+        ys = [float(p["y"]) for p in points]
+        pressures = [float(p.get("pressure", 0.5)) for p in points]
+        tilts = [float(p.get("tilt", 0.0)) for p in points]
+        timestamps = [int(p.get("timestamp") or 0) for p in points]
+        self.x.extend(xs)
+        self.y.extend(ys)
+        self.pressure.extend(pressures)
+        self.tilt.extend(tilts)
+        self.timestamp.extend(timestamps)
+
+    def append_bin(self, points_bin: bytes, t0: int):
+        """Append packed binary points (see app.realtime.codec)."""
+        if self.points_bin is not None:
+            self.points_bin += points_bin
+        else:
+            self.append_points(decode_points(points_bin, t0))
+
+    def replace_points(self, points: list | None = None, points_bin: bytes | None = None):
+        """Replace all points (e.g. with a simplified set)."""
+        if points_bin is not None:
+            if self.points_bin is not None:
+                self.points_bin = bytearray(points_bin)
+            else:
+                # The first record's dt is relative to the stroke's t0
+                t0 = 0
+                if self.timestamp and len(points_bin) >= POINT_SIZE:
+                    t0 = self.timestamp[0] - POINT_RECORD.unpack_from(points_bin)[4]
+                self._clear_columns()
+                self.append_bin(points_bin, t0)
+        if points is not None:
+            if self.points_bin is not None:
+                self.points_bin = bytearray()
+            else:
+                self._clear_columns()
+            self.append_points(points)
+
+    def _clear_columns(self):
+        self.x = array("d")
+        self.y = array("d")
+        self.pressure = array("f")
+        self.tilt = array("f")
+        self.timestamp = array("q")
+
+    def bounds(self) -> BBox | None:
+        """Bounds of the points, without the brush size."""
+        if self.points_bin is not None:
+            return points_bin_bounds(self.points_bin)
+        if not self.x:
+            return None
+        return (min(self.x), min(self.y), max(self.x), max(self.y))
+
+    def points(self) -> list[dict]:
+        """Points as JSON point dicts."""
+        if self.points_bin is not None:
+            return decode_points(self.points_bin, self.t0)
+        return [
+            {
+                "x": x,
+                "y": y,
+                "pressure": round(pressure, _FLOAT32_DECIMALS),
+                "tilt": round(tilt, _FLOAT32_DECIMALS),
+                "timestamp": timestamp,
+            }
+            for x, y, pressure, tilt, timestamp in zip(
+                self.x, self.y, self.pressure, self.tilt, self.timestamp
+            )
+        ]
+
+    def point_fields(self, point_format: str) -> dict:
+        """Point payload for a format: ``points`` or ``points_bin``/``t0``."""
+        if point_format != POINT_FORMAT_BINARY:
+            return {"points": self.points()}
+        if self.points_bin is not None:
+            return {"points_bin": bytes(self.points_bin), "t0": self.t0}
+        points = self.points()
+        t0 = points[0]["timestamp"] if points else 0
+        return {"points_bin": encode_points(points, t0), "t0": t0}
+
+    # Serialization
+
+    def metadata(self) -> dict:
+        """Stroke without its points (binary strokes keep ``t0``)."""
+        meta = {key: getattr(self, key) for key in _META_FIELDS}
+        if self.extra:
+            meta.update(self.extra)
+        if self.t0 is not None:
+            meta["t0"] = self.t0
+        return meta
+
+    def serialize(self, point_format: str) -> dict:
+        """Wire/JSON form of the stroke for a point format."""
+        data = self.metadata()
+        data.pop("t0", None)
+        data["completed"] = self.completed
+        data.update(self.point_fields(point_format))
+        return data
+
+    def copy(self) -> "Stroke":
+        """Copy with its own point buffers, for serializing a consistent snapshot."""
+        copy = Stroke.__new__(Stroke)
+        for name in Stroke.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, (array, bytearray)):
+                value = value[:]
+            setattr(copy, name, value)
+        return copy
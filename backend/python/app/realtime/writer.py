@@ -0,0 +1,133 @@
+"""Write-behind persistence of live board state."""
+
+import asyncio
+import logging
+import time
+
+from app.realtime.persistence import BoardPersistence
+from app.realtime.state import BoardState
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindPersister:
+    """Periodically writes boards with unsaved changes to the database.
+
+    ``BoardState`` marks a board dirty on every local mutation. A board is
+    flushed once it has had no changes for ``debounce`` seconds, or at the
+    latest ``max_delay`` seconds after its first unsaved change, so boards
+    under constant editing are still saved. Up to ``batch_size`` boards are
+    written per transaction. ``stop`` flushes everything that is left.
+
+    Metrics: ``queue_depth`` (dirty boards), ``flush_lag`` (age in seconds
+    of the oldest unsaved change), plus flush counters and the duration of
+    the last flush.
+    """
+
+    def __init__(
+        self,
+        state: BoardState,
+        persistence: BoardPersistence,
+        debounce: float = 2.0,
+        max_delay: float = 10.0,
+        batch_size: int = 20,
+    ):
+        self.state = state
+        self.persistence = persistence
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+        # Counters
+        self.boards_flushed = 0
+        self.flush_failures = 0
+        self.last_flush_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.state.dirty)
+
+    @property
+    def flush_lag(self) -> float:
+        if not self.state.dirty:
+            return 0.0
+        return time.monotonic() - min(first for first, _ in self.state.dirty.values())
+
+    def start(self):
+        """Start the background flush loop."""
+        if self._task is None and self.debounce > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the loop and flush all remaining changes."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush(list(self.state.dirty))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(min(self.debounce, self.max_delay) / 2)
+            try:
+                await self.flush(self.due())
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")
+
+    def due(self) -> list[str]:
+        """Dirty boards whose debounce or maximum delay has passed."""
+        now = time.monotonic()
+        return [
+            board_id
+            for board_id, (first, last) in self.state.dirty.items()
+            if now - last >= self.debounce or now - first >= self.max_delay
+        ]
+
+    async def flush(self, board_ids: list[str]):
+        """Write the given boards, ``batch_size`` boards per transaction."""
+        async with self._lock:
+            for i in range(0, len(board_ids), self.batch_size):
+                await self._flush_batch(board_ids[i : i + self.batch_size])
+
+    def _restore(self, board_id: str, times: list, changes: dict | None):
+        if board_id not in self.state.boards:
+            return
+        current = self.state.dirty.get(board_id)
+        self.state.dirty[board_id] = [times[0], current[1] if current else times[1]]
+        if changes is not None:
+            self.state.restore_changes(board_id, changes)
+
+    async def _flush_batch(self, board_ids: list[str]):
+        started = time.monotonic()
+        canvases = {}
+        pending = {}
+        for board_id in board_ids:
+            board = self.state.boards.get(board_id)
+            times = self.state.dirty.pop(board_id, None)
+            if board is None or times is None:
+                continue
+            # Changes made while the snapshot is taken mark the board dirty again
+            changes = self.state.changes.pop(board_id, None)
+            pending[board_id] = (times, changes)
+            canvases[board_id] = await self.persistence.snapshot(board_id, board, changes)
+        if not canvases:
+            return
+
+        try:
+            saved = await self.persistence.save(canvases)
+        except Exception as e:
+            self.flush_failures += 1
+            logger.error(f"Failed to persist {len(canvases)} boards: {e}")
+            for board_id, (times, changes) in pending.items():
+                self._restore(board_id, times, changes)
+            return
+        for board_id in pending:
+            if board_id not in saved and self.persistence.is_stored(board_id):
+                # The row changed storage mode (the whole board is written
+                # next time) or was written through the API since the snapshot
+                self._restore(board_id, *pending[board_id])
+
+        self.boards_flushed += len(canvases)
+        self.last_flush_seconds = time.monotonic() - started
@@ -3,76 +3,404 @@
 import socketio
 import logging
 from typing import Any
-from datetime import datetime
+import base64
 import json
+import math
+
+from app.config import get_settings
+from app.realtime.stroke import Stroke
+from app.realtime.codec import (
+    POINT_FORMAT_BINARY,
+    POINT_FORMAT_JSON,
+    POINT_FORMATS,
+    POINT_SIZE,
+    convert_points,
+    points_room,
+    valid_coordinate,
+    valid_points,
+    valid_t0,
+)
+from app.realtime.backpressure import ClientBackpressure
+from app.realtime.broadcast import StrokeBroadcaster
+from app.realtime.presence import CursorPresence
+from app.realtime.ratelimit import EventRateLimiter, merge_stroke_updates
+from app.realtime.snapshot import BoardStateStreamer
+from app.realtime.geometry import fields_bounds, object_bounds, parse_bbox, union
+from app.realtime.interest import ViewportInterest
+from app.realtime.oplog import FULL_STATE, OpLog, RedisOpLog
+from app.realtime.services import (
+    board_persister,
+    board_residency,
+    board_sync,
+    state,
+    stroke_simplifier,
+)
+from app.metrics import instrument_socketio, registry
+from app.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
-# Create Socket.io server with async mode
+settings = get_settings()
+
+# Create Socket.io server with async mode. With Redis enabled, rooms and
+# emits are shared between all backend nodes through Redis pub/sub.
 sio = socketio.AsyncServer(
     async_mode="asgi",
     cors_allowed_origins="*",
-    logger=True,
-    engineio_logger=True,
+    # Per-packet logging is too costly under load; sample with app.tracing instead
+    logger=False,
+    engineio_logger=False,
+    client_manager=(
+        socketio.AsyncRedisManager(
+            settings.redis_url,
+            channel=f"{settings.redis_key_prefix}:socketio",
+        )
+        if settings.redis_enabled
+        else None
+    ),
 )
 
 
-# In-memory storage for Phase 1 (will move to Redis in Phase 2)
-class BoardState:
-    """Manages board state and connected users."""
+# Client viewports for interest-managed fan-out
+viewport_interest = ViewportInterest(margin=settings.viewport_margin)
 
-    def __init__(self):
-        self.boards: dict[str, dict] = {}  # board_id -> {strokes, objects, layers}
-        self.users: dict[str, dict] = {}  # sid -> {user_id, display_name, board_id}
-        self.board_users: dict[str, set] = {}  # board_id -> set of sids
+# Per-client outbound limits (started in the app lifespan); the resync
+# callback is set once resync_client is defined below
+client_backpressure = ClientBackpressure(
+    sio,
+    state,
+    max_packets=settings.client_queue_max_packets,
+    max_bytes=settings.client_queue_max_kb * 1024,
+    resync_after=settings.client_resync_after_seconds,
+    interval_ms=settings.client_queue_check_interval_ms,
+)
 
-    def get_or_create_board(self, board_id: str) -> dict:
-        """Get or create a board state."""
-        if board_id not in self.boards:
-            self.boards[board_id] = {
-                "strokes": [],
-                "objects": [],
-                "layers": [{"id": "default", "name": "Layer 1", "visible": True, "locked": False}],
-            }
-            self.board_users[board_id] = set()
-        return self.boards[board_id]
+# Per-room coalescing of stroke point broadcasts
+stroke_broadcaster = StrokeBroadcaster(
+    sio,
+    state,
+    interval_ms=settings.stroke_batch_interval_ms,
+    min_room_size=settings.stroke_batch_min_users,
+    interest=viewport_interest,
+    backpressure=client_backpressure,
+)
+
+# Latest-wins cursor positions, flushed as batched frames
+cursor_presence = CursorPresence(
+    sio,
+    interval_ms=settings.cursor_flush_interval_ms,
+    idle_timeout=settings.cursor_idle_timeout_seconds,
+    interest=viewport_interest,
+    backpressure=client_backpressure,
+)
+
+# Chunked, viewport-first board_state delivery
+board_state_streamer = BoardStateStreamer(
+    sio,
+    max_points=settings.snapshot_chunk_max_points,
+    max_elements=settings.snapshot_chunk_max_elements,
+    max_concurrent=settings.snapshot_max_concurrent_streams,
+)
+
+
+# Sequenced op log for delta resync on reconnect. With Redis, clients get
+# events from every node, so the seqs and the log are shared through Redis.
+oplog: OpLog | RedisOpLog = (
+    RedisOpLog(
+        board_sync.redis,
+        settings.oplog_size,
+        prefix=settings.redis_key_prefix,
+        ttl=settings.redis_board_ttl_seconds,
+    )
+    if board_sync is not None
+    else OpLog(settings.oplog_size)
+)
+
+
+# Token-bucket limits on inbound events (installed around the handlers below)
+rate_limiter = EventRateLimiter(
+    settings.rate_limits,
+    settings.board_rate_limits,
+    coalesce={"stroke_update": merge_stroke_updates},
+    warn_interval=settings.rate_limit_warn_interval_seconds,
+)
+
+
+def forget_board(board_id: str):
+    """Drop per-board realtime state when a board is evicted."""
+    rate_limiter.forget_board(board_id)
+    oplog.discard(board_id)
+    stroke_broadcaster.discard(board_id)
+    stroke_simplifier.discard(board_id)
+    if board_sync is not None:
+        board_sync.discard(board_id)
 
-    def add_user(self, sid: str, user_id: str, display_name: str, board_id: str):
-        """Add a user to a board."""
-        self.users[sid] = {
-            "user_id": user_id,
-            "display_name": display_name,
-            "board_id": board_id,
-            "joined_at": datetime.utcnow().isoformat(),
-        }
-        if board_id in self.board_users:
-            self.board_users[board_id].add(sid)
-
-    def remove_user(self, sid: str) -> str | None:
-        """Remove a user and return their board_id."""
-        if sid in self.users:
-            board_id = self.users[sid]["board_id"]
-            del self.users[sid]
-            if board_id in self.board_users:
-                self.board_users[board_id].discard(sid)
-            return board_id
-        return None
-
-    def get_board_user_count(self, board_id: str) -> int:
-        """Get number of users in a board."""
-        return len(self.board_users.get(board_id, set()))
-
-    def get_board_users(self, board_id: str) -> list[dict]:
-        """Get list of users in a board."""
-        return [
-            self.users[sid]
-            for sid in self.board_users.get(board_id, set())
-            if sid in self.users
-        ]
-
-
-# Global state instance
-state = BoardState()
+
+board_residency.on_evict = forget_board
+
+
+def replicate(board_id: str, op: dict):
+    """Share a board operation with other backend nodes, if enabled."""
+    if board_sync is not None:
+        board_sync.publish(board_id, op)
+
+
+async def sequence(board_id: str, event: str, data: dict, sid: str | None = None) -> dict:
+    """Record a broadcast event in the op log and stamp it with its seq."""
+    if not oplog.enabled:
+        return data
+    data["seq"] = await oplog.append(board_id, event, data, sid)
+    # Buffered stroke points carry earlier seqs and must go out first (seqs
+    # are handed out in append order, so earlier updates are buffered by now)
+    await stroke_broadcaster.flush(board_id)
+    return data
+
+
+async def sync_stale_elements(sid: str, board_id: str, point_format: str, region=None):
+    """Send a client the current state of skipped elements now in its region."""
+    board = state.boards.get(board_id)
+    if not board:
+        return
+    # Pending points must not arrive on top of the synced strokes
+    await stroke_broadcaster.flush(board_id)
+    strokes = []
+    objects = []
+    for kind, element_id in viewport_interest.take_stale(sid, board["index"], region):
+        if kind == "stroke":
+            stroke = board["strokes"].get(element_id)
+            if stroke is not None:
+                strokes.append(stroke.serialize(point_format))
+        else:
+            obj = board["objects"].get(element_id)
+            if obj is not None:
+                objects.append(obj)
+    if strokes or objects:
+        await sio.emit(
+            "viewport_sync",
+            {"board_id": board_id, "strokes": strokes, "objects": objects},
+            to=sid,
+        )
+
+
+def board_state_payload(
+    board_id: str, board: dict, point_format: str, epoch: str | None, seq: int
+) -> dict:
+    """Full ``board_state`` event for one client, at op log head ``epoch``/``seq``."""
+    return {
+        "board_id": board_id,
+        "epoch": epoch,
+        "seq": seq,
+        "point_format": point_format,
+        "strokes": [s.serialize(point_format) for s in board["strokes"]],
+        "objects": board["objects"].to_list(),
+        "layers": board["layers"],
+        "users": state.get_board_users(board_id),
+    }
+
+
+async def resync_client(sid: str):
+    """Send a full board_state to a client that fell too far behind."""
+    user = state.users.get(sid)
+    board = state.boards.get(user["board_id"]) if user else None
+    if board is None:
+        return
+    board_id = user["board_id"]
+    epoch, seq = await oplog.head(board_id)
+    # Buffered points are already part of the snapshot and must not follow it
+    await stroke_broadcaster.flush(board_id)
+    # Elements skipped by the viewport filter are in the snapshot too
+    viewport_interest.take_stale(sid, board["index"])
+    payload = board_state_payload(board_id, board, user["point_format"], epoch, seq)
+    await sio.emit("board_state", payload, to=sid)
+
+
+client_backpressure.on_resync = resync_client
+
+
+async def broadcast_board_state(board_id: str):
+    """Send a full board_state to this node's clients of a board whose content was replaced.
+
+    Other nodes send their own clients theirs (from their replica).
+    """
+    board = state.boards.get(board_id)
+    if board is None:
+        return
+    epoch, seq = await oplog.head(board_id)
+    await stroke_broadcaster.flush(board_id)
+    for sid in state.board_users.get(board_id, ()):
+        viewport_interest.take_stale(sid, board["index"])
+    for point_format in state.get_point_formats(board_id):
+        await sio.emit(
+            "board_state",
+            board_state_payload(board_id, board, point_format, epoch, seq),
+            room=points_room(board_id, point_format),
+            ignore_queue=True,
+        )
+
+
+async def replace_board_state(board_id: str):
+    """Send clients a board whose content was replaced through the API."""
+    if oplog.enabled:
+        # Clients that reconnect from before this point cannot replay ops onto it
+        await oplog.append(board_id, FULL_STATE, {})
+    await broadcast_board_state(board_id)
+
+
+def live_patch_op(board: dict, op: dict) -> bool:
+    """Whether a canvas patch op can be applied to a resident board as live events.
+
+    Stroke additions and object additions, property updates and removals
+    can; stroke updates and removals, layer changes and object updates of
+    other keys, or that drop properties (events merge them), cannot.
+    """
+    data = op.get("data") or {}
+    if op["kind"] == "objects":
+        obj = board["objects"].get(op["id"])
+        if op["op"] == "remove":
+            return True
+        if not isinstance(data.get("properties"), dict):
+            return False
+        if op["op"] == "add":
+            return obj is None
+        return obj is not None and set(data) == {"properties"} and (
+            obj["properties"].keys() <= data["properties"].keys()
+        )
+    if op["kind"] == "strokes" and op["op"] == "add":
+        points = data.get("points") or []
+        size = data.get("size", 2)
+        return (
+            board["strokes"].get(op["id"]) is None
+            and "points_bin" not in data
+            and valid_points(points) == points
+            and isinstance(size, (int, float))
+            and not isinstance(size, bool)
+        )
+    return False
+
+
+async def apply_canvas_patch(board_id: str, ops: list[dict], user_id: Any = None) -> bool:
+    """Apply canvas patch ops written through the API to a resident board.
+
+    Clients get the usual element events (seqs included), so the cost
+    follows the patch rather than the board. Returns False without changing
+    anything if the board is not resident or an op has no live equivalent
+    (see ``live_patch_op``), or names an element another op names too.
+    """
+    board = state.boards.get(board_id)
+    if board is None:
+        return False
+    elements = [(op["kind"], op["id"]) for op in ops]
+    if len(set(elements)) < len(elements) or not all(live_patch_op(board, op) for op in ops):
+        return False
+
+    # The database already has these changes: apply them all before
+    # anything awaits, without making the board dirty
+    was_dirty = board_id in state.dirty
+    events = []
+    for op in ops:
+        element_id = op["id"]
+        data = op.get("data") or {}
+        if op["kind"] == "strokes":
+            stroke = Stroke.from_dict({**data, "id": element_id})
+            points = stroke.points()
+            state.start_stroke(board_id, stroke)
+            state.end_stroke(board_id, element_id)
+            replicate(board_id, {"type": "stroke_start", "stroke": stroke.metadata()})
+            replicate(
+                board_id, {"type": "stroke_points", "stroke_id": element_id, "points": points}
+            )
+            replicate(board_id, {"type": "stroke_end", "stroke_id": element_id})
+            events.append(("stroke", stroke, points))
+        elif op["op"] == "add":
+            obj = state.add_object(board_id, {**data, "id": element_id})
+            replicate(board_id, {"type": "object_add", "object": obj})
+            events.append(("object_added", obj, object_bounds(obj)))
+        elif op["op"] == "update":
+            box = board["index"].box(("object", element_id))
+            obj = state.update_object(board_id, element_id, data["properties"])
+            update = {"object_id": element_id, "properties": data["properties"]}
+            replicate(board_id, {"type": "object_update", **update})
+            events.append(("object_updated", obj, union(box, object_bounds(obj))))
+        else:
+            if state.delete_object(board_id, element_id):
+                replicate(board_id, {"type": "object_delete", "object_id": element_id})
+            events.append(("object_deleted", {"id": element_id}, None))
+    if not was_dirty:
+        state.dirty.pop(board_id, None)
+        state.changes.pop(board_id, None)
+
+    for event, element, detail in events:
+        if event == "stroke":
+            await send_patched_stroke(board_id, element, detail)
+            continue
+        key = ("object", element["id"])
+        if event == "object_added":
+            data = {
+                "object_id": element["id"],
+                "type": element.get("type"),
+                "properties": element["properties"],
+                "layer_id": element.get("layer_id", "default"),
+                "user_id": user_id,
+            }
+        elif event == "object_updated":
+            data = {
+                "object_id": element["id"],
+                "properties": element["properties"],
+                "user_id": user_id,
+            }
+        else:
+            data = {"object_id": element["id"], "user_id": user_id}
+        skip = viewport_interest.skip(board_id, detail, key) if detail is not None else None
+        await sio.emit(event, await sequence(board_id, event, data), room=board_id, skip_sid=skip)
+    return True
+
+
+async def send_patched_stroke(board_id: str, stroke: Stroke, points: list[dict]):
+    """Send a stroke added through the API as stroke_start/stroke_update/stroke_end."""
+    start = {
+        "stroke_id": stroke.id,
+        "user_id": stroke.user_id,
+        "tool": stroke.tool,
+        "color": stroke.color,
+        "size": stroke.size,
+        "layer_id": stroke.layer_id,
+    }
+    await sio.emit("stroke_start", await sequence(board_id, "stroke_start", start), room=board_id)
+    if points:
+        fields = {"points": points}
+        seq = await oplog.append(board_id, "stroke_update", {"stroke_id": stroke.id, **fields})
+        box = fields_bounds(fields, stroke.size)
+        await stroke_broadcaster.stroke_update(board_id, None, stroke.id, fields, seq, box)
+    await stroke_broadcaster.flush(board_id)
+    data = await sequence(board_id, "stroke_end", {"stroke_id": stroke.id})
+    await sio.emit("stroke_end", data, room=board_id)
+
+
+async def announce_pruned_users(board_id: str, sids: list[str]):
+    """Tell a board's clients about users removed with a stopped node."""
+    for sid in sids:
+        await sio.emit("user_left", {"sid": sid}, room=board_id)
+    await sio.emit("user_count", {"count": state.get_board_user_count(board_id)}, room=board_id)
+
+
+board_residency.on_replace = replace_board_state
+board_residency.on_patch = apply_canvas_patch
+if board_sync is not None:
+    board_sync.on_resync = broadcast_board_state
+    board_sync.on_users_pruned = announce_pruned_users
+
+
+def resync_ops(ops: list[tuple], point_format: str, previous_sid: str | None) -> list[dict]:
+    """Op log entries to replay to a reconnecting client."""
+    replay = []
+    for seq, event, data, origin in ops:
+        # The client already applied its own ops before the connection dropped
+        if previous_sid is not None and origin == previous_sid:
+            continue
+        if event == "stroke_update":
+            data = {"stroke_id": data["stroke_id"], **convert_points(data, point_format)}
+        replay.append({"seq": seq, "event": event, "data": data})
+    return replay
 
 
 @sio.event
@@ -86,9 +414,16 @@ async def connect(sid: str, environ: dict, auth: dict | None = None):
 async def disconnect(sid: str):
     """Handle client disconnection."""
     logger.info(f"Client disconnected: {sid}")
+    rate_limiter.forget(sid)
+    user = state.users.get(sid)
     board_id = state.remove_user(sid)
     if board_id:
+        cursor_presence.remove(board_id, sid)
+        viewport_interest.disconnect(board_id, sid)
+        client_backpressure.remove(sid)
+        replicate(board_id, {"type": "user_leave", "sid": sid})
         await sio.leave_room(sid, board_id)
+        await sio.leave_room(sid, points_room(board_id, user["point_format"]))
         await sio.emit(
             "user_left",
             {"sid": sid},
@@ -108,30 +443,71 @@ async def join_board(sid: str, data: dict):
     board_id = data.get("board_id", "default")
     user_id = data.get("user_id", sid)
     display_name = data.get("display_name", f"User-{sid[:6]}")
+    # Stroke point encoding negotiated by the client (see app.realtime.codec)
+    point_format = data.get("point_format", POINT_FORMAT_JSON)
+    if point_format not in POINT_FORMATS:
+        point_format = POINT_FORMAT_JSON
 
     logger.info(f"User {display_name} joining board {board_id}")
 
-    # Join the Socket.io room for this board
-    await sio.enter_room(sid, board_id)
-
-    # Add user to state
-    state.add_user(sid, user_id, display_name, board_id)
+    # Get the board, loading it from other nodes or the database if needed.
+    # The user is added right away so that the board is not evicted again.
+    board = await board_residency.get_board(board_id)
+    state.add_user(sid, user_id, display_name, board_id, point_format)
+    replicate(board_id, {"type": "user_join", "sid": sid, "user": state.users[sid]})
 
-    # Get or create board state
-    board = state.get_or_create_board(board_id)
+    # Points still buffered for the room are already in the board; flushed
+    # after the join they would reach this client twice (in the snapshot
+    # and as a live update). Nothing below awaits until the snapshot is built.
+    await stroke_broadcaster.flush(board_id)
 
-    # Send current board state to the new user
-    await sio.emit(
-        "board_state",
-        {
-            "board_id": board_id,
-            "strokes": board["strokes"],
-            "objects": board["objects"],
-            "layers": board["layers"],
-            "users": state.get_board_users(board_id),
-        },
-        to=sid,
-    )
+    # Join the Socket.io room for this board
+    await sio.enter_room(sid, board_id)
+    await sio.enter_room(sid, points_room(board_id, point_format))
+
+    # A reconnecting client only needs the ops it missed, if we still have them
+    epoch, seq = await oplog.head(board_id)
+    missed = await oplog.since(board_id, data.get("epoch"), data.get("since_seq"))
+    previous_sid = data.get("previous_sid")
+    if missed is not None and previous_sid is not None:
+        # Ops skipped by the old connection's viewport filter are not in
+        # the missed range; without that record only a full state is safe.
+        known = viewport_interest.take_orphaned(previous_sid, sid)
+        if not known and data.get("viewport_filtered"):
+            missed = None
+    if missed is not None:
+        await sio.emit(
+            "board_resync",
+            {
+                "board_id": board_id,
+                "epoch": epoch,
+                "seq": seq,
+                "point_format": point_format,
+                "ops": resync_ops(missed, point_format, previous_sid),
+                "layers": board["layers"],
+                "users": state.get_board_users(board_id),
+            },
+            to=sid,
+        )
+        await sync_stale_elements(sid, board_id, point_format)
+    # Otherwise send the current board state
+    elif data.get("chunked"):
+        await board_state_streamer.start(
+            sid,
+            board_id,
+            board,
+            state.get_board_users(board_id),
+            point_format,
+            viewport=parse_bbox(data.get("viewport")),
+            epoch=epoch,
+            seq=seq,
+        )
+    else:
+        await sio.emit(
+            "board_state",
+            board_state_payload(board_id, board, point_format, epoch, seq),
+            to=sid,
+        )
 
     # Notify other users
     await sio.emit(
@@ -156,9 +532,15 @@ async def join_board(sid: str, data: dict):
 @sio.event
 async def leave_board(sid: str, data: dict):
     """Handle user leaving a board."""
+    user = state.users.get(sid)
     board_id = state.remove_user(sid)
     if board_id:
+        cursor_presence.remove(board_id, sid)
+        viewport_interest.disconnect(board_id, sid)
+        client_backpressure.remove(sid)
+        replicate(board_id, {"type": "user_leave", "sid": sid})
         await sio.leave_room(sid, board_id)
+        await sio.leave_room(sid, points_room(board_id, user["point_format"]))
         await sio.emit(
             "user_left",
             {"sid": sid},
@@ -181,35 +563,41 @@ async def stroke_start(sid: str, data: dict):
 
     board_id = user["board_id"]
     stroke_id = data.get("stroke_id")
-
-    logger.debug(f"Stroke start: {stroke_id} from {sid}")
+    size = data.get("size", 2)
+    if not isinstance(size, (int, float)) or isinstance(size, bool) or not 0 <= size < 1e6:
+        size = 2
+    t0 = data.get("t0", 0)
 
     # Initialize stroke in board state
-    board = state.boards.get(board_id)
-    if board:
-        stroke = {
-            "id": stroke_id,
-            "user_id": user["user_id"],
-            "tool": data.get("tool", "pen"),
-            "color": data.get("color", "#000000"),
-            "size": data.get("size", 2),
-            "layer_id": data.get("layer_id", "default"),
-            "points": [],
-            "completed": False,
-        }
-        board["strokes"].append(stroke)
+    stroke = Stroke(
+        stroke_id,
+        user_id=user["user_id"],
+        tool=data.get("tool", "pen"),
+        color=data.get("color", "#000000"),
+        size=size,
+        layer_id=data.get("layer_id", "default"),
+        # Binary strokes keep their packed points as received
+        t0=(t0 if valid_t0(t0) else 0) if user["point_format"] == POINT_FORMAT_BINARY else None,
+    )
+    if state.start_stroke(board_id, stroke) and stroke_id is not None:
+        replicate(board_id, {"type": "stroke_start", "stroke": stroke.metadata()})
 
     # Broadcast to other users
     await sio.emit(
         "stroke_start",
-        {
-            "stroke_id": stroke_id,
-            "user_id": user["user_id"],
-            "tool": data.get("tool", "pen"),
-            "color": data.get("color", "#000000"),
-            "size": data.get("size", 2),
-            "layer_id": data.get("layer_id", "default"),
-        },
+        await sequence(
+            board_id,
+            "stroke_start",
+            {
+                "stroke_id": stroke_id,
+                "user_id": user["user_id"],
+                "tool": data.get("tool", "pen"),
+                "color": data.get("color", "#000000"),
+                "size": size,
+                "layer_id": data.get("layer_id", "default"),
+            },
+            sid,
+        ),
         room=board_id,
         skip_sid=sid,
     )
@@ -224,26 +612,42 @@ async def stroke_update(sid: str, data: dict):
 
     board_id = user["board_id"]
     stroke_id = data.get("stroke_id")
-    points = data.get("points", [])
-
-    # Update stroke in board state
-    board = state.boards.get(board_id)
-    if board:
-        for stroke in board["strokes"]:
-            if stroke["id"] == stroke_id and not stroke["completed"]:
-                stroke["points"].extend(points)
-                break
-
-    # Broadcast to other users
-    await sio.emit(
-        "stroke_update",
-        {
-            "stroke_id": stroke_id,
-            "points": points,
-        },
-        room=board_id,
-        skip_sid=sid,
-    )
+    points_bin = data.get("points_bin")
+
+    # Update stroke in board state (only in-progress strokes are considered).
+    # Malformed payloads are dropped before they reach the board.
+    if points_bin is not None:
+        if not isinstance(points_bin, (bytes, bytearray)) or len(points_bin) % POINT_SIZE:
+            return
+        t0 = data.get("t0", 0)
+        if not valid_t0(t0):
+            return
+        fields = {"points_bin": points_bin, "t0": t0}
+        stroke = state.append_stroke_points_bin(board_id, stroke_id, points_bin, t0)
+        if stroke:
+            replicate(
+                board_id,
+                {
+                    "type": "stroke_points",
+                    "stroke_id": stroke_id,
+                    "points_bin": base64.b64encode(points_bin).decode(),
+                    "t0": t0,
+                },
+            )
+    else:
+        points = valid_points(data.get("points", []))
+        if not points:
+            return
+        fields = {"points": points}
+        stroke = state.append_stroke_points(board_id, stroke_id, points)
+        if stroke:
+            replicate(board_id, {"type": "stroke_points", "stroke_id": stroke_id, "points": points})
+
+    # Broadcast to other users (batched per tick in busy rooms, only to
+    # users whose viewport the points fall in)
+    box = fields_bounds(fields, stroke.size if stroke else 0)
+    seq = await oplog.append(board_id, "stroke_update", {"stroke_id": stroke_id, **fields}, sid)
+    await stroke_broadcaster.stroke_update(board_id, sid, stroke_id, fields, seq, box)
 
 
 @sio.event
@@ -256,20 +660,22 @@ async def stroke_end(sid: str, data: dict):
     board_id = user["board_id"]
     stroke_id = data.get("stroke_id")
 
-    logger.debug(f"Stroke end: {stroke_id} from {sid}")
-
-    # Mark stroke as completed
-    board = state.boards.get(board_id)
-    if board:
-        for stroke in board["strokes"]:
-            if stroke["id"] == stroke_id:
-                stroke["completed"] = True
-                break
-
-    # Broadcast to other users
+    # Mark stroke as completed, keeping only the points that shape it
+    stroke = state.end_stroke(board_id, stroke_id)
+    if stroke:
+        op = {"type": "stroke_end", "stroke_id": stroke_id}
+        if stroke_simplifier.simplify(board_id, stroke):
+            if stroke.is_binary:
+                op["points_bin"] = base64.b64encode(stroke.points_bin).decode()
+            else:
+                op["points"] = stroke.points()
+        replicate(board_id, op)
+
+    # Broadcast to other users, after any points still buffered
+    await stroke_broadcaster.flush(board_id)
     await sio.emit(
         "stroke_end",
-        {"stroke_id": stroke_id},
+        await sequence(board_id, "stroke_end", {"stroke_id": stroke_id}, sid),
         room=board_id,
         skip_sid=sid,
     )
@@ -283,19 +689,13 @@ async def cursor_move(sid: str, data: dict):
         return
 
     board_id = user["board_id"]
+    x = data.get("x", 0)
+    y = data.get("y", 0)
+    if not valid_coordinate(x) or not valid_coordinate(y):
+        return
 
-    # Broadcast cursor position to other users
-    await sio.emit(
-        "cursor_update",
-        {
-            "user_id": user["user_id"],
-            "display_name": user["display_name"],
-            "x": data.get("x", 0),
-            "y": data.get("y", 0),
-        },
-        room=board_id,
-        skip_sid=sid,
-    )
+    # Record the latest position; other users get it in the next cursor_batch
+    cursor_presence.update(board_id, sid, user, x, y)
 
 
 @sio.event
@@ -310,15 +710,14 @@ async def clear_board(sid: str, data: dict):
     logger.info(f"Board cleared by {user['display_name']}")
 
     # Clear board state
-    board = state.boards.get(board_id)
-    if board:
-        board["strokes"] = []
-        board["objects"] = []
+    state.clear_board(board_id)
+    stroke_broadcaster.discard(board_id)
+    replicate(board_id, {"type": "clear"})
 
     # Broadcast to all users including sender
     await sio.emit(
         "board_cleared",
-        {"cleared_by": user["user_id"]},
+        await sequence(board_id, "board_cleared", {"cleared_by": user["user_id"]}, sid),
         room=board_id,
     )
 
@@ -331,31 +730,43 @@ async def object_add(sid: str, data: dict):
         return
 
     board_id = user["board_id"]
+    properties = data.get("properties", {})
+    if not isinstance(properties, dict):
+        return
 
     # Add object to board state
-    board = state.boards.get(board_id)
-    if board:
-        obj = {
+    obj = state.add_object(
+        board_id,
+        {
             "id": data.get("object_id"),
             "type": data.get("type"),
-            "properties": data.get("properties", {}),
+            "properties": properties,
             "layer_id": data.get("layer_id", "default"),
             "user_id": user["user_id"],
-        }
-        board["objects"].append(obj)
+        },
+    )
+    if obj and obj["id"] is not None:
+        replicate(board_id, {"type": "object_add", "object": obj})
 
-    # Broadcast to other users
+    # Broadcast to other users whose viewport it is in
+    box = object_bounds(obj) if obj else None
+    skip = [sid] + viewport_interest.skip(board_id, box, ("object", data.get("object_id")))
     await sio.emit(
         "object_added",
-        {
-            "object_id": data.get("object_id"),
-            "type": data.get("type"),
-            "properties": data.get("properties", {}),
-            "layer_id": data.get("layer_id", "default"),
-            "user_id": user["user_id"],
-        },
+        await sequence(
+            board_id,
+            "object_added",
+            {
+                "object_id": data.get("object_id"),
+                "type": data.get("type"),
+                "properties": properties,
+                "layer_id": data.get("layer_id", "default"),
+                "user_id": user["user_id"],
+            },
+            sid,
+        ),
         room=board_id,
-        skip_sid=sid,
+        skip_sid=skip,
     )
 
 
@@ -369,25 +780,36 @@ async def object_update(sid: str, data: dict):
     board_id = user["board_id"]
     object_id = data.get("object_id")
     properties = data.get("properties", {})
+    if not isinstance(properties, dict):
+        return
 
     # Update object in board state
     board = state.boards.get(board_id)
-    if board:
-        for obj in board["objects"]:
-            if obj["id"] == object_id:
-                obj["properties"].update(properties)
-                break
+    box = board["index"].box(("object", object_id)) if board else None
+    obj = state.update_object(board_id, object_id, properties)
+    if obj:
+        replicate(
+            board_id,
+            {"type": "object_update", "object_id": object_id, "properties": properties},
+        )
+        box = union(box, object_bounds(obj))
 
-    # Broadcast to other users
+    # Broadcast to other users whose viewport it was or is in
+    skip = [sid] + viewport_interest.skip(board_id, box, ("object", object_id))
     await sio.emit(
         "object_updated",
-        {
-            "object_id": object_id,
-            "properties": properties,
-            "user_id": user["user_id"],
-        },
+        await sequence(
+            board_id,
+            "object_updated",
+            {
+                "object_id": object_id,
+                "properties": properties,
+                "user_id": user["user_id"],
+            },
+            sid,
+        ),
         room=board_id,
-        skip_sid=sid,
+        skip_sid=skip,
     )
 
 
@@ -402,17 +824,228 @@ async def object_delete(sid: str, data: dict):
     object_id = data.get("object_id")
 
     # Remove object from board state
-    board = state.boards.get(board_id)
-    if board:
-        board["objects"] = [o for o in board["objects"] if o["id"] != object_id]
+    if state.delete_object(board_id, object_id):
+        replicate(board_id, {"type": "object_delete", "object_id": object_id})
 
     # Broadcast to other users
     await sio.emit(
         "object_deleted",
-        {
-            "object_id": object_id,
-            "user_id": user["user_id"],
-        },
+        await sequence(
+            board_id,
+            "object_deleted",
+            {
+                "object_id": object_id,
+                "user_id": user["user_id"],
+            },
+            sid,
+        ),
         room=board_id,
         skip_sid=sid,
     )
+
+
+@sio.event
+async def viewport_update(sid: str, data: dict):
+    """Handle a client reporting the canvas area it is looking at."""
+    user = state.users.get(sid)
+    if not user:
+        return
+
+    board_id = user["board_id"]
+    bbox = parse_bbox(data.get("bbox"))
+    if bbox is None:
+        # Unknown viewport: back to full broadcasts
+        viewport_interest.remove(board_id, sid)
+        region = None
+    else:
+        try:
+            scale = float(data.get("scale") or 1.0)
+        except (TypeError, ValueError):
+            scale = 1.0
+        if not (scale > 0 and math.isfinite(scale)):
+            scale = 1.0
+        region = viewport_interest.update(board_id, sid, bbox, scale)
+
+    # Catch up on elements that changed out of view and are now visible
+    await sync_stale_elements(sid, board_id, user["point_format"], region)
+
+
+# Sampled handler tracing (see app.tracing); events with a zero sampling
+# rate keep their plain handlers. Must run after all handlers are registered.
+tracer.instrument_socketio(
+    sio, context=lambda sid: {"board_id": state.users.get(sid, {}).get("board_id")}
+)
+
+
+# Prometheus metrics (see app.metrics). Handler timing wraps the handlers
+# installed above, tracing included; everything else is read on scrape.
+instrument_socketio(sio)
+
+# Rate limits go outermost so that dropped events cost next to nothing
+rate_limiter.install(sio, board_of=lambda sid: state.users.get(sid, {}).get("board_id"))
+
+# Upper bounds of the room size buckets
+ROOM_SIZES = ((1, "1"), (4, "2-4"), (9, "5-9"), (24, "10-24"), (49, "25-49"))
+
+
+def _rooms_by_size() -> dict:
+    counts = {(label,): 0 for _, label in ROOM_SIZES}
+    counts[("50+",)] = 0
+    for sids in state.board_users.values():
+        if not sids:
+            continue
+        label = next((label for bound, label in ROOM_SIZES if len(sids) <= bound), "50+")
+        counts[(label,)] += 1
+    return counts
+
+
+def _engineio_queues() -> list[int]:
+    return [socket.queue.qsize() for socket in list(sio.eio.sockets.values())]
+
+
+registry.gauge(
+    "whiteboard_connected_users", "Users connected to this node", lambda: len(state.users)
+)
+registry.gauge(
+    "whiteboard_rooms", "Boards with connected users by room size", _rooms_by_size, ("size",)
+)
+registry.gauge(
+    "whiteboard_room_size_max",
+    "Users in the largest board room",
+    lambda: max((len(sids) for sids in state.board_users.values()), default=0),
+)
+registry.gauge("whiteboard_boards_resident", "Boards held in memory", lambda: len(state.boards))
+registry.gauge(
+    "whiteboard_elements",
+    "Elements held in memory by kind",
+    lambda: {
+        ("stroke",): sum(len(board["strokes"]) for board in state.boards.values()),
+        ("object",): sum(len(board["objects"]) for board in state.boards.values()),
+    },
+    ("kind",),
+)
+registry.gauge(
+    "whiteboard_stroke_points",
+    "Points of the strokes held in memory",
+    lambda: sum(
+        stroke.point_count for board in state.boards.values() for stroke in board["strokes"]
+    ),
+)
+registry.gauge(
+    "whiteboard_active_strokes",
+    "Strokes still being drawn",
+    lambda: sum(len(board["active_strokes"]) for board in state.boards.values()),
+)
+registry.gauge(
+    "whiteboard_emit_queue_depth",
+    "Updates waiting in the batching queues",
+    lambda: {
+        ("stroke_batch",): stroke_broadcaster.queue_depth,
+        ("cursor_batch",): cursor_presence.queue_depth,
+        ("engineio",): sum(_engineio_queues()),
+    },
+    ("queue",),
+)
+registry.gauge(
+    "whiteboard_engineio_queue_max",
+    "Packets queued for the most backed-up client",
+    lambda: max(_engineio_queues(), default=0),
+)
+registry.counter(
+    "whiteboard_cursor_samples_total",
+    "Cursor samples by outcome",
+    lambda: {
+        ("received",): cursor_presence.samples_received,
+        ("merged",): cursor_presence.samples_merged,
+        ("unchanged",): cursor_presence.samples_unchanged,
+        ("sent",): cursor_presence.cursors_sent,
+    },
+    ("outcome",),
+)
+registry.gauge(
+    "whiteboard_stroke_simplify_reduction_ratio",
+    "Fraction of points dropped by stroke simplification",
+    lambda: stroke_simplifier.reduction_ratio(),
+)
+registry.gauge(
+    "whiteboard_stroke_simplify_board_reduction_ratio",
+    "Fraction of points dropped by stroke simplification, per resident board",
+    lambda: {
+        (board_id,): stroke_simplifier.reduction_ratio(board_id)
+        for board_id in stroke_simplifier.stats
+    },
+    ("board_id",),
+)
+registry.gauge(
+    "whiteboard_persist_queue_depth",
+    "Boards with edits not yet saved",
+    lambda: board_persister.queue_depth,
+)
+registry.gauge(
+    "whiteboard_persist_flush_lag_seconds",
+    "Age of the oldest unsaved edit",
+    lambda: board_persister.flush_lag,
+)
+registry.gauge(
+    "whiteboard_persist_last_flush_seconds",
+    "Duration of the latest flush",
+    lambda: board_persister.last_flush_seconds,
+)
+registry.counter(
+    "whiteboard_persist_boards_flushed_total",
+    "Board saves",
+    lambda: board_persister.boards_flushed,
+)
+registry.counter(
+    "whiteboard_persist_flush_failures_total",
+    "Failed flushes",
+    lambda: board_persister.flush_failures,
+)
+registry.counter(
+    "whiteboard_socketio_throttled_total",
+    "Inbound events over their rate limit",
+    lambda: {
+        **{(event, "dropped"): count for event, count in rate_limiter.dropped.items()},
+        **{(event, "coalesced"): count for event, count in rate_limiter.coalesced.items()},
+    },
+    ("event", "action"),
+)
+registry.gauge(
+    "whiteboard_throttled_clients",
+    "Connected clients that have had events throttled",
+    lambda: len(rate_limiter.throttled),
+)
+registry.gauge(
+    "whiteboard_lagging_clients",
+    "Clients over their outbound queue limits",
+    lambda: len(client_backpressure.lagging),
+)
+registry.gauge(
+    "whiteboard_client_queue_max",
+    "Outbound queue of the most backed-up client at the last check",
+    lambda: {
+        ("packets",): max((b[0] for b in client_backpressure.backlogs.values()), default=0),
+        ("bytes",): max((b[1] for b in client_backpressure.backlogs.values()), default=0),
+    },
+    ("unit",),
+)
+registry.counter(
+    "whiteboard_client_backpressure_total",
+    "Backpressure actions on lagging clients",
+    lambda: {
+        ("lag_episode",): client_backpressure.lag_episodes,
+        ("stroke_merged",): client_backpressure.updates_merged,
+        ("cursor_dropped",): client_backpressure.cursors_dropped,
+        ("update_dropped",): client_backpressure.updates_dropped,
+        ("resync",): client_backpressure.resyncs,
+    },
+    ("action",),
+)
+registry.counter(
+    "whiteboard_board_loads_total", "Boards loaded into memory", lambda: board_residency.loads
+)
+registry.counter(
+    "whiteboard_board_evictions_total",
+    "Boards evicted from memory",
+    lambda: board_residency.evictions,
+)
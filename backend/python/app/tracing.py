@@ -0,0 +1,169 @@
+"""Sampled tracing of Socket.io events and database calls.
+
+A random sample of events is timed and recorded, with a sampling rate per
+event type: Socket.io event names (``stroke_update``, ``join_board``, ...)
+and ``db`` for SQL statements. The most recent traces are kept in a ring
+buffer and served by ``GET /api/admin/traces``.
+
+Instrumentation is only installed for event types with a non-zero rate,
+so events that are not sampled at all run their plain handlers and the
+engine has no tracing listeners.
+"""
+
+import asyncio
+import functools
+import random
+import time
+from collections import deque
+from typing import Callable
+
+from sqlalchemy import event
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Sampling key of database statements
+DB_EVENT = "db"
+
+
+class Tracer:
+    """Samples events and keeps the latest traces in a ring buffer.
+
+    A trace is a dict: ``time`` (epoch seconds at the start), ``kind``
+    (``socket`` or ``db``), ``name``, ``duration_ms`` and ``error`` (None
+    on success), plus ``sid``/``board_id`` for socket events and a
+    truncated ``statement`` and ``rows`` for database calls.
+    """
+
+    def __init__(
+        self,
+        default_rate: float = 0.0,
+        rates: dict[str, float] | None = None,
+        buffer_size: int = 1000,
+        statement_length: int = 200,
+    ):
+        self.default_rate = default_rate
+        self.rates = dict(rates or {})
+        self.traces: deque[dict] = deque(maxlen=max(buffer_size, 0))
+        self.statement_length = statement_length
+        self.recorded: dict[str, int] = {}  # name -> traces recorded
+
+    def rate(self, name: str) -> float:
+        """Sampling rate of an event type (0 disables, 1 traces every event)."""
+        if not self.traces.maxlen:
+            return 0.0
+        return self.rates.get(name, self.default_rate)
+
+    def record(self, kind: str, name: str, started: float, error: str | None = None, **attrs):
+        """Store a trace of an event that started at ``started`` (perf_counter)."""
+        duration = time.perf_counter() - started
+        self.traces.append(
+            {
+                "time": time.time() - duration,
+                "kind": kind,
+                "name": name,
+                "duration_ms": round(duration * 1000, 3),
+                "error": error,
+                **attrs,
+            }
+        )
+        self.recorded[name] = self.recorded.get(name, 0) + 1
+
+    def recent(
+        self, kind: str | None = None, name: str | None = None, limit: int = 100
+    ) -> list[dict]:
+        """Latest traces first, optionally filtered by kind and name."""
+        found = []
+        for trace in reversed(self.traces):
+            if (kind is None or trace["kind"] == kind) and (name is None or trace["name"] == name):
+                found.append(trace)
+                if len(found) >= limit:
+                    break
+        return found
+
+    # Socket.io
+
+    def instrument_socketio(
+        self,
+        sio,
+        context: Callable[[str], dict] | None = None,
+        namespace: str = "/",
+    ):
+        """Wrap the registered handlers of sampled events.
+
+        Call once all handlers are registered. ``context(sid)`` may add
+        attributes (e.g. the board) to each trace.
+        """
+        handlers = sio.handlers.get(namespace, {})
+        for name, handler in list(handlers.items()):
+            rate = self.rate(name)
+            if rate > 0 and asyncio.iscoroutinefunction(handler):
+                handlers[name] = self._traced(name, handler, rate, context)
+
+    def _traced(self, name: str, handler, rate: float, context):
+        @functools.wraps(handler)
+        async def traced(sid, *args):
+            if random.random() >= rate:
+                return await handler(sid, *args)
+            started = time.perf_counter()
+            error = None
+            try:
+                return await handler(sid, *args)
+            except Exception as e:
+                error = repr(e)
+                raise
+            finally:
+                attrs = context(sid) if context is not None else {}
+                self.record("socket", name, started, error, sid=sid, **attrs)
+
+        return traced
+
+    # Database
+
+    def instrument_engine(self, engine):
+        """Trace a sample of the statements run by a (sync or async) engine."""
+        rate = self.rate(DB_EVENT)
+        if rate <= 0:
+            return
+        sync_engine = getattr(engine, "sync_engine", engine)
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            if context is not None and random.random() < rate:
+                context._trace_started = time.perf_counter()
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, "_trace_started", None)
+            if started is not None:
+                del context._trace_started
+                self.record(
+                    "db",
+                    DB_EVENT,
+                    started,
+                    statement=statement[: self.statement_length],
+                    rows=cursor.rowcount,
+                )
+
+        @event.listens_for(sync_engine, "handle_error")
+        def failed(exception_context):
+            context = exception_context.execution_context
+            started = getattr(context, "_trace_started", None)
+            if started is not None:
+                del context._trace_started
+                self.record(
+                    "db",
+                    DB_EVENT,
+                    started,
+                    repr(exception_context.original_exception),
+                    statement=(exception_context.statement or "")[: self.statement_length],
+                    rows=None,
+                )
+
+
+tracer = Tracer(
+    default_rate=settings.trace_sample_rate,
+    rates=settings.trace_sample_rates,
+    buffer_size=settings.trace_buffer_size,
+)
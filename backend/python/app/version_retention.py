@@ -0,0 +1,264 @@
+"""Retention of board versions: thinning old versions in the background.
+
+Retention tiers ``(max_age_hours, interval_hours)`` are checked in order,
+and the first one whose max age (None for no limit) is above a version's
+age applies. With interval 0 the version is kept; otherwise only the
+newest version of each interval is kept. Intervals are aligned to the
+epoch, so runs agree on which version to keep. Versions older than every
+tier are deleted. The newest version of a board is always kept.
+
+The server runs ``version_retention`` every
+``version_retention_interval_seconds``; it can also be run by hand:
+
+    cd backend/python
+    python -m app.version_retention --dry-run
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Sequence
+
+from sqlalchemy import delete, func, select
+
+from app.config import get_settings
+from app.database import async_session_maker, close_db
+from app.metrics import registry
+from app.models.board import BoardVersion
+from app.version_store import collect_garbage
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Advisory lock key: one node at a time thins versions
+_RETENTION_LOCK = 0x56455253
+
+Tiers = Sequence[tuple[float | None, float]]
+
+
+def _bucket(tiers: Tiers, age_hours: float, created_at: datetime) -> tuple | None:
+    """The retention interval a version falls in; () keeps it, None expires it."""
+    for tier, (max_age, interval) in enumerate(tiers):
+        if max_age is None or age_hours < max_age:
+            if interval <= 0:
+                return ()
+            return tier, int(created_at.timestamp() // (interval * 3600))
+    return None
+
+
+def expired_versions(versions: Sequence[tuple[Any, datetime]], tiers: Tiers, now: datetime) -> list:
+    """Ids of the versions the tiers do not keep.
+
+    ``versions`` are ``(id, created_at)`` of one board, newest first.
+    """
+    expired = []
+    kept = set()
+    for index, (version_id, created_at) in enumerate(versions):
+        age_hours = (now - created_at).total_seconds() / 3600
+        bucket = _bucket(tiers, age_hours, created_at)
+        if index == 0:
+            if bucket:
+                kept.add(bucket)
+        elif bucket is None or bucket in kept:
+            expired.append(version_id)
+        elif bucket:
+            kept.add(bucket)
+    return expired
+
+
+class VersionRetention:
+    """Deletes the board versions the retention tiers do not keep.
+
+    Versions are deleted ``batch_size`` per transaction, so no lock is held
+    for long, and the content chunks only deleted versions referenced are
+    garbage-collected afterwards. ``run`` returns what was reclaimed; the
+    totals are kept as counters.
+    """
+
+    def __init__(self, session_maker, tiers: Tiers, interval: float, batch_size: int = 500):
+        self.session_maker = session_maker
+        self.tiers = [tuple(tier) for tier in tiers]
+        self.interval = interval
+        self.batch_size = max(batch_size, 1)
+        self._task: asyncio.Task | None = None
+
+        # Counters
+        self.runs = 0
+        self.versions_deleted = 0
+        self.chunks_deleted = 0
+        self.bytes_reclaimed = 0
+        self.last_run_seconds = 0.0
+
+    def start(self):
+        if self._task is None and self.interval > 0 and self.tiers:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run()
+            except Exception as e:
+                logger.error(f"Version retention run failed: {e}")
+
+    def _keep_all_hours(self) -> float:
+        """Age below which the tiers keep every version."""
+        max_age, interval = self.tiers[0]
+        if interval > 0:
+            return 0.0
+        return max_age if max_age is not None else float("inf")
+
+    async def run(self, dry_run: bool = False) -> dict:
+        """Thin every board's versions once; skipped while another node runs."""
+        report = {"boards": 0, "versions_deleted": 0, "chunks_deleted": 0, "bytes_reclaimed": 0}
+        if not self.tiers or self._keep_all_hours() == float("inf"):
+            return report
+        started = time.monotonic()
+        async with self.session_maker() as lock_session:
+            # A session-level lock on a connection kept for the run, outside
+            # any transaction
+            conn = await lock_session.connection(
+                execution_options={"isolation_level": "AUTOCOMMIT"}
+            )
+            if not await conn.scalar(select(func.pg_try_advisory_lock(_RETENTION_LOCK))):
+                logger.info("Version retention is running elsewhere; skipped")
+                return report
+            try:
+                await self._thin(report, dry_run)
+            finally:
+                await conn.execute(select(func.pg_advisory_unlock(_RETENTION_LOCK)))
+
+        if not dry_run:
+            self.runs += 1
+            self.versions_deleted += report["versions_deleted"]
+            self.chunks_deleted += report["chunks_deleted"]
+            self.bytes_reclaimed += report["bytes_reclaimed"]
+            self.last_run_seconds = time.monotonic() - started
+        if report["versions_deleted"]:
+            logger.info(
+                f"Version retention {'would delete' if dry_run else 'deleted'} "
+                f"{report['versions_deleted']} versions of {report['boards']} boards "
+                f"({report['bytes_reclaimed']} bytes reclaimed)"
+            )
+        return report
+
+    async def _thin(self, report: dict, dry_run: bool):
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(hours=self._keep_all_hours())
+        after = None
+        while True:
+            # Boards with versions old enough to thin, a page at a time
+            query = (
+                select(BoardVersion.board_id)
+                .where(BoardVersion.created_at < cutoff)
+                .distinct()
+                .order_by(BoardVersion.board_id)
+                .limit(self.batch_size)
+            )
+            if after is not None:
+                query = query.where(BoardVersion.board_id > after)
+            async with self.session_maker() as session:
+                board_ids = list((await session.execute(query)).scalars())
+            if not board_ids:
+                break
+            after = board_ids[-1]
+
+            pending = []
+            thinned = []
+            for board_id in board_ids:
+                async with self.session_maker() as session:
+                    result = await session.execute(
+                        select(BoardVersion.id, BoardVersion.created_at)
+                        .where(BoardVersion.board_id == board_id)
+                        .order_by(
+                            BoardVersion.created_at.desc(), BoardVersion.version_number.desc()
+                        )
+                    )
+                    expired = expired_versions(result.all(), self.tiers, now)
+                if not expired:
+                    continue
+                thinned.append(board_id)
+                report["versions_deleted"] += len(expired)
+                if dry_run:
+                    continue
+                pending.extend(expired)
+                while len(pending) >= self.batch_size:
+                    report["bytes_reclaimed"] += await self._delete(pending[: self.batch_size])
+                    pending = pending[self.batch_size :]
+            report["boards"] += len(thinned)
+            if dry_run or not thinned:
+                continue
+            if pending:
+                report["bytes_reclaimed"] += await self._delete(pending)
+            chunks, size = await collect_garbage(self.session_maker, thinned, self.batch_size)
+            report["chunks_deleted"] += chunks
+            report["bytes_reclaimed"] += size
+
+    async def _delete(self, version_ids: list) -> int:
+        """Delete versions; returns the size of their stored columns."""
+        async with self.session_maker() as session:
+            async with session.begin():
+                result = await session.execute(
+                    delete(BoardVersion)
+                    .where(BoardVersion.id.in_(version_ids))
+                    .returning(
+                        func.coalesce(func.pg_column_size(BoardVersion.canvas_data), 0)
+                        + func.coalesce(func.pg_column_size(BoardVersion.manifest), 0)
+                    )
+                )
+                return sum(result.scalars().all())
+
+
+version_retention = VersionRetention(
+    async_session_maker,
+    settings.version_retention,
+    settings.version_retention_interval_seconds,
+    settings.version_retention_batch_size,
+)
+
+registry.counter(
+    "whiteboard_versions_deleted_total",
+    "Board versions deleted by retention",
+    lambda: version_retention.versions_deleted,
+)
+registry.counter(
+    "whiteboard_version_bytes_reclaimed_total",
+    "Bytes of versions and version chunks deleted by retention",
+    lambda: version_retention.bytes_reclaimed,
+)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Thin board versions by the retention tiers")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Count the versions that would be deleted"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    async def run():
+        try:
+            report = await version_retention.run(dry_run=args.dry_run)
+        finally:
+            await close_db()
+        print(
+            f"{report['versions_deleted']} versions of {report['boards']} boards "
+            f"{'would be deleted' if args.dry_run else 'deleted'}, "
+            f"{report['chunks_deleted']} chunks deleted, "
+            f"{report['bytes_reclaimed']} bytes reclaimed"
+        )
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""Content-addressed, deduplicated storage of board versions.
+
+A version's strokes and objects are stored as chunks in
+``board_version_chunks``, keyed by the SHA-256 of their canonical JSON
+and shared by all versions of a board. The version row only holds a
+manifest ``{"strokes": [hash, ...], "objects": [hash, ...], "rest": {...}}``
+(``rest`` is the rest of the canvas, i.e. layers). Creating a version
+inserts just the elements no other version of the board has, and the
+backup taken by a restore mostly references existing chunks.
+
+Chunks that no manifest references any more (after versions are
+deleted) are removed by ``collect_garbage``. Versions stored as full
+copies before this are converted with ``dedupe_versions``:
+
+    cd backend/python
+    python -m app.version_store dedupe --batch-size 100
+    python -m app.version_store gc
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any, Optional
+from uuid import UUID
+
+from sqlalchemy import String, any_, bindparam, delete, func, select, union_all
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.board import Board, BoardVersion, BoardVersionChunk
+
+logger = logging.getLogger(__name__)
+
+CHUNK_KINDS = ("strokes", "objects")
+
+# Rows per INSERT; asyncpg allows 32767 bind parameters per statement
+_INSERT_CHUNK = 1000
+
+
+def chunk_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def canonical_json(element: Any) -> bytes:
+    """The JSON a chunk is hashed by: key order and whitespace do not matter."""
+    return json.dumps(
+        element, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode()
+
+
+def build_manifest(canvas: dict) -> tuple[dict, dict[str, tuple[Any, int]]]:
+    """Split a canvas into a manifest and its chunks ``{hash: (element, size)}``.
+
+    CPU bound for large boards; run it in a thread.
+    """
+    manifest: dict[str, Any] = {
+        "rest": {key: value for key, value in canvas.items() if key not in CHUNK_KINDS}
+    }
+    chunks = {}
+    for kind in CHUNK_KINDS:
+        hashes = []
+        for element in canvas.get(kind) or []:
+            data = canonical_json(element)
+            key = chunk_hash(data)
+            chunks[key] = (element, len(data))
+            hashes.append(key)
+        manifest[kind] = hashes
+    return manifest, chunks
+
+
+def manifest_hashes(manifest: dict) -> set[str]:
+    return {key for kind in CHUNK_KINDS for key in manifest.get(kind) or []}
+
+
+def _hash_array(hashes) -> Any:
+    # One array parameter, however many chunks there are
+    return bindparam("hashes", list(hashes), type_=ARRAY(String))
+
+
+async def lock_board(session: AsyncSession, board_id: UUID) -> None:
+    """Lock a board's row while its chunks are written or collected.
+
+    Otherwise a version could reference a chunk that garbage collection
+    is deleting.
+    """
+    await session.execute(
+        select(Board.id).where(Board.id == board_id).with_for_update(key_share=True)
+    )
+
+
+async def store_chunks(
+    session: AsyncSession, board_id: UUID, chunks: dict[str, tuple[Any, int]]
+) -> int:
+    """Insert the chunks a board does not have yet; returns how many were new.
+
+    Call with the board locked (see ``lock_board``).
+    """
+    if not chunks:
+        return 0
+    result = await session.execute(
+        select(BoardVersionChunk.hash).where(
+            BoardVersionChunk.board_id == board_id,
+            BoardVersionChunk.hash == any_(_hash_array(chunks)),
+        )
+    )
+    existing = set(result.scalars())
+    rows = [
+        {"board_id": board_id, "hash": key, "data": element, "size": size}
+        for key, (element, size) in chunks.items()
+        if key not in existing
+    ]
+    for i in range(0, len(rows), _INSERT_CHUNK):
+        await session.execute(
+            insert(BoardVersionChunk).values(rows[i : i + _INSERT_CHUNK]).on_conflict_do_nothing()
+        )
+    return len(rows)
+
+
+async def create_version(
+    session: AsyncSession,
+    board_id: UUID,
+    version_number: int,
+    canvas: dict,
+    created_by: Optional[UUID] = None,
+) -> BoardVersion:
+    """Add a version of a board with the given canvas to the session."""
+    manifest, chunks = await asyncio.to_thread(build_manifest, canvas)
+    await lock_board(session, board_id)
+    await store_chunks(session, board_id, chunks)
+    version = BoardVersion(
+        board_id=board_id,
+        version_number=version_number,
+        manifest=manifest,
+        created_by=created_by,
+    )
+    session.add(version)
+    return version
+
+
+async def load_version(session: AsyncSession, version: BoardVersion) -> dict:
+    """The canvas of a version, from its manifest or its full copy."""
+    manifest = version.manifest
+    if manifest is None:
+        return dict(version.canvas_data or {})
+    hashes = manifest_hashes(manifest)
+    chunks = {}
+    if hashes:
+        result = await session.execute(
+            select(BoardVersionChunk.hash, BoardVersionChunk.data).where(
+                BoardVersionChunk.board_id == version.board_id,
+                BoardVersionChunk.hash == any_(_hash_array(hashes)),
+            )
+        )
+        chunks = dict(result.all())
+    missing = hashes.difference(chunks)
+    if missing:
+        logger.error(f"Version {version.id} is missing {len(missing)} chunks")
+    canvas = dict(manifest.get("rest") or {})
+    for kind in CHUNK_KINDS:
+        canvas[kind] = [chunks[key] for key in manifest.get(kind) or [] if key in chunks]
+    return canvas
+
+
+# Garbage collection
+
+
+async def collect_board_garbage(session: AsyncSession, board_id: UUID) -> tuple[int, int]:
+    """Delete a board's chunks that no version references.
+
+    Returns the number of chunks deleted and their size in bytes.
+    """
+    await lock_board(session, board_id)
+    referenced = union_all(
+        *(
+            select(func.jsonb_array_elements_text(BoardVersion.manifest[kind])).where(
+                BoardVersion.board_id == board_id, BoardVersion.manifest.is_not(None)
+            )
+            for kind in CHUNK_KINDS
+        )
+    )
+    result = await session.execute(
+        delete(BoardVersionChunk)
+        .where(
+            BoardVersionChunk.board_id == board_id,
+            BoardVersionChunk.hash.not_in(referenced),
+        )
+        .returning(BoardVersionChunk.size)
+    )
+    sizes = result.scalars().all()
+    return len(sizes), sum(sizes)
+
+
+async def collect_garbage(
+    session_maker, board_ids: list[UUID] | None = None, batch_size: int = 100
+) -> tuple[int, int]:
+    """Garbage-collect chunks, ``batch_size`` boards per transaction.
+
+    ``board_ids`` defaults to every board that has chunks. Returns the
+    number of chunks deleted and their size in bytes.
+    """
+    deleted = reclaimed = 0
+    after = None
+    while True:
+        if board_ids is not None:
+            batch = board_ids[:batch_size]
+            board_ids = board_ids[batch_size:]
+        else:
+            query = select(BoardVersionChunk.board_id).distinct().order_by(
+                BoardVersionChunk.board_id
+            )
+            if after is not None:
+                query = query.where(BoardVersionChunk.board_id > after)
+            async with session_maker() as session:
+                result = await session.execute(query.limit(batch_size))
+                batch = list(result.scalars())
+        if not batch:
+            break
+        async with session_maker() as session:
+            async with session.begin():
+                for board_id in sorted(batch):
+                    chunks, size = await collect_board_garbage(session, board_id)
+                    deleted += chunks
+                    reclaimed += size
+        after = max(batch)
+    if deleted:
+        logger.info(f"Deleted {deleted} unreferenced version chunks ({reclaimed} bytes)")
+    return deleted, reclaimed
+
+
+# Migration
+
+
+async def dedupe_versions(session_maker, batch_size: int = 100, limit: int | None = None) -> int:
+    """Convert versions stored as full copies to manifests, ``batch_size`` per transaction.
+
+    Rows are locked with SKIP LOCKED, so the server can keep running.
+    Returns the number of versions converted.
+    """
+    converted = 0
+    while limit is None or converted < limit:
+        size = batch_size if limit is None else min(batch_size, limit - converted)
+        async with session_maker() as session:
+            async with session.begin():
+                result = await session.execute(
+                    select(BoardVersion)
+                    .where(BoardVersion.manifest.is_(None))
+                    .order_by(BoardVersion.board_id, BoardVersion.version_number)
+                    .limit(size)
+                    .with_for_update(skip_locked=True)
+                )
+                versions = result.scalars().all()
+                for version in versions:
+                    manifest, chunks = await asyncio.to_thread(
+                        build_manifest, version.canvas_data or {}
+                    )
+                    await lock_board(session, version.board_id)
+                    await store_chunks(session, version.board_id, chunks)
+                    version.manifest = manifest
+                    version.canvas_data = None
+        if not versions:
+            break
+        converted += len(versions)
+        logger.info(f"Converted {converted} versions to chunk manifests")
+    return converted
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Maintain content-addressed board versions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    dedupe = commands.add_parser("dedupe", help="Convert full-copy versions to manifests")
+    dedupe.add_argument("--batch-size", type=int, default=100, help="Versions per transaction")
+    dedupe.add_argument("--limit", type=int, help="Stop after this many versions")
+    gc = commands.add_parser("gc", help="Delete chunks no version references")
+    gc.add_argument("--batch-size", type=int, default=100, help="Boards per transaction")
+    args = parser.parse_args(argv)
+
+    from app.database import async_session_maker, close_db
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    async def run():
+        try:
+            if args.command == "dedupe":
+                count = await dedupe_versions(async_session_maker, args.batch_size, args.limit)
+                print(f"{count} versions converted")
+            else:
+                count, size = await collect_garbage(
+                    async_session_maker, batch_size=args.batch_size
+                )
+                print(f"{count} chunks deleted, {size} bytes reclaimed")
+        finally:
+            await close_db()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
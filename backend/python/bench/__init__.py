@@ -0,0 +1 @@
+"""Benchmarks for the real-time backend (run from backend/python)."""
@@ -0,0 +1,201 @@
+"""Canvas storage benchmark: JSON(B) versus compressed blobs.
+
+Generates boards of the given sizes and, for plain JSON and every
+available blob format (see app.canvas_codec), reports the encoded size
+and the time to encode and decode. With ``--database`` it also writes
+and reads each board through Postgres, as JSONB and as ``bytea``, in a
+temporary table:
+
+    cd backend/python
+    python -m bench.canvas --sizes 1000,10000
+    python -m bench.canvas --database --output canvas.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+from app.canvas_codec import FORMATS, decode_blob, encode_blob, format_available
+
+DEFAULT_SIZES = (1000, 10000, 50000)
+
+
+def make_canvas(strokes: int, points: int, seed: int = 1) -> dict:
+    """A board with ``strokes`` strokes of ``points`` points and a few objects."""
+    rng = random.Random(seed)
+    canvas = {"strokes": [], "objects": [], "layers": [{"id": "default", "name": "Layer 1"}]}
+    for i in range(strokes):
+        x, y = rng.uniform(0, 5000), rng.uniform(0, 5000)
+        stroke_points = []
+        for t in range(points):
+            x += rng.uniform(-4, 4)
+            y += rng.uniform(-4, 4)
+            stroke_points.append(
+                {"x": round(x, 2), "y": round(y, 2), "pressure": 0.5, "timestamp": 1000 + t * 8}
+            )
+        canvas["strokes"].append(
+            {
+                "id": f"stroke-{i}",
+                "user_id": f"user-{i % 7}",
+                "tool": "pen",
+                "color": "#1e88e5",
+                "size": 2,
+                "layer_id": "default",
+                "completed": True,
+                "points": stroke_points,
+            }
+        )
+    for i in range(strokes // 20):
+        canvas["objects"].append(
+            {"id": f"object-{i}", "type": "rect", "properties": {"x": i, "y": i, "w": 40, "h": 30}}
+        )
+    return canvas
+
+
+def _timed(run, repeat: int) -> tuple[float, object]:
+    """Median seconds of ``run()`` over ``repeat`` rounds, and its last result."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def bench_codecs(canvas: dict, repeat: int) -> dict:
+    results = {}
+    encode_seconds, text = _timed(lambda: json.dumps(canvas), repeat)
+    decode_seconds, _ = _timed(lambda: json.loads(text), repeat)
+    results["json"] = {
+        "bytes": len(text.encode()),
+        "encode_ms": encode_seconds * 1000,
+        "decode_ms": decode_seconds * 1000,
+    }
+    for name in FORMATS:
+        if not format_available(name):
+            continue
+        encode_seconds, blob = _timed(lambda: encode_blob(canvas, name), repeat)
+        decode_seconds, _ = _timed(lambda: decode_blob(blob), repeat)
+        results[name] = {
+            "bytes": len(blob),
+            "encode_ms": encode_seconds * 1000,
+            "decode_ms": decode_seconds * 1000,
+        }
+    return results
+
+
+async def bench_database(canvas: dict, repeat: int) -> dict:
+    """Write and read a canvas as JSONB and as bytea, including client-side coding."""
+    from sqlalchemy import text
+
+    from app.canvas_codec import configured_format
+    from app.database import engine
+
+    name = configured_format()
+    results = {}
+    async with engine.connect() as conn:
+        await conn.execute(
+            text("CREATE TEMP TABLE bench_canvas (id INT PRIMARY KEY, doc JSONB, blob BYTEA)")
+        )
+        await conn.execute(text("INSERT INTO bench_canvas (id) VALUES (1)"))
+
+        async def measure(write, read) -> dict:
+            writes, reads = [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await write()
+                writes.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                await read()
+                reads.append(time.perf_counter() - started)
+            return {
+                "write_ms": statistics.median(writes) * 1000,
+                "read_ms": statistics.median(reads) * 1000,
+            }
+
+        async def write_jsonb():
+            await conn.execute(
+                text("UPDATE bench_canvas SET doc = CAST(:doc AS JSONB) WHERE id = 1"),
+                {"doc": json.dumps(canvas)},
+            )
+
+        async def read_jsonb():
+            row = await conn.execute(text("SELECT doc::text FROM bench_canvas WHERE id = 1"))
+            json.loads(row.scalar())
+
+        async def write_blob():
+            blob = await asyncio.to_thread(encode_blob, canvas, name)
+            await conn.execute(
+                text("UPDATE bench_canvas SET blob = :blob WHERE id = 1"), {"blob": blob}
+            )
+
+        async def read_blob():
+            row = await conn.execute(text("SELECT blob FROM bench_canvas WHERE id = 1"))
+            await asyncio.to_thread(decode_blob, row.scalar())
+
+        results["jsonb"] = await measure(write_jsonb, read_jsonb)
+        results[name] = await measure(write_blob, read_blob)
+        sizes = await conn.execute(
+            text("SELECT pg_column_size(doc), pg_column_size(blob) FROM bench_canvas WHERE id = 1")
+        )
+        results["jsonb"]["stored_bytes"], results[name]["stored_bytes"] = sizes.one()
+        await conn.rollback()
+    await engine.dispose()
+    return results
+
+
+def _print(size: int, results: dict):
+    print(f"\n{size} strokes")
+    print(f"  {'format':<14}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}")
+    for name, result in results.items():
+        print(
+            f"  {name:<14}{result['bytes']:>12}"
+            f"{result['encode_ms']:>12.2f}{result['decode_ms']:>12.2f}"
+        )
+
+
+def _print_database(size: int, results: dict):
+    print(f"  Postgres ({size} strokes)")
+    print(f"  {'column':<14}{'stored':>12}{'write ms':>12}{'read ms':>12}")
+    for name, result in results.items():
+        print(
+            f"  {name:<14}{result['stored_bytes']:>12}"
+            f"{result['write_ms']:>12.2f}{result['read_ms']:>12.2f}"
+        )
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="Comma-separated board sizes (strokes)",
+    )
+    parser.add_argument("--points", type=int, default=20, help="Points per stroke")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--database", action="store_true", help="Also measure Postgres (uses DATABASE_URL)"
+    )
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    document = {"points_per_stroke": args.points, "results": {}}
+    for size in (int(size) for size in args.sizes.split(",") if size):
+        canvas = make_canvas(size, args.points)
+        results = {"codecs": bench_codecs(canvas, args.repeat)}
+        _print(size, results["codecs"])
+        if args.database:
+            results["database"] = asyncio.run(bench_database(canvas, args.repeat))
+            _print_database(size, results["database"])
+        document["results"][str(size)] = results
+    if args.output:
+        Path(args.output).write_text(json.dumps(document, indent=2))
+
+
+if __name__ == "__main__":
+    main()
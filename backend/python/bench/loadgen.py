@@ -0,0 +1,453 @@
+"""Socket.IO load generator and fan-out latency benchmark.
+
+Simulated clients join boards, stream strokes at stylus rates and move
+their cursors against one server process. The report covers end-to-end
+``stroke_update`` fan-out latency (p50/p99/p999), messages per second and
+the server's CPU and RSS.
+
+    cd backend/python
+    python -m bench.loadgen --scenario classroom
+    python -m bench.loadgen --boards 8 --users-per-board 20 --drawers-per-board 2 \\
+        --duration 60 --output results.json
+
+By default a local ``uvicorn app.main:app`` is started on a free port with
+Redis disabled; board ids are not UUIDs, so nothing is read from or written
+to Postgres either. ``--url`` targets a server that is already running
+(pass ``--server-pid`` to still get CPU/RSS figures).
+
+Clients run in ``--workers`` subprocesses of asyncio clients. Every point
+of a ``stroke_update`` carries the send time as its ``timestamp``; the
+latency of a delivery is the receive time minus that timestamp, taken
+once per update and receiver (``stroke_update`` or merged in a
+``stroke_batch``). Only the window after ``--warmup`` is measured.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from dataclasses import asdict, dataclass, fields, replace
+from pathlib import Path
+
+import socketio
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class Scenario:
+    """Shape of a load test run."""
+
+    boards: int = 1
+    users_per_board: int = 10
+    drawers_per_board: int = 1  # users that draw; everyone moves a cursor
+    duration: float = 30.0  # seconds of activity, including warmup
+    warmup: float = 5.0
+    sample_hz: float = 120.0  # stylus sampling rate
+    send_hz: float = 60.0  # stroke_update events per second while drawing
+    stroke_seconds: float = 1.0  # length of one stroke
+    pause_seconds: float = 0.5  # pen up between strokes
+    cursor_hz: float = 20.0  # cursor_move events per second per user
+
+
+SCENARIOS = {
+    "smoke": Scenario(users_per_board=3, duration=10.0, warmup=2.0),
+    "classroom": Scenario(users_per_board=30, drawers_per_board=2),
+    "many-boards": Scenario(boards=50, users_per_board=4),
+    "busy": Scenario(boards=4, users_per_board=50, drawers_per_board=5, duration=60.0),
+}
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+# Clients
+
+
+async def _client(
+    url: str,
+    board_id: str,
+    index: int,
+    drawer: bool,
+    scenario: Scenario,
+    start_at: float,
+    stats: dict,
+):
+    measure_from = (start_at + scenario.warmup) * 1000
+    stop_at = start_at + scenario.duration
+    received = stats["received"]
+    latencies = stats["latencies"]
+
+    def count(event: str):
+        received[event] = received.get(event, 0) + 1
+
+    def on_points(points):
+        now = time.time() * 1000
+        for sent in {p.get("timestamp") for p in points or ()}:
+            if isinstance(sent, (int, float)) and sent >= measure_from:
+                latencies.append(now - sent)
+
+    sio = socketio.AsyncClient(reconnection=False)
+    joined = asyncio.Event()
+
+    @sio.on("board_state")
+    async def on_board_state(data):
+        joined.set()
+
+    @sio.on("stroke_update")
+    async def on_stroke_update(data):
+        count("stroke_update")
+        on_points(data.get("points"))
+
+    @sio.on("stroke_batch")
+    async def on_stroke_batch(data):
+        count("stroke_batch")
+        for stroke in data.get("strokes", []):
+            on_points(stroke.get("points"))
+
+    @sio.on("*")
+    async def on_other(event, *args):
+        count(event)
+
+    try:
+        await sio.connect(url, transports=["websocket"])
+        await sio.emit(
+            "join_board",
+            {"board_id": board_id, "user_id": f"bench-{index}", "display_name": f"Bench {index}"},
+        )
+        await asyncio.wait_for(joined.wait(), timeout=30)
+    except Exception as e:
+        stats["errors"].append(f"{board_id}/{index}: {e!r}")
+        await sio.disconnect()
+        return
+
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+    tasks = [asyncio.create_task(_move_cursor(sio, index, scenario, stop_at, stats))]
+    if drawer:
+        tasks.append(asyncio.create_task(_draw(sio, index, scenario, stop_at, stats)))
+    try:
+        await asyncio.gather(*tasks)
+    except Exception as e:
+        stats["errors"].append(f"{board_id}/{index}: {e!r}")
+    finally:
+        await sio.disconnect()
+
+
+async def _emit(sio, event: str, data: dict, stats: dict):
+    await sio.emit(event, data)
+    stats["sent"][event] = stats["sent"].get(event, 0) + 1
+
+
+async def _move_cursor(sio, index: int, scenario: Scenario, stop_at: float, stats: dict):
+    if scenario.cursor_hz <= 0:
+        return
+    interval = 1 / scenario.cursor_hz
+    angle = index
+    while time.time() < stop_at:
+        angle += 0.05
+        position = {"x": 500 + 300 * math.cos(angle), "y": 400 + 200 * math.sin(angle)}
+        await _emit(sio, "cursor_move", position, stats)
+        await asyncio.sleep(interval)
+
+
+async def _draw(sio, index: int, scenario: Scenario, stop_at: float, stats: dict):
+    interval = 1 / scenario.send_hz
+    per_send = max(1, round(scenario.sample_hz / scenario.send_hz))
+    sends_per_stroke = max(1, round(scenario.stroke_seconds * scenario.send_hz))
+    stroke = 0
+    while time.time() < stop_at:
+        stroke_id = f"bench-{index}-{stroke}-{uuid.uuid4().hex[:8]}"
+        origin_x = 200 * (index % 10)
+        origin_y = 150 * (stroke % 10)
+        await _emit(
+            sio,
+            "stroke_start",
+            {"stroke_id": stroke_id, "tool": "pen", "color": "#000000", "size": 3},
+            stats,
+        )
+        step = 0
+        for _ in range(sends_per_stroke):
+            if time.time() >= stop_at:
+                break
+            sent = time.time() * 1000
+            points = []
+            for _ in range(per_send):
+                step += 1
+                points.append(
+                    {
+                        "x": origin_x + step * 2.0,
+                        "y": origin_y + 40 * math.sin(step / 10),
+                        "pressure": 0.5 + 0.3 * math.sin(step / 7),
+                        "tilt": 0.0,
+                        "timestamp": sent,
+                    }
+                )
+            await _emit(sio, "stroke_update", {"stroke_id": stroke_id, "points": points}, stats)
+            await asyncio.sleep(interval)
+        await _emit(sio, "stroke_end", {"stroke_id": stroke_id}, stats)
+        stroke += 1
+        await asyncio.sleep(scenario.pause_seconds)
+
+
+def _worker(
+    url: str, clients: list[tuple[str, int, bool]], scenario: Scenario, start_at: float
+) -> dict:
+    """Run a share of the clients in this process and return their stats."""
+    stats = {"received": {}, "sent": {}, "latencies": [], "errors": []}
+
+    async def main():
+        await asyncio.gather(
+            *(
+                _client(url, board_id, index, drawer, scenario, start_at, stats)
+                for board_id, index, drawer in clients
+            )
+        )
+
+    asyncio.run(main())
+    return stats
+
+
+# Server
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_healthy(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        if time.time() > deadline:
+            raise RuntimeError(f"Server at {url} did not become healthy")
+        time.sleep(0.2)
+
+
+def start_server(app: str, env_overrides: dict[str, str]) -> tuple[subprocess.Popen, str]:
+    """Start a local uvicorn server without Redis and return it with its URL."""
+    port = _free_port()
+    env = {**os.environ, "REDIS_ENABLED": "false", "DEBUG": "false", **env_overrides}
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", app,
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_healthy(url)
+    except Exception:
+        process.kill()
+        raise
+    return process, url
+
+
+class ProcessSampler:
+    """CPU and RSS of a process from /proc (Linux); empty figures elsewhere."""
+
+    def __init__(self, pid: int | None):
+        self.pid = pid
+        self.cpu_percent: list[float] = []
+        self.rss_bytes: list[int] = []
+        self._last: tuple[float, float] | None = None
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _cpu_seconds(self) -> float | None:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                # Fields after the command name, which may contain spaces
+                values = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        return (int(values[11]) + int(values[12])) / self._ticks
+
+    def _rss(self) -> int | None:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def sample(self, record: bool = True):
+        if self.pid is None:
+            return
+        now = time.monotonic()
+        cpu = self._cpu_seconds()
+        if cpu is None:
+            return
+        if record and self._last is not None and now > self._last[0]:
+            self.cpu_percent.append(100 * (cpu - self._last[1]) / (now - self._last[0]))
+            rss = self._rss()
+            if rss is not None:
+                self.rss_bytes.append(rss)
+        self._last = (now, cpu)
+
+    def summary(self) -> dict:
+        if not self.cpu_percent:
+            return {"cpu_percent_avg": None, "cpu_percent_max": None, "rss_mb_max": None}
+        return {
+            "cpu_percent_avg": round(sum(self.cpu_percent) / len(self.cpu_percent), 1),
+            "cpu_percent_max": round(max(self.cpu_percent), 1),
+            "rss_mb_max": round(max(self.rss_bytes) / 2**20, 1) if self.rss_bytes else None,
+        }
+
+
+# Runner
+
+
+def run(scenario: Scenario, url: str, workers: int, server_pid: int | None = None) -> dict:
+    """Run a scenario against a server and return the report."""
+    run_id = uuid.uuid4().hex[:6]
+    clients = []
+    for board in range(scenario.boards):
+        board_id = f"bench-{run_id}-{board}"
+        for user in range(scenario.users_per_board):
+            index = board * scenario.users_per_board + user
+            clients.append((board_id, index, user < scenario.drawers_per_board))
+    workers = max(1, min(workers, len(clients)))
+    shares = [clients[i::workers] for i in range(workers)]
+    # Leave time for every client to connect and join before activity starts
+    start_at = time.time() + 3 + 0.01 * len(clients)
+    measure_from = start_at + scenario.warmup
+    stop_at = start_at + scenario.duration
+
+    sampler = ProcessSampler(server_pid)
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers) as pool:
+        jobs = [(url, share, scenario, start_at) for share in shares]
+        pending = pool.starmap_async(_worker, jobs)
+        while not pending.ready():
+            now = time.time()
+            sampler.sample(record=measure_from <= now <= stop_at)
+            pending.wait(1.0)
+        results = pending.get()
+
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    received: dict[str, int] = {}
+    sent: dict[str, int] = {}
+    for result in results:
+        for event, count in result["received"].items():
+            received[event] = received.get(event, 0) + count
+        for event, count in result["sent"].items():
+            sent[event] = sent.get(event, 0) + count
+    window = max(scenario.duration - scenario.warmup, 1e-9)
+    errors = [error for result in results for error in result["errors"]]
+
+    def ms(value: float | None) -> float | None:
+        return None if value is None else round(value, 3)
+
+    return {
+        "scenario": asdict(scenario),
+        "clients": len(clients),
+        "workers": workers,
+        "latency_ms": {
+            "count": len(latencies),
+            "p50": ms(percentile(latencies, 0.50)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "p999": ms(percentile(latencies, 0.999)),
+            "max": ms(latencies[-1] if latencies else None),
+        },
+        # Counts cover the whole run (warmup included), rates use the measured window
+        "received_per_second": round(sum(received.values()) / scenario.duration, 1),
+        "sent_per_second": round(sum(sent.values()) / scenario.duration, 1),
+        "deliveries_per_second": round(len(latencies) / window, 1),
+        "received": received,
+        "sent": sent,
+        "server": sampler.summary(),
+        "errors": errors[:20],
+        "error_count": len(errors),
+    }
+
+
+def print_report(report: dict):
+    latency = report["latency_ms"]
+    server = report["server"]
+    print(f"clients: {report['clients']} in {report['workers']} workers")
+    print(
+        f"fan-out latency ms: p50 {latency['p50']}  p99 {latency['p99']}  "
+        f"p999 {latency['p999']}  max {latency['max']}  ({latency['count']} deliveries)"
+    )
+    print(
+        f"messages/s: received {report['received_per_second']}  sent {report['sent_per_second']}  "
+        f"stroke deliveries {report['deliveries_per_second']}"
+    )
+    print(
+        f"server: cpu avg {server['cpu_percent_avg']}%  max {server['cpu_percent_max']}%  "
+        f"rss max {server['rss_mb_max']} MB"
+    )
+    if report["error_count"]:
+        print(f"errors: {report['error_count']} (first: {report['errors'][0]})")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="smoke")
+    for field in fields(Scenario):
+        option = f"--{field.name.replace('_', '-')}"
+        parser.add_argument(option, type=type(field.default), default=None)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--url", help="Use a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url server, for CPU/RSS")
+    parser.add_argument("--app", default="app.main:app", help="ASGI app of the local server")
+    parser.add_argument(
+        "--server-env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Setting for the local server (repeatable), e.g. STROKE_BATCH_MIN_USERS=2",
+    )
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    overrides = {
+        field.name: getattr(args, field.name)
+        for field in fields(Scenario)
+        if getattr(args, field.name) is not None
+    }
+    scenario = replace(SCENARIOS[args.scenario], **overrides)
+
+    process = None
+    url = args.url
+    server_pid = args.server_pid
+    if url is None:
+        env = dict(item.split("=", 1) for item in args.server_env)
+        process, url = start_server(args.app, env)
+        server_pid = process.pid
+    try:
+        report = run(scenario, url, args.workers, server_pid)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
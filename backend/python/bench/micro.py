@@ -0,0 +1,348 @@
+"""Microbenchmarks for BoardState and the Socket.io handler hot paths.
+
+Handlers are called directly with a stubbed ``sio`` (emits and room
+changes are no-ops), so only server-side work is measured. Board ids are
+not UUIDs, so nothing touches Redis or Postgres.
+
+    cd backend/python
+    python -m bench.micro --output before.json
+    # ... change something ...
+    python -m bench.micro --output after.json --compare before.json
+
+Each benchmark runs ``--repeat`` rounds and reports the minimum and median
+time per operation. Results are JSON (commit, Python version, results
+keyed by ``name[size]``) so runs from different commits can be compared.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from app import socket_handlers as handlers
+from app.realtime.state import BoardState
+from app.realtime.stroke import Stroke
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# name -> (factory, whether it runs once per board size)
+BENCHMARKS: dict[str, tuple[Callable, bool]] = {}
+
+
+def benchmark(name: str, sized: bool = False):
+    """Register a benchmark factory.
+
+    The factory returns ``(operations, run)``: ``run()`` performs the
+    operations once and may be a coroutine function.
+    """
+
+    def register(factory):
+        BENCHMARKS[name] = (factory, sized)
+        return factory
+
+    return register
+
+
+def stub_sio():
+    """Make the shared ``sio`` a sink so handlers can be called directly."""
+
+    async def noop(*args, **kwargs):
+        pass
+
+    handlers.sio.emit = noop
+    handlers.sio.enter_room = noop
+    handlers.sio.leave_room = noop
+
+
+def _points(count: int, offset: float = 0.0) -> list[dict]:
+    return [
+        {"x": offset + i * 2.0, "y": offset + i * 0.5, "pressure": 0.5, "timestamp": 1000 + i}
+        for i in range(count)
+    ]
+
+
+def _filled_state(strokes: int, points: int) -> BoardState:
+    state = BoardState()
+    template = _points(points)
+    loaded = []
+    for i in range(strokes):
+        stroke = Stroke(f"s{i}", user_id="u", completed=True)
+        stroke.append_points(template)
+        loaded.append(stroke)
+    state.load_board("bench", loaded, [])
+    for i in range(strokes // 10):
+        properties = {"x": i, "y": i, "width": 50, "height": 30}
+        state.add_object("bench", {"id": f"o{i}", "type": "rectangle", "properties": properties})
+    state.dirty.clear()
+    return state
+
+
+def _reset_handlers(board_id: str):
+    handlers.state.evict_board(board_id)
+    handlers.forget_board(board_id)
+
+
+# BoardState
+
+
+@benchmark("state.add_user+remove_user")
+def bench_users(size: int, points: int):
+    state = BoardState()
+    state.get_or_create_board("bench")
+    sids = [f"sid{i}" for i in range(1000)]
+
+    def run():
+        for sid in sids:
+            state.add_user(sid, sid, sid, "bench")
+        for sid in sids:
+            state.remove_user(sid)
+
+    return len(sids) * 2, run
+
+
+@benchmark("state.get_board_users", sized=True)
+def bench_get_users(size: int, points: int):
+    state = BoardState()
+    state.get_or_create_board("bench")
+    users = min(size, 10000)
+    for i in range(users):
+        state.add_user(f"sid{i}", f"u{i}", f"User {i}", "bench")
+
+    def run():
+        for _ in range(100):
+            state.get_board_users("bench")
+
+    return 100, run
+
+
+@benchmark("state.append_stroke_points", sized=True)
+def bench_append(size: int, points: int):
+    state = _filled_state(size, points)
+    stroke = Stroke("live", user_id="u")
+    state.start_stroke("bench", stroke)
+    batch = _points(2)
+
+    def run():
+        for _ in range(1000):
+            state.append_stroke_points("bench", "live", batch)
+
+    return 1000, run
+
+
+@benchmark("state.stroke_lookup", sized=True)
+def bench_lookup(size: int, points: int):
+    state = _filled_state(size, points)
+    store = state.boards["bench"]["strokes"]
+    ids = [f"s{i}" for i in range(0, size, max(1, size // 1000))]
+
+    def run():
+        for stroke_id in ids:
+            store.get(stroke_id)
+
+    return len(ids), run
+
+
+@benchmark("state.update_object", sized=True)
+def bench_update_object(size: int, points: int):
+    state = _filled_state(size, points)
+    ids = [f"o{i}" for i in range(min(1000, size // 10))]
+
+    def run():
+        for i, object_id in enumerate(ids):
+            state.update_object("bench", object_id, {"x": i + 1, "y": i + 1})
+
+    return len(ids), run
+
+
+@benchmark("state.add+delete_object", sized=True)
+def bench_delete_object(size: int, points: int):
+    state = _filled_state(size, points)
+    objects = [
+        {"id": f"new{i}", "type": "ellipse", "properties": {"x": i, "y": i, "width": 10}}
+        for i in range(1000)
+    ]
+
+    def run():
+        for obj in objects:
+            state.add_object("bench", {**obj, "properties": dict(obj["properties"])})
+        for obj in objects:
+            state.delete_object("bench", obj["id"])
+
+    return len(objects) * 2, run
+
+
+@benchmark("board_state.json_encode", sized=True)
+def bench_board_state(size: int, points: int):
+    state = _filled_state(size, points)
+    board = state.boards["bench"]
+
+    def run():
+        json.dumps(
+            {
+                "board_id": "bench",
+                "strokes": [s.serialize("json") for s in board["strokes"]],
+                "objects": board["objects"].to_list(),
+                "layers": board["layers"],
+                "users": [],
+            }
+        )
+
+    return 1, run
+
+
+# Handlers
+
+
+@benchmark("handler.join_board+disconnect")
+def bench_join(size: int, points: int):
+    sids = [f"join{i}" for i in range(200)]
+
+    async def run():
+        for sid in sids:
+            await handlers.join_board(sid, {"board_id": "bench-join", "user_id": sid})
+        for sid in sids:
+            await handlers.disconnect(sid)
+        _reset_handlers("bench-join")
+
+    return len(sids) * 2, run
+
+
+@benchmark("handler.stroke_update")
+def bench_stroke_update(size: int, points: int):
+    batch = {"stroke_id": "live", "points": _points(2)}
+
+    async def run():
+        await handlers.join_board("drawer", {"board_id": "bench-draw", "user_id": "drawer"})
+        await handlers.stroke_start("drawer", {"stroke_id": "live"})
+        for _ in range(1000):
+            await handlers.stroke_update("drawer", batch)
+        await handlers.stroke_end("drawer", {"stroke_id": "live"})
+        await handlers.disconnect("drawer")
+        _reset_handlers("bench-draw")
+
+    return 1000, run
+
+
+@benchmark("handler.cursor_move")
+def bench_cursor_move(size: int, points: int):
+    async def run():
+        await handlers.join_board("mover", {"board_id": "bench-cursor", "user_id": "mover"})
+        for i in range(1000):
+            await handlers.cursor_move("mover", {"x": i, "y": i})
+        await handlers.disconnect("mover")
+        _reset_handlers("bench-cursor")
+
+    return 1000, run
+
+
+# Runner
+
+
+def _measure(run, repeat: int, loop: asyncio.AbstractEventLoop) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        if asyncio.iscoroutine(result):
+            loop.run_until_complete(result)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(
+    sizes: tuple[int, ...],
+    points: int,
+    repeat: int,
+    only: str | None = None,
+) -> dict:
+    """Run the registered benchmarks and return the results document."""
+    stub_sio()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = {}
+    try:
+        for name, (factory, sized) in BENCHMARKS.items():
+            if only and only not in name:
+                continue
+            for size in sizes if sized else (0,):
+                operations, run = factory(size, points)
+                timings = _measure(run, repeat, loop)
+                key = f"{name}[{size}]" if sized else name
+                results[key] = {
+                    "name": name,
+                    "size": size if sized else None,
+                    "operations": operations,
+                    "repeat": repeat,
+                    "per_op_us": {
+                        "min": round(min(timings) / operations * 1e6, 3),
+                        "median": round(statistics.median(timings) / operations * 1e6, 3),
+                    },
+                }
+                print(f"{key:45} {results[key]['per_op_us']['min']:>12.3f} us/op", flush=True)
+    finally:
+        loop.close()
+    return {
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "points_per_stroke": points,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict):
+    """Print per-benchmark ratios of current to baseline minimum times."""
+    print(f"\ncompared with {baseline.get('commit')} (ratio > 1 is slower):")
+    for key, result in current["results"].items():
+        previous = baseline.get("results", {}).get(key)
+        if previous is None or not previous["per_op_us"]["min"]:
+            continue
+        ratio = result["per_op_us"]["min"] / previous["per_op_us"]["min"]
+        print(f"{key:45} {ratio:>8.2f}x")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="Comma-separated board sizes (strokes) for sized benchmarks",
+    )
+    parser.add_argument("--points", type=int, default=20, help="Points per stroke")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Results file of a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    sizes = tuple(int(size) for size in args.sizes.split(",") if size)
+    document = run_all(sizes, args.points, args.repeat, args.only)
+    if args.output:
+        Path(args.output).write_text(json.dumps(document, indent=2))
+    if args.compare:
+        compare(document, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
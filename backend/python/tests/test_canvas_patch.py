@@ -0,0 +1,146 @@
+"""PATCH /api/boards/{id}/canvas against a document board row held in memory."""
+
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from app import database
+from app.api import boards
+from app.canvas_store import STORAGE_DOCUMENT
+from app.database import get_db
+from app.models.board import Board
+
+
+class FakeSession:
+    """Just enough of an AsyncSession for the PATCH route on a document board.
+
+    The revision UPDATE applies when ``base_revision`` matches; like the
+    row lock it stands for, it only becomes visible on commit.
+    """
+
+    def __init__(self, board: Board):
+        self.board = board
+        self.revision = board.canvas_revision  # committed
+        self.pending: int | None = None
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def execute(self, statement):
+        base = statement.compile().params["canvas_revision_1"]
+        self.pending = base + 1 if base == self.revision else None
+        return self
+
+    def scalar_one_or_none(self):
+        return self.pending
+
+    async def refresh(self, board, attributes):
+        for attribute in attributes:
+            value = self.revision if attribute == "canvas_revision" else None
+            setattr(board, attribute, value)
+
+    async def commit(self):
+        self.commits += 1
+        if self.pending is not None:
+            self.revision, self.pending = self.pending, None
+
+    async def rollback(self):
+        self.rollbacks += 1
+        self.pending = None
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def board(monkeypatch):
+    board = Board(
+        id=uuid4(),
+        name="Patched",
+        canvas_storage=STORAGE_DOCUMENT,
+        canvas_revision=3,
+        canvas_data={
+            "strokes": [{"id": "s1", "points": []}],
+            "objects": [{"id": "o1", "type": "rect", "properties": {"x": 1}}],
+        },
+    )
+    session = FakeSession(board)
+    monkeypatch.setattr(database, "async_session_maker", lambda: session)
+
+    async def get_editable_board(db, board_id, user):
+        return board, None
+
+    async def is_live(board_id):
+        return False
+
+    monkeypatch.setattr(boards, "get_editable_board", get_editable_board)
+    monkeypatch.setattr(boards.board_residency, "is_live", is_live)
+    return board, session
+
+
+async def patch(board: Board, base_revision: int, ops: list[dict]):
+    """Call the route the way FastAPI does, get_db's commit and rollback included."""
+    data = boards.BoardCanvasPatch(base_revision=base_revision, ops=ops)
+    dependency = get_db()
+    db = await anext(dependency)
+    try:
+        response = await boards.patch_board_canvas(board.id, data, None, db)
+    except HTTPException as e:
+        with pytest.raises(HTTPException):
+            await dependency.athrow(e)
+        raise
+    await anext(dependency, None)
+    return response
+
+
+@pytest.mark.asyncio
+async def test_ops_apply_in_order(board):
+    board, session = board
+    ops = [
+        {"op": "add", "kind": "objects", "id": "o2", "data": {"properties": {"x": 2}}},
+        {"op": "update", "kind": "objects", "id": "o2", "data": {"properties": {"x": 3}}},
+        {"op": "remove", "kind": "strokes", "id": "s1"},
+        {"op": "add", "kind": "strokes", "id": "s1", "data": {"points": [{"x": 1, "y": 1}]}},
+        {"op": "remove", "kind": "objects", "id": "o1"},
+    ]
+    response = await patch(board, 3, ops)
+
+    assert response.revision == 4 and session.revision == 4
+    assert board.canvas_data["objects"] == [{"id": "o2", "properties": {"x": 3}}]
+    assert board.canvas_data["strokes"] == [{"id": "s1", "points": [{"x": 1, "y": 1}]}]
+
+
+@pytest.mark.asyncio
+async def test_stale_base_revision_conflicts(board):
+    board, session = board
+    with pytest.raises(HTTPException) as raised:
+        await patch(board, 2, [{"op": "remove", "kind": "objects", "id": "o1"}])
+
+    assert raised.value.status_code == 409
+    assert raised.value.detail["revision"] == 3
+    assert session.revision == 3
+    assert [o["id"] for o in board.canvas_data["objects"]] == ["o1"]
+
+
+@pytest.mark.asyncio
+async def test_failed_op_rolls_the_whole_patch_back(board):
+    board, session = board
+    ops = [
+        {"op": "remove", "kind": "objects", "id": "o1"},
+        {"op": "update", "kind": "objects", "id": "missing", "data": {"properties": {}}},
+    ]
+    with pytest.raises(HTTPException) as raised:
+        await patch(board, 3, ops)
+
+    assert raised.value.status_code == 422
+    assert "Operation 1" in raised.value.detail
+    assert (session.revision, session.commits, session.rollbacks) == (3, 0, 1)
+    assert [o["id"] for o in board.canvas_data["objects"]] == ["o1"]
+    # The next patch against the same revision still applies
+    assert (await patch(board, 3, ops[:1])).revision == 4
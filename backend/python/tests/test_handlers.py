@@ -0,0 +1,216 @@
+"""Socket.io handlers called directly, with emits and room changes stubbed out."""
+
+import struct
+
+import pytest
+import pytest_asyncio
+
+from app import socket_handlers as handlers
+from app.realtime.codec import POINT_RECORD, valid_points
+from app.realtime.geometry import object_bounds, parse_bbox
+
+BOARD = "handlers-board"
+
+
+@pytest_asyncio.fixture
+async def joined(monkeypatch):
+    emitted = []
+
+    async def emit(event, data=None, **kwargs):
+        emitted.append((event, data))
+
+    async def noop(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(handlers.sio, "emit", emit)
+    monkeypatch.setattr(handlers.sio, "enter_room", noop)
+    monkeypatch.setattr(handlers.sio, "leave_room", noop)
+
+    async def join(sid: str, **data):
+        await handlers.join_board(sid, {"board_id": BOARD, **data})
+        return handlers.state.boards[BOARD]
+
+    yield join, emitted
+    for sid in list(handlers.state.board_users.get(BOARD, ())):
+        await handlers.disconnect(sid)
+    handlers.state.evict_board(BOARD)
+    handlers.forget_board(BOARD)
+
+
+def test_valid_points_drops_malformed_points():
+    points = [
+        {"x": 1, "y": 2},
+        {"x": "1", "y": 2},
+        {"y": 2},
+        {"x": float("nan"), "y": 2},
+        {"x": True, "y": 2},
+        {"x": 1, "y": 2, "pressure": None},
+        {"x": 1, "y": 2, "timestamp": "soon"},
+        {"x": 1e39, "y": 2},
+        "point",
+        {"x": 3.5, "y": 4, "pressure": 0.2, "tilt": 0.1, "timestamp": None},
+    ]
+    assert valid_points(points) == [points[0], points[-1]]
+    assert valid_points({"x": 1, "y": 2}) is None
+
+
+def test_object_bounds_ignores_bad_properties():
+    assert object_bounds({"properties": {"x": 1, "y": 2, "width": "wide"}}) is None
+    assert object_bounds({"properties": {"x": 1, "y": 2, "stroke_width": [3]}}) is None
+    assert object_bounds({"properties": {"x": 1, "y": float("inf")}}) is None
+    assert object_bounds({"properties": ["x", "y"]}) is None
+    assert object_bounds({"properties": {"x": 1, "y": 2, "width": 3}}) == (1, 2, 4, 2)
+
+
+def test_parse_bbox_rejects_non_finite_boxes():
+    assert parse_bbox([3, 4, 1, 2]) == (1, 2, 3, 4)
+    assert parse_bbox(["1", 2, 3, 4]) == (1, 2, 3, 4)
+    assert parse_bbox([0, 0, float("nan"), 1]) is None
+    assert parse_bbox([float("-inf"), 0, 1, 1]) is None
+    assert parse_bbox(["inf", 0, 1, 1]) is None
+    assert parse_bbox([0, 0, 1]) is None
+
+
+@pytest.mark.asyncio
+async def test_malformed_stroke_updates_are_dropped(joined):
+    join, _ = joined
+    board = await join("sid-1")
+    await handlers.stroke_start("sid-1", {"stroke_id": "s1", "size": "huge"})
+    for points in (
+        "points",
+        [{"x": "a", "y": 1}],
+        [{"x": 1}],
+        [{"x": 1, "y": 2, "pressure": "hard"}],
+        [{"x": 1, "y": 2, "timestamp": [1]}],
+    ):
+        await handlers.stroke_update("sid-1", {"stroke_id": "s1", "points": points})
+    await handlers.stroke_update(
+        "sid-1", {"stroke_id": "s1", "points": [{"x": 1, "y": 2}, {"x": None, "y": 3}]}
+    )
+
+    stroke = board["strokes"].get("s1")
+    assert stroke.size == 2
+    assert [(p["x"], p["y"]) for p in stroke.points()] == [(1, 2)]
+
+
+@pytest.mark.asyncio
+async def test_malformed_binary_stroke_updates_are_dropped(joined):
+    join, _ = joined
+    board = await join("sid-1", point_format="binary")
+    await handlers.stroke_start("sid-1", {"stroke_id": "s1", "t0": "now"})
+    record = POINT_RECORD.pack(1.0, 2.0, 128, 0, 5)
+    await handlers.stroke_update("sid-1", {"stroke_id": "s1", "points_bin": record, "t0": "x"})
+    await handlers.stroke_update("sid-1", {"stroke_id": "s1", "points_bin": record[:-1]})
+    nan = struct.pack("<ffBbH", float("nan"), 2.0, 128, 0, 5)
+    await handlers.stroke_update("sid-1", {"stroke_id": "s1", "points_bin": nan, "t0": 0})
+    await handlers.stroke_update("sid-1", {"stroke_id": "s1", "points": [{"x": 3, "y": 4}]})
+
+    stroke = board["strokes"].get("s1")
+    assert stroke.t0 == 0
+    assert stroke.point_count == 2
+
+
+@pytest.mark.asyncio
+async def test_malformed_objects_are_dropped(joined):
+    join, _ = joined
+    board = await join("sid-1")
+    await handlers.object_add("sid-1", {"object_id": "o1", "properties": "square"})
+    assert board["objects"].get("o1") is None
+
+    await handlers.object_add(
+        "sid-1", {"object_id": "o1", "properties": {"x": 1, "y": 1, "width": "wide"}}
+    )
+    await handlers.object_update("sid-1", {"object_id": "o1", "properties": ["x", 5]})
+    await handlers.object_update(
+        "sid-1", {"object_id": "o1", "properties": {"height": {"cm": 3}}}
+    )
+
+    assert board["objects"].get("o1")["properties"] == {
+        "x": 1,
+        "y": 1,
+        "width": "wide",
+        "height": {"cm": 3},
+    }
+
+
+@pytest.mark.asyncio
+async def test_replaced_canvas_reaches_clients(joined):
+    join, emitted = joined
+    await join("sid-1")
+    await handlers.object_add("sid-1", {"object_id": "o1", "properties": {"x": 1, "y": 1}})
+    epoch, seq = await handlers.oplog.head(BOARD)
+    emitted.clear()
+
+    canvas = {"objects": [{"id": "o2", "type": "rect", "properties": {"x": 5, "y": 5}}]}
+    await handlers.board_residency.replace_canvas(BOARD, canvas, 3)
+    handlers.board_residency.persistence.forget(BOARD)
+
+    [(event, data)] = emitted
+    assert event == "board_state"
+    assert [o["id"] for o in data["objects"]] == ["o2"]
+    assert BOARD not in handlers.state.dirty
+    # A client from before the write cannot catch up with deltas
+    assert await handlers.oplog.since(BOARD, epoch, seq) is None
+
+
+@pytest.mark.asyncio
+async def test_patched_canvas_reaches_clients_as_events(joined):
+    join, emitted = joined
+    board = await join("sid-1")
+    await handlers.object_add("sid-1", {"object_id": "o1", "properties": {"x": 1, "y": 1}})
+    epoch, seq = await handlers.oplog.head(BOARD)
+    emitted.clear()
+
+    ops = [
+        {"op": "update", "kind": "objects", "id": "o1", "data": {"properties": {"x": 2, "y": 1}}},
+        {"op": "add", "kind": "objects", "id": "o2", "data": {"properties": {"x": 5, "y": 5}}},
+        {"op": "add", "kind": "strokes", "id": "s1", "data": {"points": [{"x": 1, "y": 2}]}},
+    ]
+    assert await handlers.board_residency.patch_canvas(BOARD, ops, 4, "u1")
+    assert handlers.board_residency.persistence.revisions[BOARD] == 4
+    handlers.board_residency.persistence.forget(BOARD)
+
+    assert board["objects"].get("o1")["properties"] == {"x": 2, "y": 1}
+    assert board["strokes"].get("s1").point_count == 1
+    events = [event for event, _ in emitted]
+    assert events[:3] == ["object_updated", "object_added", "stroke_start"]
+    assert events[-1] == "stroke_end" and "board_state" not in events
+    # Clients from before the patch catch up with deltas
+    replay = await handlers.oplog.since(BOARD, epoch, seq)
+    assert [op[1] for op in replay] == [
+        "object_updated", "object_added", "stroke_start", "stroke_update", "stroke_end"
+    ]
+
+    emitted.clear()
+    removal = [{"op": "remove", "kind": "strokes", "id": "s1"}]
+    assert not await handlers.board_residency.patch_canvas(BOARD, removal, 5)
+    assert emitted == [] and board["strokes"].get("s1") is not None
+
+
+@pytest.mark.asyncio
+async def test_non_finite_viewports_are_ignored(joined):
+    join, _ = joined
+    await join("sid-1")
+    interest = handlers.viewport_interest
+
+    await handlers.viewport_update("sid-1", {"bbox": [0, 0, 100, float("nan")]})
+    assert "sid-1" not in interest.watchers(BOARD)
+    await handlers.viewport_update("sid-1", {"bbox": [0, 0, 100, 100], "scale": 1e-320})
+    assert interest.watchers(BOARD)["sid-1"] == (0, 0, 100, 100)
+    await handlers.viewport_update("sid-1", {"bbox": [0, 0, 100, 100], "scale": "inf"})
+    assert interest.watchers(BOARD)["sid-1"] == (-256, -256, 356, 356)
+
+
+@pytest.mark.asyncio
+async def test_malformed_cursor_samples_are_dropped(joined):
+    join, _ = joined
+    await join("sid-1")
+    cursors = handlers.cursor_presence.cursors
+    for x, y in (("a", 1), (float("nan"), 1), (1, float("inf")), (True, 1), (None, 1)):
+        await handlers.cursor_move("sid-1", {"x": x, "y": y})
+    assert "sid-1" not in cursors.get(BOARD, {})
+
+    await handlers.cursor_move("sid-1", {"x": 3, "y": 4.5})
+    await handlers.cursor_move("sid-1", {"x": [3], "y": 5})
+    cursor = cursors[BOARD]["sid-1"]
+    assert (cursor["x"], cursor["y"]) == (3, 4.5)
@@ -0,0 +1,87 @@
+"""Op log seqs and delta ranges, in memory and shared through fakeredis."""
+
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.realtime.codec import POINT_RECORD
+from app.realtime.oplog import OpLog, RedisOpLog
+
+BOARD = "board-1"
+
+
+def redis_log(server: fakeredis.FakeServer, size: int = 3) -> RedisOpLog:
+    redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    return RedisOpLog(redis, size, prefix="test", ttl=60)
+
+
+@pytest.mark.asyncio
+async def test_memory_log_covers_recent_ops():
+    log = OpLog(2)
+    epoch, seq = await log.head(BOARD)
+    assert seq == 0
+    for n in range(3):
+        assert await log.append(BOARD, "object_add", {"n": n}, "sid-1") == n + 1
+
+    assert await log.head(BOARD) == (epoch, 3)
+    assert [op[0] for op in await log.since(BOARD, epoch, 1)] == [2, 3]
+    assert await log.since(BOARD, epoch, 0) is None
+    assert await log.since(BOARD, "other", 2) is None
+
+
+@pytest.mark.asyncio
+async def test_redis_log_is_shared_by_nodes():
+    server = fakeredis.FakeServer()
+    a, b = redis_log(server), redis_log(server)
+
+    seqs = await asyncio.gather(
+        *(log.append(BOARD, "object_add", {"n": n}, "sid-1") for n, log in enumerate((a, b, a)))
+    )
+    assert sorted(seqs) == [1, 2, 3]
+    # Appends on one node resume in the order they were made
+    assert seqs[0] < seqs[2]
+
+    epoch, seq = await a.head(BOARD)
+    assert await b.head(BOARD) == (epoch, 3)
+    ops = await b.since(BOARD, epoch, 1)
+    assert [op[0] for op in ops] == [2, 3]
+    assert {op[2]["n"] for op in ops} == {n for n, s in enumerate(seqs) if s > 1}
+    assert await b.append(BOARD, "clear", {}, None) == 4
+    # Trimmed to seqs 2-4: a client at seq 1 can still catch up, one at 0 not
+    assert await a.since(BOARD, epoch, 1) is not None
+    assert await a.since(BOARD, epoch, 0) is None
+    assert await a.since(BOARD, "other", 3) is None
+
+
+@pytest.mark.asyncio
+async def test_redis_log_keeps_binary_points():
+    log = redis_log(fakeredis.FakeServer())
+    record = POINT_RECORD.pack(1.0, 2.0, 128, 0, 5)
+    await log.append(BOARD, "stroke_update", {"stroke_id": "s1", "points_bin": record, "t0": 7})
+
+    epoch, _ = await log.head(BOARD)
+    [(seq, event, data, sid)] = await log.since(BOARD, epoch, 0)
+    assert (seq, event, sid) == (1, "stroke_update", None)
+    assert data == {"stroke_id": "s1", "points_bin": record, "t0": 7}
+
+
+@pytest.mark.asyncio
+async def test_failed_redis_write_starts_new_epoch(monkeypatch):
+    log = redis_log(fakeredis.FakeServer())
+    await log.append(BOARD, "clear", {})
+    epoch, _ = await log.head(BOARD)
+    write_batch = log._write_batch
+
+    async def failing_write_batch(board_id, batch):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(log, "_write_batch", failing_write_batch)
+    assert await log.append(BOARD, "clear", {}) is None
+    monkeypatch.setattr(log, "_write_batch", write_batch)
+    assert await log.append(BOARD, "clear", {}) == 2
+
+    new_epoch, seq = await log.head(BOARD)
+    assert new_epoch != epoch
+    assert seq == 2
+    assert await log.since(BOARD, epoch, 1) is None
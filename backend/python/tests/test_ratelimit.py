@@ -0,0 +1,118 @@
+"""Token buckets and coalescing of the Socket.io event rate limiter."""
+
+import pytest
+
+from app.realtime import ratelimit
+from app.realtime.ratelimit import EventRateLimiter, TokenBucket, merge_stroke_updates
+
+BOARD = "board-1"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_bursts_and_refills_at_rate():
+    bucket = TokenBucket(rate=2, burst=3, now=0.0)
+    assert [bucket.take(0.0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == pytest.approx(0.5)
+    assert not bucket.take(0.25)
+    assert bucket.take(0.5)
+    # Refills stop at the burst size
+    assert [bucket.take(60.0) for _ in range(4)] == [True, True, True, False]
+
+
+def test_board_limit_does_not_use_up_client_tokens(clock):
+    limiter = EventRateLimiter(
+        {"object_add": (1, 2)}, board_limits={"object_add": (1, 1)}, warn_interval=0
+    )
+    assert limiter.allow("sid-1", BOARD, "object_add")
+    # The board bucket is empty: refused without taking sid-1's second token
+    assert not limiter.allow("sid-1", BOARD, "object_add")
+    assert limiter._buckets[("sid-1", "object_add")].tokens == pytest.approx(1)
+
+    assert limiter.allow("sid-1", "board-2", "object_add")
+    assert not limiter.allow("sid-1", "board-3", "object_add")
+    assert limiter.allow("sid-1", None, "cursor_move")
+
+
+def test_stroke_updates_merge_only_with_the_same_stroke_and_format():
+    merged = merge_stroke_updates(
+        {"stroke_id": "s1", "points": [{"x": 1, "y": 1}]},
+        {"stroke_id": "s1", "points": [{"x": 2, "y": 2}]},
+    )
+    assert merged == {"stroke_id": "s1", "points": [{"x": 1, "y": 1}, {"x": 2, "y": 2}]}
+    assert merge_stroke_updates(
+        {"stroke_id": "s1", "points_bin": b"ab", "t0": 5},
+        {"stroke_id": "s1", "points_bin": bytearray(b"cd"), "t0": 5},
+    ) == {"stroke_id": "s1", "points_bin": b"abcd", "t0": 5}
+    assert merge_stroke_updates({"stroke_id": "s1"}, {"stroke_id": "s2"}) is None
+    binary = {"stroke_id": "s1", "points_bin": b"cd"}
+    for pending, data in (
+        ({"stroke_id": "s1", "points_bin": b"ab", "t0": 5}, binary),
+        ({"stroke_id": "s1", "points": []}, binary),
+        ({"stroke_id": "s1", "points": "a"}, {"stroke_id": "s1", "points": []}),
+    ):
+        assert merge_stroke_updates(pending, data) is None
+
+
+class FakeServer:
+    def __init__(self, handled: list):
+        async def stroke_update(sid, data):
+            handled.append(("stroke_update", data))
+
+        async def stroke_end(sid, data):
+            handled.append(("stroke_end", data))
+
+        self.handlers = {"/": {"stroke_update": stroke_update, "stroke_end": stroke_end}}
+
+
+@pytest.mark.asyncio
+async def test_throttled_stroke_updates_are_coalesced_before_the_next_event(clock):
+    handled = []
+    sio = FakeServer(handled)
+    limiter = EventRateLimiter(
+        {"stroke_update": (10, 1)},
+        coalesce={"stroke_update": merge_stroke_updates},
+        warn_interval=0,
+    )
+    limiter.install(sio, board_of=lambda sid: BOARD)
+    update = sio.handlers["/"]["stroke_update"]
+    end = sio.handlers["/"]["stroke_end"]
+
+    for x in range(3):
+        await update("sid-1", {"stroke_id": "s1", "points": [{"x": x, "y": 0}]})
+    await end("sid-1", {"stroke_id": "s1"})
+
+    assert handled == [
+        ("stroke_update", {"stroke_id": "s1", "points": [{"x": 0, "y": 0}]}),
+        ("stroke_update", {"stroke_id": "s1", "points": [{"x": 1, "y": 0}, {"x": 2, "y": 0}]}),
+        ("stroke_end", {"stroke_id": "s1"}),
+    ]
+    assert limiter.coalesced == {"stroke_update": 2}
+    assert limiter.throttled == {"sid-1": 2}
+    assert not limiter._pending
+
+
+@pytest.mark.asyncio
+async def test_held_updates_go_out_with_the_next_allowed_update(clock):
+    handled = []
+    sio = FakeServer(handled)
+    limiter = EventRateLimiter(
+        {"stroke_update": (10, 1)},
+        coalesce={"stroke_update": merge_stroke_updates},
+        warn_interval=0,
+    )
+    limiter.install(sio, board_of=lambda sid: BOARD)
+    update = sio.handlers["/"]["stroke_update"]
+
+    await update("sid-1", {"stroke_id": "s1", "points": [{"x": 0, "y": 0}]})
+    await update("sid-1", {"stroke_id": "s1", "points": [{"x": 1, "y": 0}]})
+    clock[0] += 0.2
+    await update("sid-1", {"stroke_id": "s1", "points": [{"x": 2, "y": 0}]})
+
+    assert [len(data["points"]) for _, data in handled] == [1, 2]
+    assert not limiter._pending
@@ -0,0 +1,284 @@
+"""Two BoardState replicas kept in sync through RedisBoardSync and fakeredis."""
+
+import asyncio
+
+import fakeredis
+import pytest
+import pytest_asyncio
+
+from app.realtime.redis_sync import RedisBoardSync
+from app.realtime.state import BoardState
+from app.realtime.stroke import Stroke
+
+BOARD = "board-1"
+
+
+@pytest_asyncio.fixture
+async def nodes():
+    server = fakeredis.FakeServer()
+    syncs = []
+
+    async def node(heartbeat: float = 10.0) -> RedisBoardSync:
+        redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        sync = RedisBoardSync(redis, BoardState(), prefix="test", heartbeat=heartbeat)
+        await sync.start()
+        syncs.append(sync)
+        return sync
+
+    yield node
+    for sync in syncs:
+        await sync.stop()
+
+
+async def settle(*syncs: RedisBoardSync):
+    """Wait until queued ops are written and published ops are applied."""
+    for _ in range(3):
+        for sync in syncs:
+            await sync._queue.join()
+        await asyncio.sleep(0.05)
+
+
+def content(state: BoardState) -> dict:
+    board = state.boards[BOARD]
+    return {
+        "strokes": [(s.id, s.completed, s.points()) for s in board["strokes"]],
+        "objects": board["objects"].to_list(),
+    }
+
+
+def draw(sync: RedisBoardSync, stroke_id: str, points: list[dict]):
+    state = sync.state
+    stroke = Stroke(stroke_id, user_id="u1")
+    state.start_stroke(BOARD, stroke)
+    sync.publish(BOARD, {"type": "stroke_start", "stroke": stroke.metadata()})
+    state.append_stroke_points(BOARD, stroke_id, points)
+    sync.publish(BOARD, {"type": "stroke_points", "stroke_id": stroke_id, "points": points})
+    state.end_stroke(BOARD, stroke_id)
+    sync.publish(BOARD, {"type": "stroke_end", "stroke_id": stroke_id})
+
+
+def add_object(sync: RedisBoardSync, object_id: str):
+    obj = sync.state.add_object(
+        BOARD, {"id": object_id, "type": "rect", "properties": {"x": 1, "y": 2}}
+    )
+    sync.publish(BOARD, {"type": "object_add", "object": obj})
+
+
+POINTS = [{"x": 1.0, "y": 2.0, "pressure": 0.5, "tilt": 0.0, "timestamp": 10}]
+
+
+@pytest.mark.asyncio
+async def test_ops_reach_the_other_replica(nodes):
+    a, b = await nodes(), await nodes()
+    a.state.get_or_create_board(BOARD)
+    await b.load_board(BOARD)
+
+    draw(a, "s1", POINTS)
+    add_object(a, "o1")
+    await settle(a, b)
+
+    assert content(b.state) == content(a.state)
+    assert [s.id for s in b.state.boards[BOARD]["strokes"]] == ["s1"]
+    assert b.state.boards[BOARD]["objects"].get("o1")["properties"] == {"x": 1, "y": 2}
+
+
+@pytest.mark.asyncio
+async def test_joining_replica_loads_snapshot(nodes):
+    a, b = await nodes(), await nodes()
+    a.state.get_or_create_board(BOARD)
+    draw(a, "s1", POINTS)
+    add_object(a, "o1")
+    await settle(a)
+
+    await b.load_board(BOARD)
+
+    assert b.snapshot_seq(BOARD) == 4
+    assert content(b.state) == content(a.state)
+
+
+@pytest.mark.asyncio
+async def test_failed_op_resyncs_replica(nodes):
+    a, b = await nodes(), await nodes()
+    a.state.get_or_create_board(BOARD)
+    await b.load_board(BOARD)
+    resynced = []
+
+    async def on_resync(board_id):
+        resynced.append(board_id)
+
+    b.on_resync = on_resync
+    # b misses the stroke_start, so the points cannot be applied
+    draw(a, "s1", POINTS)
+    await a._queue.join()
+    b.state.boards[BOARD]["strokes"].clear()
+    b.state.boards[BOARD]["active_strokes"].clear()
+    b.resync(BOARD)
+    await settle(a, b)
+
+    assert resynced == [BOARD]
+    assert content(b.state) == content(a.state)
+
+
+@pytest.mark.asyncio
+async def test_listener_resubscribes(nodes):
+    a, b = await nodes(), await nodes()
+    a.state.get_or_create_board(BOARD)
+    await b.load_board(BOARD)
+
+    await b._pubsub.aclose()
+    draw(a, "s1", POINTS)
+    await settle(a, b)
+    await asyncio.sleep(1)
+    await settle(a, b)
+
+    assert content(b.state) == content(a.state)
+
+
+@pytest.mark.asyncio
+async def test_failed_write_republishes_board(nodes, monkeypatch):
+    a, b = await nodes(), await nodes()
+    a.state.get_or_create_board(BOARD)
+    await b.load_board(BOARD)
+    write_batch = a._write_batch
+    failures = [RuntimeError("connection lost")]
+
+    async def flaky_write_batch(batch):
+        if failures:
+            raise failures.pop()
+        await write_batch(batch)
+
+    monkeypatch.setattr(a, "_write_batch", flaky_write_batch)
+    draw(a, "s1", POINTS)
+    add_object(a, "o1")
+    await settle(a, b)
+    await asyncio.sleep(0.6)
+    await settle(a, b)
+
+    assert not a._republish
+    assert content(b.state) == content(a.state)
+    c = await nodes()
+    await c.load_board(BOARD)
+    assert content(c.state) == content(a.state)
+
+
+@pytest.mark.asyncio
+async def test_board_keys_expire(nodes):
+    a = await nodes()
+    a.state.get_or_create_board(BOARD)
+    draw(a, "s1", POINTS)
+    await settle(a)
+
+    for name in ("seq", "strokes", "ptlen", "completed", "order", "points:s1"):
+        assert 0 < await a.redis.ttl(a._key(BOARD, name)) <= a.board_ttl
+
+
+@pytest.mark.asyncio
+async def test_users_of_dead_node_are_pruned(nodes):
+    # Without a heartbeat task, a's node key lapses after a second
+    a, b = await nodes(heartbeat=0), await nodes(heartbeat=0.2)
+    a.state.get_or_create_board(BOARD)
+    a.state.add_user("sid-a", "u1", "Ann", BOARD)
+    a.publish(BOARD, {"type": "user_join", "sid": "sid-a", "user": a.state.users["sid-a"]})
+    await settle(a)
+    await b.load_board(BOARD)
+    assert list(b.state.remote_users[BOARD]) == ["sid-a"]
+    assert "node" not in b.state.remote_users[BOARD]["sid-a"]
+    pruned = []
+
+    async def on_users_pruned(board_id, sids):
+        pruned.append((board_id, sids))
+
+    b.on_users_pruned = on_users_pruned
+    await asyncio.sleep(1.5)
+
+    assert pruned == [(BOARD, ["sid-a"])]
+    assert b.state.remote_users[BOARD] == {}
+    assert await b.redis.hgetall(b._key(BOARD, "users")) == {}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_clear_and_add_converge(nodes, monkeypatch):
+    a, b = await nodes(), await nodes()
+    a.state.get_or_create_board(BOARD)
+    await b.load_board(BOARD)
+    resynced = []
+
+    async def on_resync(board_id):
+        resynced.append(board_id)
+
+    b.on_resync = on_resync
+    # Hold b's writes back so that a's clear gets the lower seq
+    gate = asyncio.Event()
+    write_batch = b._write_batch
+
+    async def held_write_batch(batch):
+        await gate.wait()
+        await write_batch(batch)
+
+    monkeypatch.setattr(b, "_write_batch", held_write_batch)
+    add_object(b, "o1")
+    a.state.clear_board(BOARD)
+    a.publish(BOARD, {"type": "clear"})
+    await settle(a)
+    # b applied the clear after its own add, in the opposite order to Redis
+    assert b.state.boards[BOARD]["objects"].to_list() == []
+
+    gate.set()
+    await settle(a, b)
+
+    assert resynced == [BOARD]
+    assert [o["id"] for o in a.state.boards[BOARD]["objects"]] == ["o1"]
+    assert content(b.state) == content(a.state)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_object_updates_merge_in_seq_order(nodes, monkeypatch):
+    a, b = await nodes(), await nodes()
+    a.state.get_or_create_board(BOARD)
+    add_object(a, "o1")
+    await settle(a)
+    await b.load_board(BOARD)
+    gate = asyncio.Event()
+    write_batch = b._write_batch
+
+    async def held_write_batch(batch):
+        await gate.wait()
+        await write_batch(batch)
+
+    monkeypatch.setattr(b, "_write_batch", held_write_batch)
+    b.state.update_object(BOARD, "o1", {"x": 7, "y": 8})
+    b.publish(BOARD, {"type": "object_update", "object_id": "o1", "properties": {"x": 7, "y": 8}})
+    a.state.update_object(BOARD, "o1", {"x": 5})
+    a.publish(BOARD, {"type": "object_update", "object_id": "o1", "properties": {"x": 5}})
+    await settle(a)
+    gate.set()
+    await settle(a, b)
+
+    # b's update has the higher seq, so it wins everywhere
+    assert a.state.boards[BOARD]["objects"].get("o1")["properties"] == {"x": 7, "y": 8}
+    assert content(b.state) == content(a.state)
+    c = await nodes()
+    await c.load_board(BOARD)
+    assert content(c.state) == content(a.state)
+
+
+@pytest.mark.asyncio
+async def test_settings_reach_nodes_holding_the_board(nodes):
+    a, b = await nodes(), await nodes()
+    a.state.get_or_create_board(BOARD)
+    await b.load_board(BOARD)
+    applied = []
+    b.on_settings = lambda board_id, settings: applied.append((board_id, settings))
+    resynced = []
+
+    async def on_resync(board_id):
+        resynced.append(board_id)
+
+    b.on_resync = on_resync
+    add_object(a, "o1")
+    a.publish(BOARD, {"type": "settings", "settings": {"stroke_simplify_tolerance": 2}})
+    await settle(a, b)
+
+    assert applied == [(BOARD, {"stroke_simplify_tolerance": 2})]
+    assert resynced == []
+    assert content(b.state) == content(a.state)
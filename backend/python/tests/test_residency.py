@@ -0,0 +1,126 @@
+"""Canvases written through the API replacing resident boards."""
+
+import asyncio
+import json
+from uuid import uuid4
+
+import pytest
+
+from app.canvas_store import STORAGE_DOCUMENT
+from app.realtime.persistence import BoardPersistence
+from app.realtime.residency import BoardResidency
+from app.realtime.state import BoardState
+from app.realtime.writer import WriteBehindPersister
+
+
+class MemoryPersistence(BoardPersistence):
+    """BoardPersistence over a dict of document rows instead of a database."""
+
+    def __init__(self):
+        super().__init__(session_maker=None)
+        self.rows: dict[str, dict] = {}  # board_id -> {"revision", "canvas"}
+        self.gate: asyncio.Event | None = None  # holds saves back while unset
+
+    def canvas(self, board_id: str) -> dict:
+        return json.loads(self.rows[board_id]["canvas"])
+
+    def write(self, board_id: str, canvas: dict) -> int:
+        """What an API write does to the row: new content and revision."""
+        row = self.rows.setdefault(board_id, {"revision": 0})
+        row["revision"] += 1
+        row["canvas"] = json.dumps(canvas)
+        return row["revision"]
+
+    async def load(self, board_id: str):
+        row = self.rows.get(board_id)
+        if row is None:
+            return None
+        self.storage[board_id] = STORAGE_DOCUMENT
+        self.revisions[board_id] = row["revision"]
+        return self.canvas(board_id), {}
+
+    async def load_settings(self, board_id: str):
+        return {}
+
+    async def save(self, canvases):
+        if self.gate is not None:
+            await self.gate.wait()
+        saved = set()
+        for board_id, (revision, canvas) in canvases.items():
+            row = self.rows[board_id]
+            if revision != row["revision"]:
+                self.revisions[board_id] = row["revision"]
+            else:
+                row["canvas"] = canvas
+                saved.add(board_id)
+        return saved
+
+
+def obj(object_id: str) -> dict:
+    return {"id": object_id, "type": "rect", "properties": {"x": 1, "y": 2}}
+
+
+@pytest.fixture
+def board():
+    state = BoardState()
+    persistence = MemoryPersistence()
+    residency = BoardResidency(state, persistence, sweep_interval=0)
+    persister = WriteBehindPersister(state, persistence)
+    replaced = []
+
+    async def on_replace(board_id):
+        replaced.append(board_id)
+
+    residency.on_replace = on_replace
+    board_id = str(uuid4())
+    persistence.write(board_id, {"objects": [obj("o1")]})
+    return board_id, state, persistence, residency, persister, replaced
+
+
+@pytest.mark.asyncio
+async def test_api_write_replaces_dirty_board(board):
+    board_id, state, persistence, residency, persister, replaced = board
+    await residency.get_board(board_id)
+    state.add_object(board_id, obj("live"))
+    assert board_id in state.dirty
+
+    revision = persistence.write(board_id, {"objects": [obj("put")]})
+    await residency.replace_canvas(board_id, persistence.canvas(board_id), revision)
+    await persister.flush(list(state.dirty))
+
+    assert replaced == [board_id]
+    assert [o["id"] for o in state.boards[board_id]["objects"]] == ["put"]
+    assert persistence.canvas(board_id)["objects"] == [obj("put")]
+
+
+@pytest.mark.asyncio
+async def test_snapshot_from_before_api_write_is_not_saved(board):
+    board_id, state, persistence, residency, persister, _ = board
+    await residency.get_board(board_id)
+    state.add_object(board_id, obj("live"))
+    persistence.gate = asyncio.Event()
+    # The flush snapshots the board, then waits for the database
+    flush = asyncio.create_task(persister.flush([board_id]))
+    await asyncio.sleep(0.05)
+
+    revision = persistence.write(board_id, {"objects": [obj("put")]})
+    await residency.replace_canvas(board_id, persistence.canvas(board_id), revision)
+    state.add_object(board_id, obj("after"))
+    persistence.gate.set()
+    await flush
+    assert persistence.canvas(board_id)["objects"] == [obj("put")]
+
+    # Edits made after the write are saved on top of it
+    await persister.flush(list(state.dirty))
+    assert [o["id"] for o in persistence.canvas(board_id)["objects"]] == ["put", "after"]
+    assert persistence.rows[board_id]["revision"] == revision
+
+
+@pytest.mark.asyncio
+async def test_api_write_to_idle_board_is_left_to_the_next_load(board):
+    board_id, state, persistence, residency, _, replaced = board
+    revision = persistence.write(board_id, {"objects": [obj("put")]})
+    await residency.replace_canvas(board_id, persistence.canvas(board_id), revision)
+
+    assert board_id not in state.boards
+    assert replaced == []
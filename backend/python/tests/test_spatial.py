@@ -0,0 +1,55 @@
+"""Grid index queries across cell edges, negative coordinates and large boxes."""
+
+from app.realtime.spatial import MAX_CELLS_PER_ELEMENT, GridIndex
+
+
+def test_query_finds_boxes_across_cell_edges():
+    index = GridIndex(cell_size=10)
+    index.insert("a", (8, 8, 12, 12))  # four cells
+    index.insert("b", (20, 0, 20, 0))  # a point on a cell edge
+    index.insert("c", (0, 0, 9.5, 9.5))
+
+    assert index.query((11, 11, 15, 15)) == {"a"}
+    # Touching counts, and (20, 0) sits in the cell that starts there
+    assert index.query((12, 0, 20, 8)) == {"a", "b"}
+    assert index.query((19.9, -1, 19.99, 1)) == set()
+    # Same cell, boxes apart
+    assert index.query((9.6, 0, 9.9, 1)) == set()
+
+
+def test_query_with_negative_coordinates():
+    index = GridIndex(cell_size=10)
+    index.insert("a", (-15, -15, -11, -11))  # cell (-2, -2)
+    index.insert("b", (-1, -1, 1, 1))  # cells -1..0 on both axes
+    index.insert("c", (-10, -10, -10, -10))  # on the edge of cell (-1, -1)
+
+    assert index.query((-12, -12, -12, -12)) == {"a"}
+    assert index.query((-0.5, 0.5, -0.5, 0.5)) == {"b"}
+    assert index.query((-10, -10, -9, -9)) == {"c"}
+    assert index.query((-30, -30, 30, 30)) == {"a", "b", "c"}
+    assert index.query((-9.5, -9.5, -1.5, -1.5)) == set()
+
+
+def test_extend_and_remove_keep_cells_in_sync():
+    index = GridIndex(cell_size=10)
+    index.insert("s", (0, 0, 1, 1))
+    index.extend("s", (-25, 3, -24, 4))
+    assert index.box("s") == (-25, 0, 1, 4)
+    assert index.query((-15, 2, -14, 2)) == {"s"}
+
+    index.remove("s")
+    assert index.query((-30, -30, 30, 30)) == set()
+    assert not index._cells
+
+
+def test_large_boxes_are_found_without_cells():
+    index = GridIndex(cell_size=1)
+    side = MAX_CELLS_PER_ELEMENT
+    index.insert("big", (-side, -side, side, side))
+    index.insert("small", (0, 0, 0, 0))
+
+    assert "big" in index._large
+    assert index.query((-side, side, -side, side)) == {"big"}
+    assert index.query((1e6, 1e6, 1e6 + 1, 1e6 + 1)) == set()
+    # A query wider than the populated cells walks the occupied ones
+    assert index.query((-1e9, -1e9, 1e9, 1e9)) == {"big", "small"}
@@ -0,0 +1,32 @@
+"""Stroke point storage across the JSON and binary point formats."""
+
+from app.realtime.codec import encode_points
+from app.realtime.stroke import Stroke
+
+
+def point(x: float, timestamp: int) -> dict:
+    return {"x": x, "y": 0.0, "pressure": 0.5, "tilt": 0.0, "timestamp": timestamp}
+
+
+def timestamps(stroke: Stroke) -> list[int]:
+    return [p["timestamp"] for p in stroke.points()]
+
+
+def test_json_points_on_binary_stroke_keep_their_timestamps():
+    stroke = Stroke("s1", t0=1000)
+    stroke.append_bin(encode_points([point(0, 1010), point(1, 1020)], 1000), 1000)
+    stroke.append_points([point(2, 1050), point(3, 1060)])
+    stroke.append_points([point(4, 1075)])
+
+    assert timestamps(stroke) == [1010, 1020, 1050, 1060, 1075]
+
+
+def test_binary_replacement_of_json_stroke_keeps_timestamps():
+    stroke = Stroke("s1")
+    stroke.append_points([point(0, 5000), point(1, 5010), point(2, 5030)])
+    # Records relative to a t0 before the first point, as binary strokes have
+    simplified = encode_points([point(0, 5000), point(2, 5030)], 4990)
+    stroke.replace_points(points_bin=simplified)
+
+    assert timestamps(stroke) == [5000, 5030]
+    assert [p["x"] for p in stroke.points()] == [0, 2]
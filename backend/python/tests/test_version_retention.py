@@ -0,0 +1,43 @@
+"""Retention tiers: which board versions are thinned out."""
+
+from datetime import datetime, timedelta, timezone
+
+from app.version_retention import _bucket, expired_versions
+
+NOW = datetime(2026, 1, 10, 12, 0, tzinfo=timezone.utc)
+# Keep everything for a day, hourly for a week, daily for 30 days
+TIERS = [(24, 0), (24 * 7, 1), (24 * 30, 24)]
+
+
+def versions(*ages_hours: float) -> list:
+    """``(id, created_at)`` of versions with the given ages, newest first."""
+    return [(f"v{age}", NOW - timedelta(hours=age)) for age in sorted(ages_hours)]
+
+
+def test_bucket_picks_the_first_tier_younger_than_its_max_age():
+    created = NOW - timedelta(hours=30)
+    assert _bucket(TIERS, 2, created) == ()
+    assert _bucket(TIERS, 30, created) == (1, int(created.timestamp() // 3600))
+    assert _bucket(TIERS, 24 * 10, created) == (2, int(created.timestamp() // 86400))
+    assert _bucket(TIERS, 24 * 31, created) is None
+    assert _bucket([(24, 1), (None, 24)], 24 * 365, created)[0] == 1
+
+
+def test_recent_versions_are_all_kept():
+    assert expired_versions(versions(0.1, 0.2, 5, 23), TIERS, NOW) == []
+
+
+def test_one_version_per_interval_is_kept():
+    # 30.2h and 30.5h share an hour (NOW is on the hour), 193h and 194h a day
+    expired = expired_versions(versions(30.2, 30.5, 31.5, 24 * 8 + 1, 24 * 8 + 2), TIERS, NOW)
+    assert expired == ["v30.5", f"v{24 * 8 + 2}"]
+
+
+def test_versions_older_than_every_tier_expire_but_the_newest_stays():
+    assert expired_versions(versions(24 * 40, 24 * 50), TIERS, NOW) == [f"v{24 * 50}"]
+    assert expired_versions([], TIERS, NOW) == []
+
+
+def test_newest_version_claims_its_interval():
+    # Same hour as the newest version: expired although the newest is kept anyway
+    assert expired_versions(versions(25.1, 25.4), TIERS, NOW) == ["v25.4"]
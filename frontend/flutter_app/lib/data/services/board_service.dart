@@ -12,6 +12,7 @@ class Board {
   final String? thumbnailUrl;
   final Map<String, dynamic> settings;
   final Map<String, dynamic>? canvasData;
+  final int canvasRevision;
   final String? role;
   final DateTime createdAt;
   final DateTime updatedAt;
@@ -25,6 +26,7 @@ class Board {
     this.thumbnailUrl,
     required this.settings,
     this.canvasData,
+    this.canvasRevision = 0,
     this.role,
     required this.createdAt,
     required this.updatedAt,
@@ -39,6 +41,7 @@ class Board {
         thumbnailUrl: json['thumbnail_url'] as String?,
         settings: json['settings'] as Map<String, dynamic>? ?? {},
         canvasData: json['canvas_data'] as Map<String, dynamic>?,
+        canvasRevision: json['canvas_revision'] as int? ?? 0,
         role: json['role'] as String?,
         createdAt: DateTime.parse(json['created_at'] as String),
         updatedAt: DateTime.parse(json['updated_at'] as String),
@@ -53,6 +56,7 @@ class Board {
         'thumbnail_url': thumbnailUrl,
         'settings': settings,
         'canvas_data': canvasData,
+        'canvas_revision': canvasRevision,
         'role': role,
         'created_at': createdAt.toIso8601String(),
         'updated_at': updatedAt.toIso8601String(),
@@ -197,10 +201,11 @@ class BoardService {
     return Board.fromJson(jsonDecode(response.body));
   }
 
-  /// Get a board by ID
-  Future<Board> getBoard(String boardId) async {
+  /// Get a board by ID (canvasData is only filled with [includeCanvas])
+  Future<Board> getBoard(String boardId, {bool includeCanvas = false}) async {
+    final query = includeCanvas ? '?include=canvas' : '?include=none';
     final response = await http.get(
-      Uri.parse('$baseUrl/api/boards/$boardId'),
+      Uri.parse('$baseUrl/api/boards/$boardId$query'),
       headers: _headers,
     );
 
@@ -268,6 +273,35 @@ class BoardService {
     return Board.fromJson(jsonDecode(response.body));
   }
 
+  /// Save canvas changes as element-level operations (incremental auto-save)
+  ///
+  /// Each operation is `{'op': 'add'|'update'|'remove', 'kind':
+  /// 'strokes'|'objects'|'layers', 'id': ..., 'data': {...}}`. Returns the
+  /// new canvas revision; throws [CanvasConflictException] if the canvas
+  /// changed since [baseRevision].
+  Future<int> patchCanvas(
+    String boardId,
+    int baseRevision,
+    List<Map<String, dynamic>> ops,
+  ) async {
+    final response = await http.patch(
+      Uri.parse('$baseUrl/api/boards/$boardId/canvas'),
+      headers: _headers,
+      body: jsonEncode({'base_revision': baseRevision, 'ops': ops}),
+    );
+
+    if (response.statusCode == 409) {
+      final detail = jsonDecode(response.body)['detail'] as Map<String, dynamic>;
+      throw CanvasConflictException(detail['revision'] as int);
+    }
+    if (response.statusCode != 200) {
+      final error = jsonDecode(response.body);
+      throw BoardException(error['detail']?.toString() ?? 'Failed to save canvas');
+    }
+
+    return jsonDecode(response.body)['revision'] as int;
+  }
+
   /// Delete a board
   Future<void> deleteBoard(String boardId) async {
     final response = await http.delete(
@@ -375,3 +409,10 @@ class BoardException implements Exception {
   @override
   String toString() => message;
 }
+
+/// The canvas changed on the server since the revision a patch was based on
+class CanvasConflictException extends BoardException {
+  final int revision;
+  CanvasConflictException(this.revision)
+      : super('Canvas has changed since the base revision');
+}
@@ -19,6 +19,12 @@ class SocketService {
   String? _userId;
   String? _displayName;
 
+  // Op log position of the current board, used to resync after a reconnect
+  String? _epoch;
+  int _lastSeq = 0;
+  String? _previousSid;
+  bool _viewportFiltered = false;
+
   // Stream controllers for events
   final _connectionStatusController = StreamController<ConnectionStatus>.broadcast();
   final _strokeStartController = StreamController<Map<String, dynamic>>.broadcast();
@@ -33,6 +39,7 @@ class SocketService {
   final _objectAddedController = StreamController<Map<String, dynamic>>.broadcast();
   final _objectUpdatedController = StreamController<Map<String, dynamic>>.broadcast();
   final _objectDeletedController = StreamController<Map<String, dynamic>>.broadcast();
+  final _viewportSyncController = StreamController<Map<String, dynamic>>.broadcast();
 
   // Public streams
   Stream<ConnectionStatus> get connectionStatus => _connectionStatusController.stream;
@@ -48,6 +55,7 @@ class SocketService {
   Stream<Map<String, dynamic>> get onObjectAdded => _objectAddedController.stream;
   Stream<Map<String, dynamic>> get onObjectUpdated => _objectUpdatedController.stream;
   Stream<Map<String, dynamic>> get onObjectDeleted => _objectDeletedController.stream;
+  Stream<Map<String, dynamic>> get onViewportSync => _viewportSyncController.stream;
 
   bool get isConnected => _socket?.connected ?? false;
   String? get currentBoardId => _currentBoardId;
@@ -90,6 +98,7 @@ class SocketService {
 
     socket.onDisconnect((_) {
       debugPrint('Socket disconnected');
+      _previousSid = socket.id ?? _previousSid;
       _connectionStatusController.add(ConnectionStatus.disconnected);
     });
 
@@ -106,18 +115,31 @@ class SocketService {
     socket.onReconnect((_) {
       debugPrint('Socket reconnected');
       _connectionStatusController.add(ConnectionStatus.connected);
-      // Rejoin board if we were in one
+      // Rejoin board if we were in one, asking only for the ops we missed
       if (_currentBoardId != null) {
-        joinBoard(_currentBoardId!, displayName: _displayName);
+        joinBoard(_currentBoardId!, displayName: _displayName, resync: true);
       }
     });
 
     // Board events
     socket.on('board_state', (data) {
       debugPrint('Received board state');
+      _epoch = data['epoch'] as String?;
+      _lastSeq = (data['seq'] as int?) ?? 0;
       _boardStateController.add(Map<String, dynamic>.from(data));
     });
 
+    // Ops missed while disconnected, replayed in order
+    socket.on('board_resync', (data) {
+      final ops = data['ops'] as List<dynamic>;
+      debugPrint('Resyncing board: ${ops.length} ops');
+      _epoch = data['epoch'] as String?;
+      for (final op in ops) {
+        _dispatch(op['event'] as String, op['data']);
+      }
+      _lastSeq = (data['seq'] as int?) ?? _lastSeq;
+    });
+
     socket.on('user_joined', (data) {
       debugPrint('User joined: ${data['display_name']}');
       _userJoinedController.add(Map<String, dynamic>.from(data));
@@ -133,16 +155,16 @@ class SocketService {
     });
 
     // Stroke events
-    socket.on('stroke_start', (data) {
-      _strokeStartController.add(Map<String, dynamic>.from(data));
-    });
-
-    socket.on('stroke_update', (data) {
-      _strokeUpdateController.add(Map<String, dynamic>.from(data));
-    });
+    for (final event in ['stroke_start', 'stroke_update', 'stroke_end']) {
+      socket.on(event, (data) => _dispatch(event, data));
+    }
 
-    socket.on('stroke_end', (data) {
-      _strokeEndController.add(Map<String, dynamic>.from(data));
+    // Busy rooms receive point updates merged per server tick
+    socket.on('stroke_batch', (data) {
+      for (final stroke in data['strokes'] as List<dynamic>) {
+        _strokeUpdateController.add(Map<String, dynamic>.from(stroke));
+      }
+      _trackSeq(data);
     });
 
     // Cursor events
@@ -150,28 +172,64 @@ class SocketService {
       _cursorUpdateController.add(Map<String, dynamic>.from(data));
     });
 
-    // Board cleared
-    socket.on('board_cleared', (data) {
-      debugPrint('Board cleared');
-      _boardClearedController.add(null);
+    // Latest cursor positions per user, one frame per server interval
+    socket.on('cursor_batch', (data) {
+      for (final cursor in data['cursors'] as List<dynamic>) {
+        _cursorUpdateController.add(Map<String, dynamic>.from(cursor));
+      }
     });
 
-    // Object events
-    socket.on('object_added', (data) {
-      _objectAddedController.add(Map<String, dynamic>.from(data));
+    // Strokes and objects that changed out of view, to replace local copies
+    socket.on('viewport_sync', (data) {
+      _viewportSyncController.add(Map<String, dynamic>.from(data));
     });
 
-    socket.on('object_updated', (data) {
-      _objectUpdatedController.add(Map<String, dynamic>.from(data));
-    });
+    // Board cleared and object events
+    for (final event in ['board_cleared', 'object_added', 'object_updated', 'object_deleted']) {
+      socket.on(event, (data) => _dispatch(event, data));
+    }
+  }
 
-    socket.on('object_deleted', (data) {
-      _objectDeletedController.add(Map<String, dynamic>.from(data));
-    });
+  /// Route a sequenced board event (live or replayed) to its stream
+  void _dispatch(String event, dynamic data) {
+    final payload = Map<String, dynamic>.from(data);
+    switch (event) {
+      case 'stroke_start':
+        _strokeStartController.add(payload);
+      case 'stroke_update':
+        _strokeUpdateController.add(payload);
+      case 'stroke_end':
+        _strokeEndController.add(payload);
+      case 'board_cleared':
+        debugPrint('Board cleared');
+        _boardClearedController.add(null);
+      case 'object_added':
+        _objectAddedController.add(payload);
+      case 'object_updated':
+        _objectUpdatedController.add(payload);
+      case 'object_deleted':
+        _objectDeletedController.add(payload);
+    }
+    _trackSeq(payload);
+  }
+
+  void _trackSeq(dynamic data) {
+    final seq = data['seq'];
+    if (seq is int && seq > _lastSeq) {
+      _lastSeq = seq;
+    }
   }
 
   /// Join a whiteboard
-  void joinBoard(String boardId, {String? displayName}) {
+  ///
+  /// With [resync], the server replays only the ops missed since the last
+  /// seen seq when it still has them, and sends a full board state otherwise.
+  void joinBoard(String boardId, {String? displayName, bool resync = false}) {
+    if (!resync || boardId != _currentBoardId) {
+      _epoch = null;
+      _lastSeq = 0;
+      _viewportFiltered = false;
+    }
     _currentBoardId = boardId;
     _displayName = displayName ?? _displayName ?? 'Anonymous';
 
@@ -179,6 +237,12 @@ class SocketService {
       'board_id': boardId,
       'user_id': _userId,
       'display_name': _displayName,
+      if (_epoch != null) ...{
+        'epoch': _epoch,
+        'since_seq': _lastSeq,
+        'previous_sid': _previousSid,
+        'viewport_filtered': _viewportFiltered,
+      },
     });
   }
 
@@ -223,6 +287,21 @@ class SocketService {
     _socket?.emit('stroke_end', {'stroke_id': strokeId});
   }
 
+  /// Report the visible canvas area; events far outside it are not sent
+  void emitViewportUpdate({
+    required double left,
+    required double top,
+    required double right,
+    required double bottom,
+    double scale = 1.0,
+  }) {
+    _viewportFiltered = true;
+    _socket?.emit('viewport_update', {
+      'bbox': [left, top, right, bottom],
+      'scale': scale,
+    });
+  }
+
   /// Update cursor position
   void emitCursorMove({required double x, required double y}) {
     _socket?.emit('cursor_move', {'x': x, 'y': y});
@@ -288,5 +367,6 @@ class SocketService {
     _objectAddedController.close();
     _objectUpdatedController.close();
     _objectDeletedController.close();
+    _viewportSyncController.close();
   }
 }
@@ -27,11 +27,40 @@ CREATE TABLE IF NOT EXISTS boards (
     is_public BOOLEAN DEFAULT true,
     thumbnail_url TEXT,
     canvas_data JSONB DEFAULT '{}',
+    canvas_blob BYTEA,
     settings JSONB DEFAULT '{}',
+    -- 'document': elements in canvas_data; 'normalized': in board_strokes/board_objects;
+    -- 'compressed': everything in canvas_blob
+    canvas_storage VARCHAR(20) NOT NULL DEFAULT 'document',
+    canvas_revision INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- For databases created before these columns existed
+ALTER TABLE boards ADD COLUMN IF NOT EXISTS canvas_storage VARCHAR(20) NOT NULL DEFAULT 'document';
+ALTER TABLE boards ADD COLUMN IF NOT EXISTS canvas_revision INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE boards ADD COLUMN IF NOT EXISTS canvas_blob BYTEA;
+
+-- Per-element canvas storage (boards with canvas_storage = 'normalized')
+CREATE TABLE IF NOT EXISTS board_strokes (
+    board_id UUID REFERENCES boards(id) ON DELETE CASCADE,
+    element_id VARCHAR(255) NOT NULL,
+    position BIGINT GENERATED BY DEFAULT AS IDENTITY,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (board_id, element_id)
+);
+
+CREATE TABLE IF NOT EXISTS board_objects (
+    board_id UUID REFERENCES boards(id) ON DELETE CASCADE,
+    element_id VARCHAR(255) NOT NULL,
+    position BIGINT GENERATED BY DEFAULT AS IDENTITY,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (board_id, element_id)
+);
+
 -- Board members table (for collaboration permissions)
 CREATE TABLE IF NOT EXISTS board_members (
     board_id UUID REFERENCES boards(id) ON DELETE CASCADE,
@@ -46,12 +75,28 @@ CREATE TABLE IF NOT EXISTS board_versions (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     board_id UUID REFERENCES boards(id) ON DELETE CASCADE,
     version_number INTEGER NOT NULL,
-    canvas_data JSONB NOT NULL,
+    -- Full copy (older versions) or manifest of chunk hashes
+    canvas_data JSONB,
+    manifest JSONB,
     created_by UUID REFERENCES users(id) ON DELETE SET NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     UNIQUE (board_id, version_number)
 );
 
+-- For databases created before version manifests existed
+ALTER TABLE board_versions ADD COLUMN IF NOT EXISTS manifest JSONB;
+ALTER TABLE board_versions ALTER COLUMN canvas_data DROP NOT NULL;
+
+-- Strokes and objects of board versions, shared by content hash
+CREATE TABLE IF NOT EXISTS board_version_chunks (
+    board_id UUID REFERENCES boards(id) ON DELETE CASCADE,
+    hash VARCHAR(64) NOT NULL,
+    data JSONB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (board_id, hash)
+);
+
 -- Comments table (for threaded discussions)
 CREATE TABLE IF NOT EXISTS comments (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -95,6 +140,8 @@ CREATE TABLE IF NOT EXISTS notifications (
 CREATE INDEX IF NOT EXISTS idx_boards_owner ON boards(owner_id);
 CREATE INDEX IF NOT EXISTS idx_board_members_user ON board_members(user_id);
 CREATE INDEX IF NOT EXISTS idx_board_versions_board ON board_versions(board_id);
+CREATE INDEX IF NOT EXISTS idx_board_strokes_position ON board_strokes(board_id, position);
+CREATE INDEX IF NOT EXISTS idx_board_objects_position ON board_objects(board_id, position);
 CREATE INDEX IF NOT EXISTS idx_comments_board ON comments(board_id);
 CREATE INDEX IF NOT EXISTS idx_comments_parent ON comments(parent_id);
 CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id);